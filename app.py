@@ -1,11 +1,13 @@
+import functools
 import os
+import threading
 from typing import List
 from typing_extensions import LiteralString
-import requests
-import openai
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from dotenv import load_dotenv
-from sn_rag_engine import SnRAGEngine
+from sn_client import SERVER_URL_ENV, SnClient
+from sn_events import QueryEventType
 
 API_ENV_KEY_NAMES = {"OpenAI": "OPENAI_API_KEY", "together.ai": "TOGETHER_API_KEY", "Fireworks AI": "FIREWORKS_API_KEY"}
 PROVIDERS = {"OpenAI": "openai", "together.ai": "together", "Fireworks AI": "fireworks"}
@@ -23,6 +25,7 @@ def remote_log_query(user_query: str, response: str, provider: str):
     if not os.getenv("LOG_WEBHOOK_URL"):
         return
 
+    import requests
     try:
         res = requests.post(os.getenv("LOG_WEBHOOK_URL"), json=payload, timeout=10)
         if res.status_code == 200:
@@ -37,21 +40,25 @@ class StreamlitLogger:
     def log(message: str):
         st.info(message)
 
-# Subclass with logging
-class SnRAGEngineWithUI(SnRAGEngine):
-    def __init__(self, logger, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.logger = logger
+# Subclass for the session's worker threads, defined on the first local query so the page renders without
+# loading llama-index. Progress is logged from the query events, which the remote server streams as well
+@functools.lru_cache(maxsize=None)
+def engine_with_ui():
+    from sn_rag_engine import SnRAGEngine
 
-    def query_year(self, query_text: str, year: int) -> str:
-        self.logger.log(f"🔍 Querying year {year}...")
-        return super().query_year(query_text, year)
+    class SnRAGEngineWithUI(SnRAGEngine):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.script_run_ctx = get_script_run_ctx()
 
-    def _summarize_responses(self, query_text: str, responses: List[str]) -> str:
-        self.logger.log(f"🧠 Summarizing results from {len(responses)} years...")
-        return super()._summarize_responses(query_text, responses)
+        def _init_worker(self) -> None:
+            # Streamlit calls from worker threads need the session's script run context
+            add_script_run_ctx(threading.current_thread(), self.script_run_ctx)
+
+    return SnRAGEngineWithUI
 
 def validate_openai_key(api_key: str) -> bool:
+    import openai
     try:
         client = openai.OpenAI(api_key=api_key)
         client.models.list()
@@ -73,6 +80,7 @@ def validate_together_key(api_key: str) -> bool:
         "max_tokens": 1,
         "temperature": 0
     }
+    import requests
     try:
         response = requests.post(url, headers=headers, json=data, timeout=10)
         if response.status_code == 200 and "error" not in response.json():
@@ -82,6 +90,7 @@ def validate_together_key(api_key: str) -> bool:
         return False
 
 def validate_fireworks_key(api_key: str) -> bool:
+    import requests
     try:
         headers = {"Authorization": f"Bearer {api_key}"}
         response = requests.get("https://api.fireworks.ai/inference/v1/models", headers=headers, timeout=5)
@@ -93,28 +102,62 @@ def validate_fireworks_key(api_key: str) -> bool:
 def run_query(query: str, provider: str, api_key: str):
     try:
         with st.spinner("Running query across selected years..."):
-            # Set LLM provider and API key
-            SnRAGEngine.set_llm(provider, api_key=api_key)
-
             st.chat_message("user").markdown(query)
             logger = StreamlitLogger()
-            engine = SnRAGEngineWithUI(
-                logger=logger,
-                transcripts_dir="./transcripts",
-                index_dir="./index",
-                summary_prompt=summary_prompt if summary_prompt.strip() else None,
-                debug_mode=debug_mode,
-            )
-
-            result = engine.query_range(
-                query_text=query,
-                start_year=start_year,
-                end_year=end_year,
-                show_intermediate=show_intermediate,
-            )
-
-        st.chat_message("assistant").markdown(str(result))
-        remote_log_query(query, str(result), provider)
+            if os.getenv(SERVER_URL_ENV):
+                # Thin client: the query server keeps the indexes and models warm
+                events = SnClient(os.getenv(SERVER_URL_ENV)).stream_range(
+                    query, start_year, end_year, provider=provider, api_key=api_key
+                )
+            else:
+                # The engine gets its own models, sessions with different providers don't share the global Settings
+                SnRAGEngineWithUI = engine_with_ui()
+                engine = SnRAGEngineWithUI(
+                    transcripts_dir="./transcripts",
+                    index_dir="./index",
+                    summary_prompt=summary_prompt if summary_prompt.strip() else None,
+                    debug_mode=debug_mode,
+                    concurrency=4,
+                    models=SnRAGEngineWithUI.build_models(provider, api_key=api_key),
+                )
+                events = engine.stream_range(query, start_year, end_year)
+
+            # Events are rendered here, in the script thread, as the years and the summary stream in
+            placeholder = None
+            result = ""
+            # Intermediate answers of the years, streamed side by side as their tokens arrive
+            intermediate = st.container() if show_intermediate else None
+            year_placeholders = {}
+            year_texts = {}
+            years_done = 0
+            for event in events:
+                if event.type == QueryEventType.YEAR_STARTED:
+                    logger.log(f"🔍 Querying year {event.year}...")
+                    if intermediate is not None:
+                        year_placeholders[event.year] = intermediate.empty()
+                        year_texts[event.year] = ""
+                elif event.type == QueryEventType.TOKEN and event.year in year_placeholders:
+                    year_texts[event.year] += event.text
+                    year_placeholders[event.year].markdown(f"**{event.year}**\n\n{year_texts[event.year]}▌")
+                elif event.type == QueryEventType.YEAR_DONE:
+                    years_done += 1
+                    if event.year in year_placeholders:
+                        year_placeholders[event.year].markdown(f"**{event.year}**\n\n{event.text}")
+                elif event.type == QueryEventType.YEAR_FAILED:
+                    st.warning(f"❌ Query failed for {event.year}: {event.text}")
+                elif event.type == QueryEventType.SUMMARY_STARTED:
+                    logger.log(f"🧠 Summarizing results from {years_done} years...")
+                    placeholder = st.chat_message("assistant").empty()
+                elif event.type == QueryEventType.SUMMARY_TOKEN:
+                    result += event.text
+                    placeholder.markdown(result + "▌")
+                elif event.type == QueryEventType.DONE:
+                    result = event.text
+
+        if placeholder is None:
+            placeholder = st.chat_message("assistant").empty()
+        placeholder.markdown(result)
+        remote_log_query(query, result, provider)
 
     except Exception as e:
         st.error(f"❌ An error occurred: {e}")
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from sn_embedding_cache import normalize_query
+
+# Semantic matching is opt-in: a similar query may still ask for something else, e.g. another name or year
+ANSWER_CACHE_SIMILARITY = float(os.getenv("SN_ANSWER_CACHE_SIMILARITY", "0")) or None
+ANSWER_CACHE_TTL = float(os.getenv("SN_ANSWER_CACHE_TTL", "0")) or None
+
+
+class AnswerCache:
+    """
+    Persistent cache of LLM answers backed by SQLite.
+    Answers are grouped by kind (e.g. "year" or "summary") and scope, a string that identifies
+    everything the answer depends on besides the query (year, models, top_k, index version...).
+    Within a scope a query matches exactly, after normalization, and when a similarity_threshold
+    is given also semantically, when the cosine similarity of the query embeddings reaches it.
+    Entries older than ttl seconds are ignored and purged.
+    """
+    def __init__(self, path: str, similarity_threshold: Optional[float] = ANSWER_CACHE_SIMILARITY, ttl: Optional[float] = ANSWER_CACHE_TTL) -> None:
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "kind TEXT NOT NULL, scope TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB, "
+                "response TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (kind, scope, query))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _min_created(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def get(self, kind: str, scope: str, query_text: str, query_embedding: Optional[List[float]] = None) -> Optional[str]:
+        """Return the cached answer for an exact, or semantically similar if enabled, query, or None on a miss."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT response FROM answers WHERE kind = ? AND scope = ? AND query = ? AND created >= ?",
+                (kind, scope, normalize_query(query_text), self._min_created()),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            if query_embedding is None or not self.similarity_threshold or self.similarity_threshold > 1:
+                return None
+            rows = conn.execute(
+                "SELECT embedding, response FROM answers "
+                "WHERE kind = ? AND scope = ? AND embedding IS NOT NULL AND created >= ?",
+                (kind, scope, self._min_created()),
+            ).fetchall()
+        if not rows:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        matrix = np.stack([np.frombuffer(embedding, dtype=np.float32) for embedding, _ in rows])
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        similarities = matrix @ query / np.where(norms == 0, 1, norms)
+        best = int(np.argmax(similarities))
+        return rows[best][1] if similarities[best] >= self.similarity_threshold else None
+
+    def put(self, kind: str, scope: str, query_text: str, response: str, query_embedding: Optional[List[float]] = None) -> None:
+        """Store an answer and purge the expired ones."""
+        embedding = None if query_embedding is None else np.asarray(query_embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (kind, scope, query, embedding, response, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, scope, normalize_query(query_text), embedding, response, time.time()),
+            )
+            if self.ttl:
+                conn.execute("DELETE FROM answers WHERE created < ?", (self._min_created(),))
+            conn.commit()
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """Drop all the answers, or only those of the given kind."""
+        with self._lock:
+            conn = self._connect()
+            if kind is None:
+                conn.execute("DELETE FROM answers")
+            else:
+                conn.execute("DELETE FROM answers WHERE kind = ?", (kind,))
+            conn.commit()
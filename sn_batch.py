@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, TextIO, Tuple
+
+from dotenv import load_dotenv
+
+from sn_metrics import METRICS, METRICS_FILE_ENV, JsonLinesSink
+from sn_options import PROVIDERS, RETRIEVAL_MODES, SUMMARY_MODES
+from sn_rag_engine import SnRAGEngine
+from sn_rate_limit import get_rate_limiter
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import NodeWithScore
+
+MIN_YEAR = 2015
+MAX_YEAR = 2025
+
+
+@dataclass
+class BatchQuery:
+    """A query of a batch file."""
+    id: str
+    query: str
+    start_year: int
+    end_year: int
+    summary_prompt: Optional[str] = None
+
+    @property
+    def years(self) -> List[int]:
+        return list(range(self.start_year, self.end_year + 1))
+
+
+@dataclass
+class _QueryState:
+    """Progress of a batch query: its per-year answers and failures, and the time spent in LLM calls."""
+    query: BatchQuery
+    responses: Dict[int, str] = field(default_factory=dict)
+    failed: Dict[int, str] = field(default_factory=dict)
+    llm_seconds: float = 0.0
+
+    @property
+    def years_done(self) -> bool:
+        return len(self.responses) + len(self.failed) == len(self.query.years)
+
+
+def read_queries(path: str) -> List[BatchQuery]:
+    """
+    Read the queries of a JSONL or CSV file (by extension). Each row holds query, start_year and end_year,
+    and optionally summary_prompt and id (the row number by default). Raises ValueError on an invalid row.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(enumerate(csv.DictReader(f), start=2))
+        else:
+            rows = []
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append((number, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{number}: invalid JSON: {e.msg}")
+    queries = []
+    for number, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"{path}:{number}: expected a JSON object, found {type(row).__name__}")
+        query = str(row.get("query") or "").strip()
+        if not query:
+            raise ValueError(f"{path}:{number}: query must not be empty")
+        try:
+            start_year, end_year = int(row["start_year"]), int(row["end_year"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{path}:{number}: start_year and end_year must be integers")
+        if start_year < MIN_YEAR or end_year > MAX_YEAR or start_year > end_year:
+            raise ValueError(f"{path}:{number}: invalid year range {start_year}-{end_year}")
+        query_id = str(row.get("id") or number)
+        queries.append(BatchQuery(query_id, query, start_year, end_year, row.get("summary_prompt") or None))
+    return queries
+
+
+class BatchRunner:
+    """
+    Runs many queries over many year ranges in one process. Each year's index is loaded once,
+    the queries are embedded in a single batched call and searched together with one matrix
+    product per year, and all LLM calls (per-year answers and summaries) share a pool bounded
+    by llm_concurrency and the provider's rate limits. Results are written as each query finishes.
+    """
+    def __init__(self, engine: SnRAGEngine, llm_concurrency: int = 8) -> None:
+        self.engine = engine
+        self.llm_concurrency = max(1, min(llm_concurrency, get_rate_limiter(engine.provider).max_concurrency))
+        self._summary_engines: Dict[str, SnRAGEngine] = {}
+
+    def run(self, queries: List[BatchQuery], output: TextIO) -> Dict[str, float]:
+        """Answer the queries, writing one JSON line per query to output. Returns the batch statistics."""
+        started = time.perf_counter()
+        states = {query.id: _QueryState(query) for query in queries}
+        if len(states) != len(queries):
+            raise ValueError("Query ids must be unique")
+        embeddings = self._embed(queries)
+        futures: Dict[Future, Tuple[str, _QueryState, Optional[int]]] = {}
+        written = failed = 0
+
+        def collect(timeout: Optional[float]) -> None:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, state, year = futures.pop(future)
+                error = future.exception()
+                if kind == "year":
+                    if error is None:
+                        response, seconds = future.result()
+                        state.responses[year] = f"\n--- {year} ---\n{response}\n"
+                        state.llm_seconds += seconds
+                    else:
+                        state.failed[year] = str(error)
+                    if state.years_done:
+                        submit_summary(state)
+                    continue
+                if error is None:
+                    result, seconds = future.result()
+                    state.llm_seconds += seconds
+                    finish(state, result, None)
+                else:
+                    finish(state, None, str(error))
+
+        def finish(state: _QueryState, result: Optional[str], error: Optional[str]) -> None:
+            nonlocal written, failed
+            self._write(output, state, result, error, started)
+            written += 1
+            failed += result is None
+
+        def submit_summary(state: _QueryState) -> None:
+            if not state.responses:
+                finish(state, None, "Query failed for all years")
+                return
+            responses = [state.responses[year] for year in state.query.years if year in state.responses]
+            engine = self._summary_engine(state.query.summary_prompt)
+            futures[executor.submit(self._timed, engine._summarize_responses, state.query.query, responses)] = ("summary", state, None)
+
+        with ThreadPoolExecutor(max_workers=self.llm_concurrency) as executor:
+            years = sorted({year for query in queries for year in query.years})
+            for year in years:
+                year_states = [states[query.id] for query in queries if year in query.years]
+                try:
+                    index = self.engine.get_index(self.engine.get_transcripts_path(year), self.engine.get_index_path(year))
+                    vector_nodes = self._search(index, [embeddings[state.query.id] for state in year_states])
+                except Exception as e:
+                    print(f"\n--- {year} ---\n❌ Query failed: {e}\n", file=sys.stderr)
+                    for state in year_states:
+                        state.failed[year] = str(e)
+                        if state.years_done:
+                            submit_summary(state)
+                    continue
+                for state, nodes in zip(year_states, vector_nodes):
+                    future = executor.submit(
+                        self._timed, self.engine.answer_year, state.query.query, year, embeddings[state.query.id], nodes
+                    )
+                    futures[future] = ("year", state, year)
+                # Write the queries finished so far while the next index loads
+                collect(timeout=0)
+            while futures:
+                collect(timeout=None)
+        return {"queries": written, "failed": failed, "seconds": round(time.perf_counter() - started, 3)}
+
+    def _embed(self, queries: List[BatchQuery]) -> Dict[str, Optional[List[float]]]:
+        """Return the query embeddings by query id, None for the queries answered from BM25 alone."""
+        embedded = [query for query in queries if self.engine.needs_query_embedding(query.query)]
+        embeddings: Dict[str, Optional[List[float]]] = {query.id: None for query in queries}
+        if embedded:
+            vectors = self.engine.get_query_embeddings([query.query for query in embedded])
+            embeddings.update((query.id, vector) for query, vector in zip(embedded, vectors))
+        return embeddings
+
+    def _search(self, index, embeddings: List[Optional[List[float]]]) -> List[Optional[List[NodeWithScore]]]:
+        """Return the vector search results of each embedding with a single multi-query search, None without one."""
+        positions = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        results: List[Optional[List[NodeWithScore]]] = [None] * len(embeddings)
+        if positions:
+            found = self.engine.search_many(index, [embeddings[i] for i in positions], self.engine.similarity_top_k)
+            for i, nodes in zip(positions, found):
+                results[i] = nodes
+        return results
+
+    def _summary_engine(self, summary_prompt: Optional[str]) -> SnRAGEngine:
+        """Return the engine summarizing with a query's own summary prompt, sharing everything else."""
+        if not summary_prompt:
+            return self.engine
+        if summary_prompt not in self._summary_engines:
+            engine = copy.copy(self.engine)
+            engine.summary_prompt = summary_prompt
+            self._summary_engines[summary_prompt] = engine
+        return self._summary_engines[summary_prompt]
+
+    @staticmethod
+    def _timed(fn, *args) -> Tuple[str, float]:
+        started = time.perf_counter()
+        return fn(*args), time.perf_counter() - started
+
+    @staticmethod
+    def _write(output: TextIO, state: _QueryState, result: Optional[str], error: Optional[str], started: float) -> None:
+        query = state.query
+        record = {
+            "id": query.id,
+            "query": query.query,
+            "start_year": query.start_year,
+            "end_year": query.end_year,
+            "result": result,
+            "responses": {str(year): state.responses[year] for year in sorted(state.responses)},
+            "failed": {str(year): message for year, message in sorted(state.failed.items())},
+            "error": error,
+            "seconds": round(time.perf_counter() - started, 3),
+            "llm_seconds": round(state.llm_seconds, 3),
+        }
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a batch of podcast transcript queries from a JSONL or CSV file.")
+    parser.add_argument("input", type=str, help="JSONL or CSV file of query, start_year, end_year and optional summary_prompt and id")
+    parser.add_argument("-o", "--output", type=str, default="-", help="JSONL file the results are written to (default: stdout)")
+    parser.add_argument("--transcripts-dir", type=str, default="./transcripts", help="Directory containing transcript files")
+    parser.add_argument("--index-dir", type=str, default="./index", help="Directory containing index files")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Number of LLM calls in flight across all queries (capped by the provider's rate limits)")
+    parser.add_argument("--summary-mode", type=str, choices=SUMMARY_MODES, default="single", help="Summarize all years in one LLM call, or reduce them hierarchically in concurrent groups")
+    parser.add_argument("--retrieval-mode", type=str, choices=RETRIEVAL_MODES, default="vector", help="Retrieve chunks by vector search (default), or opt in to BM25 keyword search or both fused")
+    parser.add_argument("--no-answer-cache", action="store_true", default=False, help="Do not reuse or store cached answers")
+    parser.add_argument("--metrics-file", type=str, default=os.getenv(METRICS_FILE_ENV), help=f"Append per-stage timings and counters to this JSON lines file (default: ${METRICS_FILE_ENV})")
+    args = parser.parse_args()
+
+    if args.llm_concurrency < 1:
+        print("LLM concurrency must be >= 1.")
+        exit(1)
+    try:
+        queries = read_queries(args.input)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        exit(1)
+
+    load_dotenv()
+    provider = os.getenv("LLM_PROVIDER", "openai")
+    if provider not in PROVIDERS:
+        print(f"Unknown provider '{provider}', expected one of {PROVIDERS}.")
+        exit(1)
+
+    # Loaded once the arguments are valid, --help doesn't wait for llama-index
+    from sn_postprocess import RetrievalConfig
+    if args.metrics_file:
+        METRICS.add_sink(JsonLinesSink(args.metrics_file))
+    engine = SnRAGEngine(
+        transcripts_dir=args.transcripts_dir,
+        index_dir=args.index_dir,
+        use_answer_cache=not args.no_answer_cache,
+        summary_mode=args.summary_mode,
+        retrieval=RetrievalConfig(mode=args.retrieval_mode),
+        models=SnRAGEngine.build_models(provider, index_dir=args.index_dir),
+    )
+    runner = BatchRunner(engine, llm_concurrency=args.llm_concurrency)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = runner.run(queries, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"✅ {stats['queries']} queries answered in {stats['seconds']}s ({stats['failed']} failed)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence
+
+import sortfiles
+from sn_index_cache import INDEX_CACHE
+from sn_options import RETRIEVAL_MODES
+from sn_rag_engine import ModelConfig, SnRAGEngine
+
+# The real archive holds about one episode per week over the years indexed
+EPISODES_PER_YEAR = 52
+EPISODE_WORDS = 15000
+FIRST_EPISODE = 500
+BENCH_QUERIES = (
+    "What did Steve say about VPNs?",
+    "How did the advice on password managers change?",
+    "SpinRite",
+    "What are the risks of router firmware exploits?",
+)
+TOPIC_WORDS = (
+    "security encryption certificate browser password router firewall exploit ransomware patch vpn tls "
+    "microsoft windows chrome firefox malware botnet spinrite sqrl authentication cve vulnerability "
+    "privacy tracking cookie server attacker update"
+).split()
+
+# Cold-start budget in seconds of the command line's --help and argument errors
+STARTUP_BUDGET = 1.0
+STARTUP_COMMANDS = {
+    "cli_help": ["sn_cli.py", "--help"],
+    "cli_invalid_args": ["sn_cli.py", "-sy", "2010", "-ey", "2010", "-q", "VPNs"],
+    "import_engine": ["-c", "import sn_rag_engine"],
+}
+
+
+def _vocabulary(rng: random.Random, size: int = 5000) -> List[str]:
+    syllables = ["ba", "co", "de", "fi", "gu", "ka", "lo", "me", "ni", "po", "ra", "si", "tu", "ve", "xo", "zy"]
+    words = set(TOPIC_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def write_corpus(
+    transcripts_dir: str,
+    years: Sequence[int],
+    episodes_per_year: int = EPISODES_PER_YEAR,
+    episode_words: int = EPISODE_WORDS,
+    seed: int = 0
+) -> int:
+    """
+    Write a synthetic transcript corpus sorted by year, in the format of the real transcripts
+    (GIBSON/SERIES/EPISODE/DATE headers, then paragraphs of Zipf-distributed words).
+    Returns the number of files written.
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    weights = list(accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    episode = FIRST_EPISODE
+    for year in years:
+        year_dir = os.path.join(transcripts_dir, str(year))
+        os.makedirs(year_dir, exist_ok=True)
+        for i in range(episodes_per_year):
+            # Several episodes per week at scales above 1x
+            air_date = date(year, 1, 1) + timedelta(days=(i * 364) // episodes_per_year)
+            words = rng.choices(vocabulary, cum_weights=weights, k=episode_words)
+            paragraphs = [" ".join(words[j:j + 120]) + "." for j in range(0, len(words), 120)]
+            header = (
+                "GIBSON RESEARCH CORPORATION\t\thttps://www.GRC.com/\n\n"
+                f"SERIES:\t\tSecurity Now!\nEPISODE:\t#{episode}\nDATE:\t\t{air_date.strftime('%B')} {air_date.day}, {year}\n"
+                f"TITLE:\t\tEpisode {episode}\nHOSTS:\tSteve Gibson & Leo Laporte\n\n"
+            )
+            with open(os.path.join(year_dir, f"sn-{episode}.txt"), "w", encoding="utf-8") as f:
+                f.write(header + "\n\n".join(paragraphs) + "\n")
+            episode += 1
+    return episode - FIRST_EPISODE
+
+
+def _max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _latency_stats(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def bench_sortfiles(transcripts_dir: str, work_dir: str) -> Dict[str, float]:
+    """Time organize_transcripts_by_year on a flat copy of the corpus."""
+    flat_dir = os.path.join(work_dir, "flat")
+    os.makedirs(flat_dir, exist_ok=True)
+    for root, _, files in os.walk(transcripts_dir):
+        for file_name in files:
+            shutil.copy(os.path.join(root, file_name), os.path.join(flat_dir, file_name))
+    files = len(os.listdir(flat_dir))
+    started = time.perf_counter()
+    sortfiles.organize_transcripts_by_year(flat_dir)
+    seconds = time.perf_counter() - started
+    shutil.rmtree(flat_dir)
+    return {"files": files, "seconds": round(seconds, 3), "files_per_second": round(files / seconds, 1) if seconds else 0.0}
+
+
+def _import_times(statement: str, cwd: str, top: int = 10) -> Dict[str, float]:
+    """Return the import seconds of the slowest top-level packages imported by a statement, with their submodules."""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=cwd, capture_output=True, text=True)
+    times: Dict[str, float] = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[0].startswith("import time:"):
+            continue
+        try:
+            self_us = int(fields[0][len("import time:"):])
+        except ValueError:
+            continue
+        package = fields[2].strip().split(".")[0]
+        times[package] = times.get(package, 0.0) + self_us / 1e6
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {name: round(seconds, 4) for name, seconds in slowest}
+
+
+def bench_startup(repeat: int) -> Dict[str, Any]:
+    """
+    Time the cold start of the command line and of the engine import in fresh interpreters,
+    and break down the engine import by top-level module.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    results: Dict[str, Any] = {}
+    for name, command in STARTUP_COMMANDS.items():
+        seconds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, *command], cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - started)
+        results[name] = _latency_stats(seconds)
+    results["budget"] = STARTUP_BUDGET
+    results["within_budget"] = all(results[name]["p50"] <= STARTUP_BUDGET for name in ("cli_help", "cli_invalid_args"))
+    results["engine_imports"] = _import_times("import sn_rag_engine", root)
+    return results
+
+
+def bench_scale(scale: int, args: argparse.Namespace, models: ModelConfig, work_dir: str) -> Dict[str, Any]:
+    """Run the benchmarks on a corpus of scale times the real archive size."""
+    from sn_postprocess import RetrievalConfig
+    years = list(range(args.start_year, args.end_year + 1))
+    transcripts_dir = os.path.join(work_dir, f"transcripts-{scale}x")
+    index_dir = os.path.join(work_dir, f"index-{scale}x")
+    started = time.perf_counter()
+    files = write_corpus(transcripts_dir, years, EPISODES_PER_YEAR * scale, args.episode_words, args.seed)
+    print(f"🔄 {scale}x: {files} transcripts generated in {time.perf_counter() - started:.1f}s")
+    engine = SnRAGEngine(
+        transcripts_dir=transcripts_dir,
+        index_dir=index_dir,
+        concurrency=args.concurrency,
+        use_answer_cache=False,
+        retrieval=RetrievalConfig(mode=args.retrieval_mode),
+        models=models,
+    )
+    results: Dict[str, Any] = {"scale": scale, "files": files, "years": len(years)}
+
+    INDEX_CACHE.clear()
+    rss_before = _max_rss_mb()
+    build_seconds = []
+    for year in years:
+        started = time.perf_counter()
+        engine.get_index(engine.get_transcripts_path(year), engine.get_index_path(year))
+        build_seconds.append(time.perf_counter() - started)
+    rss_after = _max_rss_mb()
+    results["build"] = {
+        "seconds": round(sum(build_seconds), 3),
+        "per_year": _latency_stats(build_seconds),
+        "max_rss_mb": rss_after,
+        "max_rss_growth_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+    }
+    print(f"✅ {scale}x: indexes built in {results['build']['seconds']}s")
+
+    INDEX_CACHE.clear()
+    load_seconds = []
+    for year in years:
+        started = time.perf_counter()
+        engine.get_index(engine.get_transcripts_path(year), engine.get_index_path(year))
+        load_seconds.append(time.perf_counter() - started)
+    results["load"] = {"seconds": round(sum(load_seconds), 3), "per_year": _latency_stats(load_seconds)}
+    print(f"✅ {scale}x: indexes loaded in {results['load']['seconds']}s")
+
+    year_seconds = []
+    for _ in range(args.repeat):
+        for query_text in BENCH_QUERIES:
+            for year in years:
+                started = time.perf_counter()
+                engine.query_year(query_text, year)
+                year_seconds.append(time.perf_counter() - started)
+    results["query_year"] = _latency_stats(year_seconds)
+
+    range_seconds = []
+    for _ in range(args.repeat):
+        for query_text in BENCH_QUERIES:
+            started = time.perf_counter()
+            engine.query_range(query_text, years[0], years[-1])
+            range_seconds.append(time.perf_counter() - started)
+    results["query_range"] = _latency_stats(range_seconds)
+    print(f"✅ {scale}x: query_year p50 {results['query_year']['p50']}s, query_range p50 {results['query_range']['p50']}s")
+
+    results["sortfiles"] = bench_sortfiles(transcripts_dir, work_dir)
+    print(f"✅ {scale}x: {results['sortfiles']['files_per_second']} files/s sorted")
+    INDEX_CACHE.clear()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    """ Returns the commit the benchmark runs on, with a + suffix when the tree has local changes """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty.strip() else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexing and querying offline, with deterministic local stand-ins for the embedding model and the LLM.")
+    parser.add_argument("--scales", type=str, default="1", help="Comma separated corpus sizes, as multiples of the real archive (e.g. 1,10,100)")
+    parser.add_argument("-sy", "--start-year", type=int, default=2015, help="First year of the synthetic corpus")
+    parser.add_argument("-ey", "--end-year", type=int, default=2025, help="Last year of the synthetic corpus")
+    parser.add_argument("--episode-words", type=int, default=EPISODE_WORDS, help="Words per synthetic transcript")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds each embedding call takes")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds each LLM call takes")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Number of years queried in parallel")
+    parser.add_argument("--retrieval-mode", type=str, choices=RETRIEVAL_MODES, default="vector", help="Retrieve chunks by vector search (default), or opt in to BM25 keyword search or both fused")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times each query is run")
+    parser.add_argument("--startup-repeat", type=int, default=5, help="Number of cold starts timed per command (0 skips the startup benchmark)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    parser.add_argument("--work-dir", type=str, default=None, help="Directory for the corpus and indexes (default: a temporary directory)")
+    parser.add_argument("-o", "--output", type=str, default="bench-results.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    try:
+        scales = [int(scale) for scale in args.scales.split(",")]
+    except ValueError:
+        print("Scales must be comma separated integers.")
+        exit(1)
+    if min(scales) < 1 or args.repeat < 1 or args.concurrency < 1 or args.startup_repeat < 0 or args.start_year > args.end_year:
+        print("Scales, repeat and concurrency must be >= 1, and start year must be <= end year.")
+        exit(1)
+
+    startup = None
+    if args.startup_repeat:
+        startup = bench_startup(args.startup_repeat)
+        status = "✅" if startup["within_budget"] else "⚠️"
+        print(f"{status} Startup: --help p50 {startup['cli_help']['p50']}s, argument error p50 "
+              f"{startup['cli_invalid_args']['p50']}s (budget {STARTUP_BUDGET}s), engine import p50 {startup['import_engine']['p50']}s")
+
+    # The stand-in models are loaded once the arguments are valid, --help doesn't wait for llama-index
+    from sn_bench_models import install_models
+    models = install_models(args.embed_latency, args.llm_latency, args.concurrency)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="sn-bench-")
+    try:
+        results = [bench_scale(scale, args, models, os.path.join(work_dir, f"{scale}x")) for scale in scales]
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "work_dir")},
+        "startup": startup,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import random
+import time
+from typing import Any, List
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.llms.custom import CustomLLM
+
+from sn_postprocess import WORD_PATTERN
+from sn_rag_engine import ModelConfig, SnRAGEngine
+from sn_rate_limit import set_provider_limits
+
+# Deterministic local stand-ins for the models, used by sn_bench and the tests.
+# They are kept out of sn_bench so that its --help doesn't load llama-index.
+
+# The stand-in models are registered under their own provider, so they are not throttled by a real provider's limits
+BENCH_PROVIDER = "bench"
+BENCH_EMBED_DIM = 256
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic local stand-in for an embedding model: a hashed bag of words, so texts sharing
+    words get similar vectors. Each call sleeps latency seconds, like a round trip to a provider.
+    """
+    embed_dim: int = BENCH_EMBED_DIM
+    latency: float = 0.0
+
+    def __init__(self, embed_dim: int = BENCH_EMBED_DIM, latency: float = 0.0, **kwargs: Any) -> None:
+        super().__init__(embed_dim=embed_dim, latency=latency, model_name=f"hash-bow-{embed_dim}", **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.embed_dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # A batch costs a single round trip
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+
+class EchoLLM(CustomLLM):
+    """
+    Deterministic local stand-in for an LLM: answers with output_words words drawn from the prompt,
+    chosen by its hash, after sleeping latency seconds. Streaming yields the same answer word by word.
+    """
+    model_name: str = "echo"
+    latency: float = 0.0
+    output_words: int = 200
+    context_window: int = 128000
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "EchoLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, num_output=self.output_words * 2, model_name=self.model_name)
+
+    def _answer(self, prompt: str) -> List[str]:
+        words = WORD_PATTERN.findall(prompt.lower()) or ["empty"]
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        return [rng.choice(words) for _ in range(self.output_words)]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency)
+        return CompletionResponse(text=" ".join(self._answer(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        time.sleep(self.latency)
+        text = ""
+        for i, word in enumerate(self._answer(prompt)):
+            delta = word if i == 0 else " " + word
+            text += delta
+            yield CompletionResponse(text=text, delta=delta)
+
+
+def install_models(embed_latency: float = 0.0, llm_latency: float = 0.0, concurrency: int = 8) -> ModelConfig:
+    """
+    Install the stand-in models as the default models of engines and in the global Settings,
+    and return them as the models of an engine.
+    """
+    set_provider_limits(BENCH_PROVIDER, concurrency, 0)
+    models = ModelConfig(BENCH_PROVIDER, EchoLLM(latency=llm_latency), HashEmbedding(latency=embed_latency))
+    SnRAGEngine.set_models(models)
+    Settings.llm = models.llm
+    Settings.embed_model = models.embed_model
+    Settings.similarity_top_k = models.similarity_top_k
+    return models
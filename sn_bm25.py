@@ -0,0 +1,179 @@
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode, NodeWithScore
+
+from sn_postprocess import STOP_WORDS
+
+BM25_DIR = "bm25"
+BM25_POSTINGS_FILE = "postings.npz"
+BM25_VOCAB_FILE = "vocab.json"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant, dampens the weight of the top ranks
+RRF_K = 60
+# Compound tokens such as CVE-2014-0160, log4j or v1.5 are kept whole, and their parts are indexed too
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+CVE_PATTERN = re.compile(r"\bcve-\d{4}-\d+\b", re.IGNORECASE)
+QUOTED_PATTERN = re.compile(r"\"[^\"]+\"|“[^”]+”")
+# A query of at most this many content terms is keyword-heavy if one of them looks like a name or an identifier
+KEYWORD_QUERY_MAX_TERMS = 3
+# Questions ask about meaning, they always get the vector search even when they name an identifier
+QUESTION_PATTERN = re.compile(r"\?|\b(?:what|when|where|which|who|whom|whose|why|how)\b", re.IGNORECASE)
+
+
+def fold_plural(term: str) -> str:
+    """ Returns a term with a plural 's' removed, so that "VPNs" matches "VPN" """
+    if len(term) > 3 and term.endswith("s") and not term.endswith(("ss", "us", "is")) and term[-2].isalpha():
+        return term[:-1]
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """ Returns the lowercased index terms of a text, without stop words """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOP_WORDS:
+            terms.append(fold_plural(token))
+        if "-" in token or "." in token:
+            terms.extend(fold_plural(part) for part in re.split(r"[-.]", token) if part not in STOP_WORDS)
+    return terms
+
+
+def is_keyword_query(query_text: str) -> bool:
+    """
+    Returns True for queries that lexical search answers best on its own: CVE ids, quoted terms,
+    or a few terms of which one looks like a name or an identifier (e.g. "SpinRite", "VPNs", "Log4j").
+    Natural-language questions, with a question mark or a wh-word, never are.
+    """
+    if QUESTION_PATTERN.search(query_text):
+        return False
+    if CVE_PATTERN.search(query_text) or QUOTED_PATTERN.search(query_text):
+        return True
+    words = [word for word in re.findall(r"[A-Za-z0-9][\w.-]*", query_text) if word.lower() not in STOP_WORDS]
+
+    def is_identifier(word: str) -> bool:
+        # Inner capitals (not just a capitalized first word) or letters mixed with digits
+        return any(c.isupper() for c in word[1:]) or (any(c.isdigit() for c in word) and any(c.isalpha() for c in word))
+
+    return 0 < len(words) <= KEYWORD_QUERY_MAX_TERMS and any(is_identifier(word) for word in words)
+
+
+def has_bm25(bm25_path: str) -> bool:
+    """ Returns True if bm25_path contains a persisted BM25 index """
+    return os.path.exists(os.path.join(bm25_path, BM25_VOCAB_FILE))
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the nodes of a vector index.
+    Postings are stored as flat arrays (term offsets, node rows and term frequencies) and
+    persisted as a compressed NumPy archive next to a JSON table of terms and node ids.
+    version records the vector index version it was built from, to detect stale indexes.
+    """
+    def __init__(
+        self,
+        terms: List[str],
+        node_ids: List[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        version: str = "",
+    ) -> None:
+        self.terms = terms
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.rows = rows
+        self.freqs = freqs
+        self.doc_lengths = doc_lengths
+        self.version = version
+        self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, nodes: Sequence[BaseNode], version: str = "") -> "BM25Index":
+        """Index the text of nodes."""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        doc_lengths = np.zeros(len(nodes), dtype=np.int32)
+        for row, node in enumerate(nodes):
+            counts = Counter(tokenize(node.get_content()))
+            doc_lengths[row] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term].append((row, count))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        rows = np.fromiter((row for term in terms for row, _ in postings[term]), dtype=np.int32, count=int(offsets[-1]))
+        freqs = np.fromiter((min(count, 65535) for term in terms for _, count in postings[term]), dtype=np.uint16, count=int(offsets[-1]))
+        return cls(terms, [node.node_id for node in nodes], offsets, rows, freqs, doc_lengths, version)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def save(self, bm25_path: str) -> None:
+        """Persist the index, replacing the files atomically so readers never see a partial index."""
+        os.makedirs(bm25_path, exist_ok=True)
+        postings_path = os.path.join(bm25_path, BM25_POSTINGS_FILE)
+        with open(postings_path + ".tmp", "wb") as f:
+            np.savez_compressed(f, offsets=self.offsets, rows=self.rows, freqs=self.freqs, doc_lengths=self.doc_lengths)
+        vocab_path = os.path.join(bm25_path, BM25_VOCAB_FILE)
+        with open(vocab_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "terms": self.terms, "node_ids": self.node_ids}, f, separators=(",", ":"))
+        os.replace(postings_path + ".tmp", postings_path)
+        os.replace(vocab_path + ".tmp", vocab_path)
+
+    @classmethod
+    def load(cls, bm25_path: str) -> Optional["BM25Index"]:
+        """Load a persisted index, or return None if there is none."""
+        if not has_bm25(bm25_path):
+            return None
+        with open(os.path.join(bm25_path, BM25_VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with np.load(os.path.join(bm25_path, BM25_POSTINGS_FILE)) as postings:
+            return cls(
+                vocab["terms"], vocab["node_ids"], postings["offsets"], postings["rows"],
+                postings["freqs"], postings["doc_lengths"], vocab["version"],
+            )
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.rows.nbytes + self.freqs.nbytes + self.doc_lengths.nbytes
+
+    def search(self, query_text: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return the (node id, score) pairs of the top_k best matching nodes, best first."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query_text)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.rows[start:end]
+            freqs = self.freqs[start:end].astype(np.float32)
+            idf = np.log(1 + (len(self) - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[rows] / max(self.avg_length, 1e-9))
+            scores[rows] += idf * freqs * (BM25_K1 + 1) / (freqs + norm)
+        matches = int(np.count_nonzero(scores))
+        top_k = min(top_k, matches)
+        if top_k == 0:
+            return []
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(self.node_ids[row], float(scores[row])) for row in rows]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[NodeWithScore]], top_k: int, k: int = RRF_K) -> List[NodeWithScore]:
+    """ Returns the top_k nodes of several rankings fused by reciprocal rank, scored by their fused score """
+    scores: Dict[str, float] = defaultdict(float)
+    nodes: Dict[str, NodeWithScore] = {}
+    for results in result_lists:
+        for rank, node in enumerate(results):
+            scores[node.node.node_id] += 1.0 / (k + rank + 1)
+            nodes.setdefault(node.node.node_id, node)
+    fused = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id].node, score=scores[node_id]) for node_id in fused]
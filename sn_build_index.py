@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from sn_manifest import file_entry, file_sha256, list_transcripts, save_manifest
+from sn_options import MMAP_DTYPES
+from sn_pipeline import batched, map_ordered, prefetch
+from sn_rag_engine import EMBED_MODEL_FILE, SnRAGEngine
+from sn_rate_limit import get_rate_limiter
+from sortfiles import lookup_catalog
+
+# llama-index and numpy are only loaded once the arguments are valid, --help doesn't wait for them
+if TYPE_CHECKING:
+    from llama_index.core.schema import BaseNode
+
+MIN_YEAR = 2015
+MAX_YEAR = 2025
+CHECKPOINT_DIR = ".build"
+
+
+@dataclass
+class BuildStats:
+    files: int = 0
+    chunks: int = 0
+    tokens: int = 0
+    resumed_files: int = 0
+    elapsed: float = 0.0
+
+    def add(self, other: "BuildStats") -> None:
+        self.files += other.files
+        self.chunks += other.chunks
+        self.tokens += other.tokens
+        self.resumed_files += other.resumed_files
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.files} files ({self.resumed_files} resumed), {self.chunks} chunks, {self.tokens} tokens "
+            f"in {self.elapsed:.1f}s: {self.files / elapsed:.1f} files/s, {self.chunks / elapsed:.1f} chunks/s, "
+            f"{self.tokens / elapsed:.0f} tokens/s"
+        )
+
+
+def parse_transcript(path: str) -> List[BaseNode]:
+    """Parse a transcript file into nodes. Runs in a worker process."""
+    return SnRAGEngine().load_file(path)
+
+
+class IndexBuilder:
+    """
+    Bulk index builder: transcripts are parsed in a process pool, chunks are embedded in
+    concurrent rate-limited batches while later files are still being parsed, and every
+    embedded file is checkpointed to disk so that an interrupted build resumes where it stopped.
+    """
+    def __init__(
+        self,
+        engine: SnRAGEngine,
+        parse_pool: Executor,
+        embed_batch_size: int = 64,
+        embed_concurrency: int = 4,
+        mmap_dtype: Optional[str] = None,
+        parse_window: int = 16,
+    ) -> None:
+        self.engine = engine
+        self.parse_pool = parse_pool
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.mmap_dtype = mmap_dtype
+        # Files parsed ahead of the embedding
+        self.parse_window = parse_window
+        from llama_index.core.utils import get_tokenizer
+        self.tokenizer = get_tokenizer()
+        self._print_lock = threading.Lock()
+
+    def log(self, message: str) -> None:
+        with self._print_lock:
+            print(message, flush=True)
+
+    def build(self, docs_path: str, index_path: str) -> BuildStats:
+        """Build the index for docs_path into index_path, resuming from a previous checkpoint if any."""
+        from llama_index.core import VectorStoreIndex
+
+        from sn_vector_store import remove_mmap_store, write_mmap_store
+        start_time = time.perf_counter()
+        stats = BuildStats()
+        checkpoint_dir = os.path.join(index_path, CHECKPOINT_DIR)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        files = list_transcripts(docs_path)
+        # Files cataloged by sortfiles.py and unchanged since are not read again
+        catalog = {fname: lookup_catalog(path) for fname, path in files.items()}
+        hashes = {fname: catalog[fname]["sha256"] if catalog[fname] else file_sha256(path) for fname, path in files.items()}
+        nodes_by_file: Dict[str, List[BaseNode]] = {}
+        to_parse = []
+        for fname in files:
+            nodes = self._load_checkpoint(checkpoint_dir, fname, hashes[fname])
+            if nodes is None:
+                to_parse.append(fname)
+            else:
+                nodes_by_file[fname] = nodes
+                stats.resumed_files += 1
+        if stats.resumed_files:
+            self.log(f"⏩ {docs_path}: resuming with {stats.resumed_files} checkpointed files")
+
+        # Files are embedded as soon as they are parsed, with a bounded number of files and batches in flight
+        self._embed(to_parse, files, nodes_by_file, checkpoint_dir, hashes, stats)
+
+        nodes = [node for fname in files for node in nodes_by_file[fname]]
+        index = VectorStoreIndex(nodes, embed_model=self.engine.embed_model)
+        # A binary store of the previous index would be preferred over the new JSON index
+        remove_mmap_store(index_path)
+        index.storage_context.persist(persist_dir=index_path)
+        if self.mmap_dtype:
+            write_mmap_store(index_path, nodes, [node.embedding for node in nodes], dtype=self.mmap_dtype)
+        with open(os.path.join(index_path, EMBED_MODEL_FILE), "w") as f:
+            f.write(self.engine.get_model_id())
+        save_manifest(index_path, {
+            fname: file_entry(path, [node.node_id for node in nodes_by_file[fname]], hashes[fname])
+            for fname, path in files.items()
+        })
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+        stats.files = len(files)
+        stats.elapsed = time.perf_counter() - start_time
+        return stats
+
+    def build_target(self, name: str, docs_path: str, index_path: str, force: bool = False) -> Optional[BuildStats]:
+        """Build an index unless it exists and force is False, returns the build statistics or None if skipped."""
+        if not os.path.isdir(docs_path):
+            self.log(f"⚠️ {name}: no transcripts in {docs_path}, skipped")
+            return None
+        if os.path.exists(os.path.join(index_path, EMBED_MODEL_FILE)) and not force:
+            # Existing index: loading it updates the JSON index with the transcript changes,
+            # and converts its binary store again if it has one
+            self.engine.get_index(docs_path, index_path)
+            self.log(f"✅ {name}: index is up to date (use --force to rebuild)")
+            return None
+        stats = self.build(docs_path, index_path)
+        self.log(f"✅ {name}: {stats}")
+        return stats
+
+    def _parse(self, to_parse: List[str], files: Dict[str, str]) -> Iterator[Tuple[str, List[BaseNode]]]:
+        """Yield the nodes of each file in order, parsing a few files ahead in the parse pool."""
+        paths = [files[fname] for fname in to_parse]
+        parsed = map_ordered(parse_transcript, paths, max_pending=self.parse_window, executor=self.parse_pool)
+        yield from zip(to_parse, parsed)
+
+    def _embed(
+        self,
+        to_parse: List[str],
+        files: Dict[str, str],
+        nodes_by_file: Dict[str, List[BaseNode]],
+        checkpoint_dir: str,
+        hashes: Dict[str, str],
+        stats: BuildStats
+    ) -> None:
+        """
+        Parse and embed the files in batches, checkpointing each file once all of its chunks are embedded.
+        Parsing runs ahead of the embedding in a background thread, bounded to a few batches.
+        """
+        from llama_index.core.schema import MetadataMode
+        pending: Dict[str, int] = {}
+
+        def parsed_items() -> Iterator[Tuple[str, BaseNode]]:
+            for fname, nodes in self._parse(to_parse, files):
+                nodes_by_file[fname] = nodes
+                pending[fname] = len(nodes)
+                if not nodes:
+                    self._save_checkpoint(checkpoint_dir, fname, hashes[fname], [])
+                for node in nodes:
+                    yield fname, node
+
+        rate_limiter = get_rate_limiter(self.engine.provider)
+
+        def embed_batch(items: List[Tuple[str, BaseNode]]) -> List[List[float]]:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for _, node in items]
+            with rate_limiter:
+                return self.engine.embed_model.get_text_embedding_batch(texts)
+
+        batches = prefetch(batched(parsed_items(), self.embed_batch_size))
+        # Batches are taken from the parser only as embedding requests complete
+        embedded = map_ordered(
+            lambda items: (items, embed_batch(items)), batches,
+            workers=self.embed_concurrency, max_pending=2 * self.embed_concurrency,
+        )
+        for items, embeddings in embedded:
+            for (fname, node), embedding in zip(items, embeddings):
+                node.embedding = embedding
+                stats.chunks += 1
+                stats.tokens += len(self.tokenizer(node.get_content(metadata_mode=MetadataMode.EMBED)))
+                pending[fname] -= 1
+                if pending[fname] == 0:
+                    self._save_checkpoint(checkpoint_dir, fname, hashes[fname], nodes_by_file[fname])
+
+    @staticmethod
+    def _checkpoint_path(checkpoint_dir: str, fname: str, sha256: str) -> str:
+        return os.path.join(checkpoint_dir, f"{fname}.{sha256[:16]}.json")
+
+    def _save_checkpoint(self, checkpoint_dir: str, fname: str, sha256: str, nodes: List[BaseNode]) -> None:
+        path = self._checkpoint_path(checkpoint_dir, fname, sha256)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([node.to_dict() for node in nodes], f)
+        # Atomic rename, so a crash never leaves a truncated checkpoint behind
+        os.replace(path + ".tmp", path)
+
+    def _load_checkpoint(self, checkpoint_dir: str, fname: str, sha256: str) -> Optional[List[BaseNode]]:
+        from llama_index.core.schema import TextNode
+        path = self._checkpoint_path(checkpoint_dir, fname, sha256)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return [TextNode.from_dict(data) for data in json.load(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the vector indexes of the podcast transcripts ahead of querying.")
+    parser.add_argument("-sy", "--start-year", type=int, default=MIN_YEAR, help="First year to index")
+    parser.add_argument("-ey", "--end-year", type=int, default=MAX_YEAR, help="Last year to index")
+    parser.add_argument("--transcripts-dir", type=str, default="./transcripts", help="Directory containing transcript files")
+    parser.add_argument("--index-dir", type=str, default="./index", help="Directory containing index files")
+    parser.add_argument("--unified", action="store_true", default=False, help="Build the single index covering all years")
+    parser.add_argument("--force", action="store_true", default=False, help="Rebuild indexes that already exist")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count(), help="Number of processes parsing transcripts")
+    parser.add_argument("--embed-batch-size", type=int, default=64, help="Number of chunks per embedding request")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="Number of concurrent embedding requests per index (capped by the provider's rate limits)")
+    parser.add_argument("--year-concurrency", type=int, default=2, help="Number of years built in parallel")
+    parser.add_argument("--mmap-dtype", type=str, choices=MMAP_DTYPES, default=None, help="Also write the binary memory-mapped format with this vector type")
+    args = parser.parse_args()
+
+    if args.start_year < MIN_YEAR or args.end_year > MAX_YEAR:
+        print(f"Start year must be >= {MIN_YEAR} and end year must be <= {MAX_YEAR}.")
+        exit(1)
+    if args.start_year > args.end_year:
+        print("Start year must be <= end year.")
+        exit(1)
+    if min(args.parse_workers, args.embed_batch_size, args.embed_concurrency, args.year_concurrency) < 1:
+        print("Worker counts and batch size must be >= 1.")
+        exit(1)
+
+    load_dotenv()
+
+    provider = os.getenv("LLM_PROVIDER", "openai")
+    SnRAGEngine.set_llm(provider, index_dir=args.index_dir)
+
+    engine = SnRAGEngine(transcripts_dir=args.transcripts_dir, index_dir=args.index_dir)
+    if args.unified:
+        targets = [("all", engine.transcripts_dir, engine.get_unified_index_path())]
+    else:
+        targets = [(str(year), engine.get_transcripts_path(year), engine.get_index_path(year))
+                   for year in range(args.start_year, args.end_year + 1)]
+
+    total = BuildStats()
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.parse_workers) as parse_pool:
+        builder = IndexBuilder(
+            engine, parse_pool, args.embed_batch_size, args.embed_concurrency, args.mmap_dtype,
+            parse_window=2 * args.parse_workers,
+        )
+
+        with ThreadPoolExecutor(max_workers=args.year_concurrency) as executor:
+            futures = {executor.submit(builder.build_target, *target, args.force): target[0] for target in targets}
+            for future in as_completed(futures):
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    builder.log(f"❌ {futures[future]}: build failed, rerun to resume: {e}")
+                    continue
+                if stats:
+                    total.add(stats)
+
+    total.elapsed = time.perf_counter() - start_time
+    print(f"\n=== Total ===\n{total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,75 @@
 import argparse
 import os
+from collections import defaultdict
+from typing import Dict, Iterable, List
 from dotenv import load_dotenv
-from sn_rag_engine import SnRAGEngine
+from sn_client import SERVER_URL_ENV, SnClient
+from sn_events import QueryEvent, QueryEventType
+from sn_metrics import METRICS, METRICS_FILE_ENV, HistogramSink, JsonLinesSink
+from sn_options import CONTEXT_TOKEN_BUDGET, RERANK_MODES, RETRIEVAL_MODES, SUMMARY_MODES
 
 MIN_YEAR = 2015
 MAX_YEAR = 2025
 
 
+class StreamPrinter:
+    """
+    Renders the events of a streamed query. Years are answered concurrently, so the tokens
+    of the earliest unfinished year are printed live while the later years are buffered
+    and flushed in order once it completes.
+    """
+    def __init__(self, years: List[int], show_intermediate: bool) -> None:
+        self.years = years
+        self.show_intermediate = show_intermediate
+        self.buffers: Dict[int, List[str]] = defaultdict(list)
+        self.finished = set()
+        self.current = 0
+        self.header_printed = False
+        self.summarized = False
+
+    def print_events(self, events: Iterable[QueryEvent]) -> None:
+        for event in events:
+            self.handle(event)
+
+    def handle(self, event: QueryEvent) -> None:
+        if event.type == QueryEventType.TOKEN and self.show_intermediate:
+            self.buffers[event.year].append(event.text)
+            self._flush()
+        elif event.type in (QueryEventType.YEAR_DONE, QueryEventType.YEAR_FAILED):
+            if event.type == QueryEventType.YEAR_FAILED:
+                if self.show_intermediate:
+                    self.buffers[event.year].append(f"❌ Query failed: {event.text}")
+                else:
+                    print(f"\n--- {event.year} ---\n❌ Query failed: {event.text}\n")
+            self.finished.add(event.year)
+            self._flush()
+        elif event.type == QueryEventType.SUMMARY_STARTED:
+            self.summarized = True
+            print("\n\n=== Summary result ===")
+        elif event.type == QueryEventType.SUMMARY_TOKEN:
+            print(event.text, end="", flush=True)
+        elif event.type == QueryEventType.DONE:
+            if not self.summarized:
+                print("\n\n=== Summary result ===")
+                print(event.text, end="")
+            print()
+
+    def _flush(self) -> None:
+        if not self.show_intermediate:
+            return
+        while self.current < len(self.years):
+            year = self.years[self.current]
+            if not self.header_printed:
+                print(f"\n--- {year} ---")
+                self.header_printed = True
+            print("".join(self.buffers.pop(year, [])), end="", flush=True)
+            if year not in self.finished:
+                return
+            print()
+            self.current += 1
+            self.header_printed = False
+
+
 def main():
     parser = argparse.ArgumentParser(description="Query podcast transcripts by year range and summarize results.")
     parser.add_argument("-sy", "--start-year", type=int, required=True, help="Start year for querying transcripts")
@@ -16,7 +79,22 @@ def main():
     parser.add_argument("--transcripts-dir", type=str, default="./transcripts", help="Directory containing transcript files")
     parser.add_argument("--index-dir", type=str, default="./index", help="Directory containing index files")
     parser.add_argument("-d", "--debug", action="store_true", default=False, help="Show debug information")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Number of years to query in parallel (capped by the provider's rate limits)")
+    parser.add_argument("--unified", action="store_true", default=False, help="Use a single index over all years filtered by date")
+    parser.add_argument("--per-year-quota", type=int, default=None, help="With --unified, answer year by year using at most this many chunks per year")
+    parser.add_argument("--no-answer-cache", action="store_true", default=False, help="Do not reuse or store cached answers")
+    parser.add_argument("--summary-mode", type=str, choices=SUMMARY_MODES, default="single", help="Summarize all years in one LLM call, or reduce them hierarchically in concurrent groups")
+    parser.add_argument("--summary-fan-in", type=int, default=4, help="Number of responses combined per LLM call in tree summary mode")
+    parser.add_argument("--retrieval-mode", type=str, choices=RETRIEVAL_MODES, default="vector", help="Retrieve chunks by vector search (default), or opt in to BM25 keyword search or both fused")
+    parser.add_argument("--similarity-cutoff", type=float, default=None, help="Drop retrieved chunks scoring below this similarity")
+    parser.add_argument("--relative-cutoff", type=float, default=None, help="Drop retrieved chunks scoring below this fraction of the best chunk's score (0 disables)")
+    parser.add_argument("--dedup-threshold", type=float, default=None, help="Shingle overlap above which retrieved chunks are collapsed as near-duplicates (0 disables)")
+    parser.add_argument("--rerank", type=str, choices=RERANK_MODES, default="none", help="Rerank retrieved chunks locally before synthesis")
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKEN_BUDGET, help="Context token budget per LLM call (0 disables)")
     parser.add_argument("--summary-prompt", type=str, default=None, help="Custom summary prompt template. Use '{query_text}' and '{responses}' as placeholders.")
+    parser.add_argument("--server", type=str, default=None, help=f"URL of a running sn_server.py to send the query to (default: ${SERVER_URL_ENV}); the engine options are then the server's")
+    parser.add_argument("--metrics-file", type=str, default=os.getenv(METRICS_FILE_ENV), help=f"Append per-stage timings and counters to this JSON lines file (default: ${METRICS_FILE_ENV})")
+    parser.add_argument("--metrics-summary", action="store_true", default=False, help="Print a summary of the per-stage timings and counters")
     args = parser.parse_args()
 
     if args.start_year < MIN_YEAR or args.end_year > MAX_YEAR:
@@ -25,6 +103,9 @@ def main():
     if args.start_year > args.end_year:
         print("Start year must be <= end year.")
         exit(1)
+    if args.concurrency < 1:
+        print("Concurrency must be >= 1.")
+        exit(1)
     if not args.query.strip():
         print("Query must not be empty.")
         exit(1)
@@ -32,24 +113,60 @@ def main():
     load_dotenv()
 
     provider = os.getenv("LLM_PROVIDER", "openai")
-    SnRAGEngine.set_llm(provider)
+    printer = StreamPrinter(list(range(args.start_year, args.end_year + 1)), show_intermediate=not args.hide_intermediate)
+    server_url = args.server or os.getenv(SERVER_URL_ENV)
+    if server_url:
+        printer.print_events(SnClient(server_url).stream_range(args.query, args.start_year, args.end_year, provider=provider))
+        return
+
+    # The engine and llama-index are only loaded once the arguments are valid, and not at all with a server
+    from sn_postprocess import RetrievalConfig
+    from sn_rag_engine import SnRAGEngine
+
+    retrieval = RetrievalConfig(mode=args.retrieval_mode, rerank=args.rerank, context_token_budget=args.context_tokens)
+    if args.similarity_cutoff is not None:
+        retrieval.similarity_cutoff = args.similarity_cutoff
+    if args.relative_cutoff is not None:
+        retrieval.relative_cutoff = args.relative_cutoff
+    if args.dedup_threshold is not None:
+        retrieval.dedup_threshold = args.dedup_threshold
+
+    metrics_summary = METRICS.add_sink(HistogramSink()) if args.metrics_summary else None
+    if args.metrics_file:
+        METRICS.add_sink(JsonLinesSink(args.metrics_file))
+
+    SnRAGEngine.set_llm(provider, index_dir=args.index_dir)
 
     engine = SnRAGEngine(
         transcripts_dir=args.transcripts_dir,
         index_dir=args.index_dir,
         summary_prompt=args.summary_prompt,
         debug_mode=args.debug,
+        concurrency=args.concurrency,
+        unified=args.unified,
+        per_year_quota=args.per_year_quota,
+        use_answer_cache=not args.no_answer_cache,
+        summary_mode=args.summary_mode,
+        summary_fan_in=args.summary_fan_in,
+        retrieval=retrieval,
     )
 
-    result = engine.query_range(
-        query_text=args.query,
-        start_year=args.start_year,
-        end_year=args.end_year,
-        show_intermediate=not args.hide_intermediate,
-    )
+    if args.unified:
+        result = engine.query_range(
+            query_text=args.query,
+            start_year=args.start_year,
+            end_year=args.end_year,
+            show_intermediate=not args.hide_intermediate,
+        )
+
+        print("\n\n=== Summary result ===")
+        print(result)
+    else:
+        printer.print_events(engine.stream_range(args.query, args.start_year, args.end_year))
 
-    print("\n\n=== Summary result ===")
-    print(result)
+    if metrics_summary is not None:
+        print("\n\n=== Metrics ===")
+        print(metrics_summary.format_summary())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+import json
+import urllib.error
+import urllib.request
+from typing import Iterator, Optional
+
+from sn_events import QueryEvent, QueryEventType
+
+SERVER_URL_ENV = "SN_SERVER_URL"
+
+
+class SnClient:
+    """
+    Thin client of sn_server. Mirrors the query methods of SnRAGEngine so front-ends can use either,
+    and only depends on the standard library so that it starts instantly.
+    """
+    def __init__(self, url: str, timeout: float = 600) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, query_text: str, start_year: int, end_year: int, provider: Optional[str], api_key: Optional[str]):
+        payload = {"query": query_text, "start_year": start_year, "end_year": end_year, "provider": provider, "api_key": api_key}
+        request = urllib.request.Request(
+            self.url + path, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise RuntimeError(f"Server error {e.code}: {message}") from None
+
+    def stream_range(
+        self,
+        query_text: str,
+        start_year: int,
+        end_year: int,
+        provider: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> Iterator[QueryEvent]:
+        """Query a range of years on the server, yielding its QueryEvents as they arrive."""
+        with self._post("/stream", query_text, start_year, end_year, provider, api_key) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = QueryEvent.from_dict(json.loads(line))
+                if event.type == QueryEventType.ERROR:
+                    raise RuntimeError(event.text)
+                yield event
+
+    def query_range(
+        self,
+        query_text: str,
+        start_year: int,
+        end_year: int,
+        provider: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> str:
+        """Query a range of years on the server and return the summarized answer."""
+        with self._post("/query", query_text, start_year, end_year, provider, api_key) as response:
+            return json.load(response)["result"]
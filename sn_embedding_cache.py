@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseKVStore
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("SN_EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+# Eviction is checked once every this many insertions
+EVICTION_CHECK_INTERVAL = 256
+# Cache hits are written back as last used times once this many are pending, or with the next insertion
+LAST_USED_FLUSH_INTERVAL = 256
+
+
+def normalize_query(query_text: str) -> str:
+    """ Returns the query text lowercased and with whitespace collapsed, used as a cache key """
+    return " ".join(query_text.lower().split())
+
+
+def text_hash(text: str) -> str:
+    """ Returns the SHA-256 hex digest of a text, used as a content address """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embed_model_id(embed_model: Any) -> str:
+    """ Returns a string ID representing an embedding model """
+    model_class = embed_model.__class__.__name__
+    model_config = getattr(embed_model, 'model_name', getattr(embed_model, 'model', 'unknown'))
+    return f"{model_class}:{model_config}"
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite, keyed by (model id, key).
+    Vectors are stored as float32 blobs. The database is created on first use,
+    and once it holds more than max_entries the least recently used ones are evicted.
+    Hits only update the last used times in memory, they are written in batches: a few
+    recent hits may be lost on exit, which only affects the order of evictions.
+    """
+    def __init__(self, path: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._last_used: Dict[Tuple[str, str], float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model_id TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model_id, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, model_id: str, key: str) -> Optional[List[float]]:
+        """Return the cached embedding, or None on a miss."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT vector FROM embeddings WHERE model_id = ? AND key = ?", (model_id, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._last_used[(model_id, key)] = time.time()
+            if len(self._last_used) >= LAST_USED_FLUSH_INTERVAL:
+                self._flush_last_used(conn)
+                conn.commit()
+        return array("f", row[0]).tolist()
+
+    def put(self, model_id: str, key: str, embedding: List[float]) -> None:
+        """Store an embedding, replacing any previous value for the key."""
+        with self._lock:
+            conn = self._connect()
+            self._flush_last_used(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model_id, key, vector, last_used) VALUES (?, ?, ?, ?)",
+                (model_id, key, array("f", embedding).tobytes(), time.time()),
+            )
+            self._puts += 1
+            if self._puts % EVICTION_CHECK_INTERVAL == 0:
+                self._evict(conn)
+            conn.commit()
+
+    def delete(self, model_id: str, key: str) -> bool:
+        """Remove an embedding, returns True if it was cached."""
+        with self._lock:
+            conn = self._connect()
+            self._last_used.pop((model_id, key), None)
+            deleted = conn.execute(
+                "DELETE FROM embeddings WHERE model_id = ? AND key = ?", (model_id, key)
+            ).rowcount
+            conn.commit()
+        return deleted > 0
+
+    def flush(self) -> None:
+        """Write the pending last used times of the cache hits."""
+        with self._lock:
+            if self._last_used:
+                conn = self._connect()
+                self._flush_last_used(conn)
+                conn.commit()
+
+    def _flush_last_used(self, conn: sqlite3.Connection) -> None:
+        if self._last_used:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model_id = ? AND key = ?",
+                [(last_used, model_id, key) for (model_id, key), last_used in self._last_used.items()],
+            )
+            self._last_used.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str) -> EmbeddingCache:
+    """ Returns the process-wide embedding cache stored at path """
+    with _caches_lock:
+        key = os.path.abspath(path)
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(path)
+        return _caches[key]
+
+
+class EmbeddingKVStore(BaseKVStore):
+    """
+    Adapter exposing an EmbeddingCache as the llama-index embeddings_cache of an embedding model.
+    Texts are content-addressed by their SHA-256 and scoped by model id, so the same chunk is
+    only embedded once per model across years, rebuilds and chunking configurations.
+    """
+    def __init__(self, cache: EmbeddingCache, model_id: str) -> None:
+        self.cache = cache
+        self.model_id = model_id
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.cache.put(self.model_id, text_hash(key), next(iter(val.values())))
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        embedding = self.cache.get(self.model_id, text_hash(key))
+        return None if embedding is None else {"embedding": embedding}
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        raise NotImplementedError("The embedding cache is content-addressed and cannot list its keys")
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.cache.delete(self.model_id, text_hash(key))
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
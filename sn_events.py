@@ -0,0 +1,30 @@
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Optional
+
+
+class QueryEventType(str, Enum):
+    YEAR_STARTED = "year_started"
+    RETRIEVAL_DONE = "retrieval_done"
+    TOKEN = "token"
+    YEAR_DONE = "year_done"
+    YEAR_FAILED = "year_failed"
+    SUMMARY_STARTED = "summary_started"
+    SUMMARY_TOKEN = "summary_token"
+    DONE = "done"
+    ERROR = "error"
+
+
+@dataclass
+class QueryEvent:
+    """Progress event of a streamed query. text holds the token, the full answer or the error, depending on the type."""
+    type: QueryEventType
+    year: Optional[int] = None
+    text: str = ""
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "type": self.type.value}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueryEvent":
+        return cls(QueryEventType(data["type"]), data.get("year"), data.get("text", ""))
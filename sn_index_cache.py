@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv("SN_INDEX_CACHE_MAX_ENTRIES", "22"))
+INDEX_CACHE_MAX_BYTES = int(os.getenv("SN_INDEX_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+def index_signature(index_path: str) -> Optional[Tuple]:
+    """ Returns a manifest of (file name, size, mtime) for the files persisted under index_path,
+    or None if the index path does not exist.
+    """
+    if not os.path.isdir(index_path):
+        return None
+    entries = []
+    for entry in os.scandir(index_path):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def index_size(index_path: str) -> int:
+    """ Returns the on-disk size in bytes of the index persisted under index_path """
+    signature = index_signature(index_path) or ()
+    return sum(size for _, size, _ in signature)
+
+
+@dataclass
+class IndexCacheStats:
+    hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    evictions: int = 0
+    load_time: float = 0.0
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    signature: Any
+    size: int
+
+
+class IndexCache:
+    """
+    Thread-safe LRU cache of loaded indexes, shared by all engine instances in the process.
+    Entries are validated against a signature of the persisted files, so an index that was
+    rebuilt on disk is reloaded. Eviction keeps both the number of entries and their total
+    on-disk size within the configured budget.
+    """
+    def __init__(self, max_entries: int = INDEX_CACHE_MAX_ENTRIES, max_bytes: int = INDEX_CACHE_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = IndexCacheStats()
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        signature_fn: Callable[[], Any],
+        loader: Callable[[], Any],
+        size_fn: Callable[[], int] = lambda: 0,
+    ) -> Any:
+        """Return the cached value for key, calling loader on a miss or a stale signature."""
+        signature = signature_fn()
+        with self._lock:
+            value = self._lookup(key, signature)
+            if value is not None:
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key, the others wait and then hit the cache.
+        with key_lock:
+            signature = signature_fn()
+            with self._lock:
+                value = self._lookup(key, signature)
+                if value is not None:
+                    return value
+                self.stats.misses += 1
+            start_time = time.perf_counter()
+            value = loader()
+            elapsed = time.perf_counter() - start_time
+            # The loader may have (re)built the index, so take the signature again.
+            self.put(key, value, signature_fn(), size_fn(), load_time=elapsed)
+        return value
+
+    def put(self, key: Hashable, value: Any, signature: Any, size: int = 0, load_time: float = 0.0) -> None:
+        """Insert or replace an entry and evict the least recently used ones if over budget."""
+        with self._lock:
+            self.stats.loads += 1
+            self.stats.load_time += load_time
+            self._discard(key)
+            self._entries[key] = _CacheEntry(value, signature, size)
+            self._size += size
+            self._evict()
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry from the cache."""
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        """Drop all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats_dict(self) -> dict:
+        """Return a snapshot of the counters along with the current occupancy."""
+        with self._lock:
+            stats = asdict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self._size)
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable, signature: Any) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry.signature != signature:
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.value
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds the byte budget.
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self.stats.evictions += 1
+
+
+# Process-wide cache: it lives in the module, so it survives engine instances and Streamlit reruns.
+INDEX_CACHE = IndexCache()
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.json"
+
+
+@dataclass
+class IndexUpdate:
+    """Files added, changed and removed since an index was last synchronized with its transcripts."""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+def file_sha256(path: str) -> str:
+    """ Returns the SHA-256 hex digest of the file's content """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_transcripts(directory: str) -> Dict[str, str]:
+    """ Returns a mapping of file name to path for the .txt files under directory and its subdirectories """
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for fname in sorted(names):
+            if fname.endswith(".txt"):
+                files[fname] = os.path.join(root, fname)
+    return files
+
+
+def transcripts_signature(directory: str) -> Tuple:
+    """ Returns a cheap signature of the transcripts under directory, changing when files are added, removed or modified """
+    entries = []
+    for fname, path in list_transcripts(directory).items():
+        stat = os.stat(path)
+        entries.append((fname, stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+
+def file_entry(path: str, node_ids: List[str], sha256: Optional[str] = None) -> dict:
+    """ Returns the manifest entry of a transcript file indexed as the given nodes """
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256 or file_sha256(path),
+        "node_ids": node_ids,
+    }
+
+
+def load_manifest(index_path: str) -> Optional[Dict[str, dict]]:
+    """ Returns the manifest persisted with the index, or None if there is none """
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def save_manifest(index_path: str, manifest: Dict[str, dict]) -> None:
+    """ Persists the manifest next to the index """
+    with open(os.path.join(index_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"files": manifest}, f, separators=(",", ":"))
+
+
+def diff_manifest(manifest: Dict[str, dict], files: Dict[str, str]) -> IndexUpdate:
+    """
+    Compare the manifest with the transcript files on disk.
+    Files whose size and mtime are unchanged are not read, the others are hashed so that
+    a touched but identical file is not reported as changed (its entry is refreshed instead).
+    """
+    update = IndexUpdate()
+    for fname, path in files.items():
+        entry = manifest.get(fname)
+        if entry is None:
+            update.added.append(fname)
+            continue
+        stat = os.stat(path)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            continue
+        sha256 = file_sha256(path)
+        if sha256 == entry["sha256"]:
+            manifest[fname] = file_entry(path, entry["node_ids"], sha256)
+        else:
+            update.changed.append(fname)
+    update.removed = [fname for fname in manifest if fname not in files]
+    return update
@@ -0,0 +1,274 @@
+import contextlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+
+METRICS_FILE_ENV = "SN_METRICS_FILE"
+# Recent observations kept per series for the quantiles of the histogram summary
+HISTOGRAM_SAMPLES = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_PREFIX = "sn_"
+
+
+@dataclass
+class Sample:
+    """A single observation: a timer in seconds or a counter increment, tagged e.g. by year, provider and model."""
+    name: str
+    kind: str
+    value: float
+    tags: Dict[str, str]
+    time: float
+
+    def to_dict(self) -> dict:
+        return {"time": round(self.time, 6), "name": self.name, "type": self.kind, "value": self.value, "tags": self.tags}
+
+
+class MetricsSink:
+    """Receives the samples recorded while it is added to the metrics registry."""
+    def record(self, sample: Sample) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink(MetricsSink):
+    """Appends each sample to a JSON lines file."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, sample: Sample) -> None:
+        line = json.dumps(sample.to_dict()) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class _Series:
+    __slots__ = ("kind", "count", "total", "recent")
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.count = 0
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=HISTOGRAM_SAMPLES)
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+class HistogramSink(MetricsSink):
+    """
+    Aggregates the samples in process: the count and sum of each series (name and tags),
+    and the quantiles of its most recent observations.
+    """
+    def __init__(self) -> None:
+        self._series: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sample: Sample) -> None:
+        key = (sample.name, tuple(sorted(sample.tags.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(sample.kind)
+            series.count += 1
+            series.total += sample.value
+            if sample.kind == "timer":
+                series.recent.append(sample.value)
+
+    def summary(self) -> List[dict]:
+        """ Returns one dict per series, with its name, tags, count, sum and for timers mean and quantiles """
+        with self._lock:
+            items = sorted(self._series.items())
+            rows = []
+            for (name, tags), series in items:
+                row = {"name": name, "type": series.kind, "tags": dict(tags), "count": series.count, "sum": round(series.total, 6)}
+                if series.kind == "timer":
+                    row["mean"] = round(series.total / series.count, 6)
+                    row.update({f"p{int(q * 100)}": round(series.quantile(q), 6) for q in QUANTILES})
+                rows.append(row)
+            return rows
+
+    def format_summary(self) -> str:
+        """ Returns the summary as a human-readable table """
+        lines = []
+        for row in self.summary():
+            tags = ",".join(f"{key}={value}" for key, value in row["tags"].items())
+            if row["type"] == "timer":
+                lines.append(
+                    f"{row['name']:<24} {tags:<48} n={row['count']:<5} mean={row['mean']:.3f}s "
+                    f"p50={row['p50']:.3f}s p95={row['p95']:.3f}s"
+                )
+            else:
+                lines.append(f"{row['name']:<24} {tags:<48} total={row['sum']:g}")
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        """ Returns the series in the Prometheus text exposition format: timers as summaries, counters as counters """
+        output = []
+        by_name: Dict[str, List[dict]] = {}
+        for row in self.summary():
+            by_name.setdefault(row["name"], []).append(row)
+        for name, rows in by_name.items():
+            metric = PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+            if rows[0]["type"] == "timer":
+                metric += "_seconds"
+                output.append(f"# TYPE {metric} summary")
+                for row in rows:
+                    for q in QUANTILES:
+                        labels = _prometheus_labels({**row["tags"], "quantile": str(q)})
+                        output.append(f"{metric}{labels} {row[f'p{int(q * 100)}']}")
+                    output.append(f"{metric}_sum{_prometheus_labels(row['tags'])} {row['sum']}")
+                    output.append(f"{metric}_count{_prometheus_labels(row['tags'])} {row['count']}")
+            else:
+                metric += "_total"
+                output.append(f"# TYPE {metric} counter")
+                for row in rows:
+                    output.append(f"{metric}{_prometheus_labels(row['tags'])} {row['sum']:g}")
+        return "\n".join(output) + "\n"
+
+
+def _prometheus_labels(tags: Dict[str, str]) -> str:
+    if not tags:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in tags.values())
+    return "{" + ",".join(f"{re.sub(r'[^a-zA-Z0-9_]', '_', key)}=\"{value}\"" for key, value in zip(tags, escaped)) + "}"
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "tags", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, tags: Dict[str, str]) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.tags)
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Registry of the pipeline's timers and counters. Samples are tagged with the keyword arguments
+    of the call, merged over the tags of the current thread's context. Without any sink every
+    call returns immediately, so instrumentation costs next to nothing unless metrics are enabled.
+    """
+    def __init__(self) -> None:
+        self._sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+        self._context = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._sinks)
+
+    def add_sink(self, sink: MetricsSink) -> MetricsSink:
+        with self._lock:
+            self._sinks = self._sinks + [sink]
+        _install_llm_handler()
+        return sink
+
+    def remove_sink(self, sink: MetricsSink) -> None:
+        with self._lock:
+            self._sinks = [s for s in self._sinks if s is not sink]
+        sink.close()
+
+    def current_tags(self) -> Dict[str, str]:
+        return getattr(self._context, "tags", {})
+
+    @contextlib.contextmanager
+    def _tagged(self, tags: Dict[str, Any]) -> Iterator[None]:
+        previous = self.current_tags()
+        self._context.tags = {**previous, **{key: str(value) for key, value in tags.items() if value is not None}}
+        try:
+            yield
+        finally:
+            self._context.tags = previous
+
+    def tags(self, **tags: Any):
+        """Context manager tagging the samples recorded by the current thread, such as the LLM token counts."""
+        return self._tagged(tags) if self._sinks else _NULL_CONTEXT
+
+    def timer(self, name: str, **tags: Any):
+        """Context manager recording the seconds spent in its block."""
+        return _Timer(self, name, tags) if self._sinks else _NULL_CONTEXT
+
+    def observe(self, name: str, seconds: float, **tags: Any) -> None:
+        self._record(name, "timer", seconds, tags)
+
+    def count(self, name: str, value: float = 1, **tags: Any) -> None:
+        self._record(name, "counter", value, tags)
+
+    def _record(self, name: str, kind: str, value: float, tags: Dict[str, Any]) -> None:
+        sinks = self._sinks
+        if not sinks:
+            return
+        merged = {**self.current_tags(), **{key: str(value) for key, value in tags.items() if value is not None}}
+        sample = Sample(name, kind, value, merged, time.time())
+        for sink in sinks:
+            sink.record(sample)
+
+
+# Process-wide registry used by the engine, the CLI and the server
+METRICS = Metrics()
+
+_llm_handler_installed = False
+_llm_handler_lock = threading.Lock()
+
+
+def _install_llm_handler() -> None:
+    """Count the prompt and completion tokens of every LLM call through llama-index's instrumentation events."""
+    global _llm_handler_installed
+    with _llm_handler_lock:
+        if _llm_handler_installed:
+            return
+        from llama_index.core.callbacks.token_counting import get_tokens_from_response
+        from llama_index.core.instrumentation import get_dispatcher
+        from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+        from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMCompletionEndEvent
+        from llama_index.core.utils import get_tokenizer
+
+        class TokenCountingEventHandler(BaseEventHandler):
+            @classmethod
+            def class_name(cls) -> str:
+                return "TokenCountingEventHandler"
+
+            def handle(self, event, **kwargs) -> None:
+                if not METRICS.enabled or not isinstance(event, (LLMCompletionEndEvent, LLMChatEndEvent)) or event.response is None:
+                    return
+                prompt_tokens, completion_tokens = get_tokens_from_response(event.response)
+                if not prompt_tokens and not completion_tokens:
+                    # The provider reported no usage, count with the local tokenizer
+                    tokenizer = get_tokenizer()
+                    if isinstance(event, LLMCompletionEndEvent):
+                        prompt_text = event.prompt
+                        completion_text = event.response.text
+                    else:
+                        prompt_text = "\n".join(str(message.content or "") for message in event.messages)
+                        completion_text = str(event.response.message.content or "")
+                    prompt_tokens, completion_tokens = len(tokenizer(prompt_text)), len(tokenizer(completion_text or ""))
+                METRICS.count("llm_calls")
+                METRICS.count("llm_prompt_tokens", prompt_tokens)
+                METRICS.count("llm_completion_tokens", completion_tokens)
+
+        get_dispatcher().add_event_handler(TokenCountingEventHandler())
+        _llm_handler_installed = True
@@ -0,0 +1,16 @@
+import os
+
+# Values of the engine options shared by the command lines, the server and the engine.
+# This module must stay free of heavy imports: the command lines validate their
+# arguments, and print --help, before llama-index and the provider SDKs are loaded.
+
+PROVIDERS = ("openai", "together", "fireworks")
+SUMMARY_MODES = ("single", "tree")
+RERANK_MODES = ("none", "lexical", "cross-encoder")
+# "vector" is the default. "hybrid" fuses vector and BM25 results and answers keyword-heavy queries
+# from BM25 alone, "lexical" only searches BM25: both change the context and are opt-in
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+# Vector types of the binary memory-mapped index format
+MMAP_DTYPES = ("float32", "float16", "int8")
+# Context token budget per LLM call, 0 (the default) keeps all the retrieved chunks
+CONTEXT_TOKEN_BUDGET = int(os.getenv("SN_CONTEXT_TOKEN_BUDGET", "0"))
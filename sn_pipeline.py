@@ -0,0 +1,100 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Batches of nodes parsed ahead of the embedding, bounding the memory held between the two stages
+PREFETCH_BATCHES = 4
+
+_DONE = object()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of up to size consecutive items."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(items: Iterable[T], max_pending: int = PREFETCH_BATCHES) -> Iterator[T]:
+    """
+    Yield the items of an iterable produced in a background thread, at most max_pending ahead of
+    the consumer, so that producing (parsing) overlaps consuming (embedding) with bounded memory.
+    An error of the producer is raised in the consumer.
+    """
+    pending: "queue.Queue" = queue.Queue(maxsize=max(1, max_pending))
+    stopped = threading.Event()
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if stopped.is_set():
+                    return
+                pending.put(item)
+        except BaseException as e:
+            pending.put(_Failure(e))
+        else:
+            pending.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # The consumer stopped early: unblock the producer so that its thread ends
+        stopped.set()
+        while producer.is_alive():
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                producer.join(0.01)
+
+
+def map_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    workers: int = 1,
+    max_pending: int = PREFETCH_BATCHES,
+    executor: Optional[Executor] = None
+) -> Iterator[R]:
+    """
+    Yield fn(item) for each item in order, computing up to max_pending items at once in the given
+    executor, or in a pool of workers threads. Items are only taken from the iterable as results are consumed.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            yield from map_ordered(fn, items, max_pending=max_pending, executor=pool)
+        return
+    window: Deque[Future] = deque()
+    try:
+        for item in items:
+            window.append(executor.submit(fn, item))
+            if len(window) >= max(1, max_pending):
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+    finally:
+        for future in window:
+            future.cancel()
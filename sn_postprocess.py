@@ -0,0 +1,195 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+from sn_options import CONTEXT_TOKEN_BUDGET, RERANK_MODES, RETRIEVAL_MODES
+
+# The filters are off by default: they drop context the LLM may need, and no benchmark of answer
+# quality backs a default value yet. Each can be enabled by environment variable or command line flag
+SIMILARITY_CUTOFF = float(os.getenv("SN_SIMILARITY_CUTOFF", "0")) or None
+RELATIVE_CUTOFF = float(os.getenv("SN_RELATIVE_CUTOFF", "0")) or None
+DEDUP_THRESHOLD = float(os.getenv("SN_DEDUP_THRESHOLD", "0")) or None
+CROSS_ENCODER_MODEL = os.getenv("SN_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+SHINGLE_SIZE = 5
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he how i in is it its of on or "
+    "said say says she so that the their them they this to was we were what when where which who why "
+    "will with about steve leo".split()
+)
+
+
+def node_tokens(node: NodeWithScore, tokenizer=None) -> int:
+    """ Returns the number of tokens a node adds to the LLM context """
+    return len((tokenizer or get_tokenizer())(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> FrozenSet[Tuple[str, ...]]:
+    """ Returns the set of word n-grams of a text """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+class RelativeScorePostprocessor(BaseNodePostprocessor):
+    """Drop nodes scoring below a fraction of the best node's score, adapting the cutoff to each query."""
+    ratio: float = 0.7
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RelativeScorePostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        scores = [node.score for node in nodes if node.score is not None]
+        if not scores or max(scores) <= 0:
+            return nodes
+        cutoff = max(scores) * self.ratio
+        return [node for node in nodes if node.score is None or node.score >= cutoff]
+
+
+class DedupPostprocessor(BaseNodePostprocessor):
+    """
+    Collapse near-duplicate nodes, such as segments repeated across episodes.
+    Nodes are compared by the overlap of their word shingles relative to the smaller one,
+    so a chunk mostly contained in a better scoring one is dropped as well.
+    """
+    threshold: float = 0.8
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DedupPostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        kept: List[NodeWithScore] = []
+        kept_shingles: List[FrozenSet[Tuple[str, ...]]] = []
+        for node in sorted(nodes, key=lambda n: n.score or 0.0, reverse=True):
+            node_shingles = shingles(node.node.get_content())
+            if any(
+                len(node_shingles & other) / max(1, min(len(node_shingles), len(other))) >= self.threshold
+                for other in kept_shingles
+            ):
+                continue
+            kept.append(node)
+            kept_shingles.append(node_shingles)
+        return kept
+
+
+class LexicalReranker(BaseNodePostprocessor):
+    """
+    Rerank nodes by blending the vector score with the share of query terms each node contains.
+    Runs locally in microseconds, helping queries about names and acronyms that embeddings blur.
+    """
+    weight: float = 0.5
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LexicalReranker"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes
+        terms = set(WORD_PATTERN.findall(query_bundle.query_str.lower())) - STOP_WORDS
+        if not terms:
+            return nodes
+        top_score = max((node.score or 0.0) for node in nodes) or 1.0
+
+        def score(node: NodeWithScore) -> float:
+            words = set(WORD_PATTERN.findall(node.node.get_content().lower()))
+            coverage = len(terms & words) / len(terms)
+            return (1 - self.weight) * (node.score or 0.0) / top_score + self.weight * coverage
+
+        return sorted(nodes, key=score, reverse=True)
+
+
+class TokenBudgetPostprocessor(BaseNodePostprocessor):
+    """Keep the best nodes, in order, until the context token budget is spent. The first node is always kept."""
+    max_tokens: int = 8192
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        tokenizer = get_tokenizer()
+        kept: List[NodeWithScore] = []
+        total = 0
+        for node in nodes:
+            tokens = node_tokens(node, tokenizer)
+            if kept and total + tokens > self.max_tokens:
+                break
+            kept.append(node)
+            total += tokens
+        return kept
+
+
+_cross_encoders: Dict[str, BaseNodePostprocessor] = {}
+_cross_encoders_lock = threading.Lock()
+
+
+def get_cross_encoder(model: str = CROSS_ENCODER_MODEL) -> BaseNodePostprocessor:
+    """ Returns the process-wide cross-encoder reranker, loading the model on first use """
+    with _cross_encoders_lock:
+        if model not in _cross_encoders:
+            # Requires installing sentence-transformers
+            from llama_index.core.postprocessor import SentenceTransformerRerank
+            # top_n is applied by the token budget, the reranker only orders the nodes
+            _cross_encoders[model] = SentenceTransformerRerank(model=model, top_n=1024)
+        return _cross_encoders[model]
+
+
+@dataclass
+class RetrievalConfig:
+    """Settings of the retrieval stage: how chunks are retrieved and post-processed before synthesis."""
+    mode: str = "vector"
+    similarity_cutoff: Optional[float] = SIMILARITY_CUTOFF
+    relative_cutoff: Optional[float] = RELATIVE_CUTOFF
+    dedup_threshold: Optional[float] = DEDUP_THRESHOLD
+    rerank: str = "none"
+    context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET or None
+
+    def __post_init__(self) -> None:
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.mode}', expected one of {RETRIEVAL_MODES}")
+        if self.rerank not in RERANK_MODES:
+            raise ValueError(f"Unknown rerank mode '{self.rerank}', expected one of {RERANK_MODES}")
+
+    def postprocessors(self) -> List[BaseNodePostprocessor]:
+        """ Returns the node postprocessors in the order they run """
+        return self.cutoff_postprocessors() + self.context_postprocessors()
+
+    def cutoff_postprocessors(self) -> List[BaseNodePostprocessor]:
+        """ Returns the postprocessors filtering on vector similarity, which only apply to vector search results """
+        postprocessors: List[BaseNodePostprocessor] = []
+        if self.similarity_cutoff:
+            postprocessors.append(SimilarityPostprocessor(similarity_cutoff=self.similarity_cutoff))
+        if self.relative_cutoff:
+            postprocessors.append(RelativeScorePostprocessor(ratio=self.relative_cutoff))
+        return postprocessors
+
+    def context_postprocessors(self) -> List[BaseNodePostprocessor]:
+        """ Returns the postprocessors shaping the final context, whatever the retrieval mode """
+        postprocessors: List[BaseNodePostprocessor] = []
+        if self.dedup_threshold:
+            postprocessors.append(DedupPostprocessor(threshold=self.dedup_threshold))
+        if self.rerank == "lexical":
+            postprocessors.append(LexicalReranker())
+        elif self.rerank == "cross-encoder":
+            postprocessors.append(get_cross_encoder())
+        if self.context_token_budget:
+            postprocessors.append(TokenBudgetPostprocessor(max_tokens=self.context_token_budget))
+        return postprocessors
+
+    def __str__(self) -> str:
+        return (
+            f"{self.mode},cutoff={self.similarity_cutoff},rel={self.relative_cutoff},dedup={self.dedup_threshold},"
+            f"rerank={self.rerank},budget={self.context_token_budget}"
+        )
@@ -1,14 +1,47 @@
+from __future__ import annotations
+
+import copy
+import hashlib
 import os
+import queue
+import re
+import threading
 import time
-from typing import List, Optional
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sn_events import QueryEvent, QueryEventType
+from sn_index_cache import INDEX_CACHE, IndexCache, index_signature, index_size
+from sn_manifest import (IndexUpdate, diff_manifest, file_entry, list_transcripts, load_manifest,
+                         save_manifest, transcripts_signature)
+from sn_metrics import METRICS
+from sn_options import PROVIDERS, SUMMARY_MODES
+from sn_pipeline import batched, prefetch
+from sn_rate_limit import get_rate_limiter
+from sortfiles import extract_date_from_transcript, extract_episode_number, lookup_catalog
+
+# llama-index, numpy and the modules built on them are imported by the methods using them,
+# so that importing the engine stays fast for the command lines and the server
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.llms import LLM
+    from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+
+    from sn_answer_cache import AnswerCache
+    from sn_bm25 import BM25Index
+    from sn_postprocess import RetrievalConfig
+
+
+def __getattr__(name: str):
+    # The reader moved to sn_reader, it is still importable from here and only loaded on first use
+    if name == "SnTextFileReader":
+        from sn_reader import SnTextFileReader
+        return SnTextFileReader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from llama_index.core import Settings, Document, VectorStoreIndex, StorageContext, load_index_from_storage
-from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.readers.base import BaseReader
-from llama_index.core.retrievers import VectorIndexRetriever
-from llama_index.core.schema import BaseNode
-from llama_index.core.callbacks import CallbackManager, LlamaDebugHandler
 
 TRANSCRIPTS_DIR = "./transcripts"
 INDEX_DIR = "./index"
@@ -19,37 +52,185 @@ SUMMARY_PROMPT = (
     "<RESPONSES>{responses}</RESPONSES>"
 )
 EMBED_MODEL_FILE = "embed_model.txt"
+QUERY_EMBEDDING_CACHE_FILE = "query_embeddings.db"
+ANSWER_CACHE_FILE = "answers.db"
+# Content-addressed cache of chunk embeddings shared by all indexes of an index directory.
+# SN_EMBEDDING_CACHE overrides its path, set it to an empty string to disable the cache
+EMBEDDING_CACHE_FILE = "embeddings.db"
+EMBEDDING_CACHE_PATH = os.getenv("SN_EMBEDDING_CACHE")
+# Number of (provider, API key) models memoized by build_models
+MAX_MODELS = int(os.getenv("SN_MAX_MODELS", "16"))
+# Name of the index directory holding all years in unified mode
+UNIFIED_INDEX_NAME = "all"
+# Per-year quotas are filled from a single search that fetches this many times the total quota
+UNIFIED_OVERFETCH = 4
+# Maximum number of response tokens combined by one LLM call in tree summarization
+SUMMARY_TOKEN_BUDGET = 6000
+# Number of chunks per embedding request when an index is built on first load
+EMBED_BATCH_SIZE = 64
+
+
+class ModelConfig:
+    """
+    The models an engine queries with, see SnRAGEngine.build_models. The LLM and the embedding model
+    may be given as factories instead, they are then created once on first use: loading or building
+    an index never creates an LLM client, and validating arguments creates no client at all.
+    llm_id and embed_model_id name the models, as embed_model_id() names their clients, so that
+    index paths, cache scopes and metric tags need no client. They are taken from the clients when not given.
+    """
+    def __init__(
+        self,
+        provider: str,
+        llm: Optional[LLM] = None,
+        embed_model: Optional[BaseEmbedding] = None,
+        similarity_top_k: int = 32,
+        llm_factory: Optional[Callable[[], LLM]] = None,
+        embed_model_factory: Optional[Callable[[], BaseEmbedding]] = None,
+        llm_id: Optional[str] = None,
+        embed_model_id: Optional[str] = None
+    ) -> None:
+        self.provider = provider
+        self.similarity_top_k = similarity_top_k
+        self.llm_factory = llm_factory
+        self.embed_model_factory = embed_model_factory
+        self._llm = llm
+        self._embed_model = embed_model
+        self._llm_id = llm_id
+        self._embed_model_id = embed_model_id
+        self._lock = threading.Lock()
+
+    @property
+    def llm_id(self) -> str:
+        if self._llm_id is None:
+            from sn_embedding_cache import embed_model_id
+            self._llm_id = embed_model_id(self.llm)
+        return self._llm_id
 
-class SnTextFileReader(BaseReader):
-    """Custom file reader for text documents with sentence splitting."""
-    def __init__(self, chunk_size: int = 1024, chunk_overlap: int = 200) -> None:
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        self.parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    @property
+    def embed_model_id(self) -> str:
+        if self._embed_model_id is None:
+            from sn_embedding_cache import embed_model_id
+            self._embed_model_id = embed_model_id(self.embed_model)
+        return self._embed_model_id
+
+    @property
+    def llm(self) -> LLM:
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self.llm_factory()
+        return self._llm
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        if self._embed_model is None:
+            with self._lock:
+                if self._embed_model is None:
+                    self._embed_model = self.embed_model_factory()
+        return self._embed_model
 
-    def load_data(self, file_path: str, extra_info: Optional[dict] = None) -> List[BaseNode]:
-        with open(file_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-        cleaned_text = raw_text.replace("\r\n\r\n", " ").replace("\n\n", " ")
-        document = Document(text=cleaned_text, metadata=extra_info or {})
-        return self.parser.get_nodes_from_documents([document])
 
 class SnRAGEngine:
     """
     Core RAG engine for querying podcast transcripts organized by year.
     Suitable for use in CLI, REST APIs, or other backends.
     """
+    # The provider last configured by set_llm, used for rate limiting by engines without models
+    provider: str = "openai"
+    # The models last configured by set_llm, used by engines created without models
+    default_models: Optional[ModelConfig] = None
+
     def __init__(
         self,
         transcripts_dir: str = TRANSCRIPTS_DIR,
         index_dir: str = INDEX_DIR,
         summary_prompt: str = SUMMARY_PROMPT,
-        debug_mode: bool = False
+        debug_mode: bool = False,
+        index_cache: Optional[IndexCache] = None,
+        concurrency: int = 1,
+        unified: bool = False,
+        per_year_quota: Optional[int] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        use_answer_cache: bool = True,
+        summary_mode: str = "single",
+        summary_fan_in: int = 4,
+        summary_token_budget: int = SUMMARY_TOKEN_BUDGET,
+        retrieval: Optional[RetrievalConfig] = None,
+        models: Optional[ModelConfig] = None
     ) -> None:
         self.transcripts_dir = transcripts_dir or TRANSCRIPTS_DIR
         self.index_dir = index_dir or INDEX_DIR
         self.summary_prompt = summary_prompt or SUMMARY_PROMPT
         self.debug_mode = debug_mode
+        # Debug traces are attached to this engine's synthesizers instead of the global Settings
+        self.callback_manager = None
+        if debug_mode:
+            from llama_index.core.callbacks import CallbackManager, LlamaDebugHandler
+            self.callback_manager = CallbackManager([LlamaDebugHandler(print_trace_on_end=True)])
+        # Models of this engine, the default models configured by set_llm are used when not given
+        self.models = models
+        if models is not None:
+            self.provider = models.provider
+        # Loaded indexes are shared by all engines in the process unless a private cache is given
+        self.index_cache = index_cache if index_cache is not None else INDEX_CACHE
+        # Number of years queried in parallel, further capped by the provider's rate limits
+        self.concurrency = max(1, concurrency)
+        # In unified mode a single index covers all years and ranges are metadata filters
+        self.unified = unified
+        self.per_year_quota = per_year_quota
+        # "single" combines all years in one LLM call, "tree" reduces them in concurrent groups
+        if summary_mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode '{summary_mode}', expected one of {SUMMARY_MODES}")
+        self.summary_mode = summary_mode
+        self.summary_fan_in = max(2, summary_fan_in)
+        self.summary_token_budget = summary_token_budget
+        from sn_answer_cache import AnswerCache
+        from sn_embedding_cache import EmbeddingCache
+        from sn_postprocess import RetrievalConfig
+        # Retrieved chunks are filtered, deduplicated, reranked and trimmed to a token budget before synthesis
+        self.retrieval = retrieval or RetrievalConfig()
+        self.cutoff_postprocessors = self.retrieval.cutoff_postprocessors()
+        self.context_postprocessors = self.retrieval.context_postprocessors()
+        self.context_tokens_saved = 0
+        self._stats_lock = threading.Lock()
+        self.query_embedding_cache = EmbeddingCache(os.path.join(self.index_dir, QUERY_EMBEDDING_CACHE_FILE))
+        self.answer_cache = None
+        if use_answer_cache:
+            self.answer_cache = answer_cache or AnswerCache(os.path.join(self.index_dir, ANSWER_CACHE_FILE))
+
+    @property
+    def llm(self) -> LLM:
+        models = self.models or self.default_models
+        if models:
+            return models.llm
+        from llama_index.core import Settings
+        return Settings.llm
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        models = self.models or self.default_models
+        if models:
+            return models.embed_model
+        from llama_index.core import Settings
+        return Settings.embed_model
+
+    @property
+    def similarity_top_k(self) -> int:
+        models = self.models or self.default_models
+        if models:
+            return models.similarity_top_k
+        from llama_index.core import Settings
+        return getattr(Settings, "similarity_top_k", 32)
+
+    def _synthesizer(self, streaming: bool = False):
+        from llama_index.core.response_synthesizers import get_response_synthesizer
+        return get_response_synthesizer(llm=self.llm, callback_manager=self.callback_manager, streaming=streaming)
+
+    def _metric_tags(self, year=None) -> Dict[str, str]:
+        """Return the tags of this engine's metrics: provider, models and year. Empty when metrics are disabled."""
+        if not METRICS.enabled:
+            return {}
+        return {"provider": self.provider, "model": self.get_llm_id(), "embed_model": self.get_model_id(), "year": year}
 
     def get_transcripts_path(self, year: int) -> str:
         """ Returns the transcript path for the given year """
@@ -60,43 +241,604 @@ class SnRAGEngine:
         The path will include the embedding used,
         for example: index/FireworksEmbedding_nomic-ai-nomic-embed-text-v1.5/2015
         """
+        return os.path.join(self._get_model_index_dir(), str(year))
+
+    def get_unified_index_path(self) -> str:
+        """ Returns the path of the unified index covering all years,
+        for example: index/FireworksEmbedding_nomic-ai-nomic-embed-text-v1.5/all
+        """
+        return os.path.join(self._get_model_index_dir(), UNIFIED_INDEX_NAME)
+
+    def _get_model_index_dir(self) -> str:
         embed_model_id = self.get_model_id()
         model_name_for_path = embed_model_id.replace(":", "_").replace("/", "-")
-        return os.path.join(self.index_dir, model_name_for_path, str(year))
+        return os.path.join(self.index_dir, model_name_for_path)
+
+    def get_query_embedding(self, query_text: str) -> List[float]:
+        """Return the query embedding, from the persistent query embedding cache when possible."""
+        from sn_embedding_cache import normalize_query
+        embed_model_id = self.get_model_id()
+        key = normalize_query(query_text)
+        embedding = self.query_embedding_cache.get(embed_model_id, key)
+        METRICS.count("query_embedding_cache_hit" if embedding is not None else "query_embedding_cache_miss", **self._metric_tags())
+        if embedding is None:
+            with get_rate_limiter(self.provider), METRICS.timer("query_embedding", **self._metric_tags()):
+                embedding = self.embed_model.get_query_embedding(query_text)
+            self.query_embedding_cache.put(embed_model_id, key, embedding)
+        return embedding
+
+    def query_year(self, query_text: str, year: int, query_embedding: Optional[List[float]] = None) -> str:
+        """Query a single year's index, reusing query_embedding when it was already computed."""
+        return self.answer_year(query_text, year, query_embedding or self.get_retrieval_embedding(query_text))
+
+    def answer_year(
+        self,
+        query_text: str,
+        year: int,
+        query_embedding: Optional[List[float]],
+        vector_nodes: Optional[List[NodeWithScore]] = None
+    ) -> str:
+        """
+        Answer a query from a single year's index through the answer cache. query_embedding is None for
+        queries answered from BM25 alone. vector_nodes skips the vector search when its results are
+        already known, e.g. from search_many.
+        """
+        index_path = self.get_index_path(year)
+        index = self.get_index(self.get_transcripts_path(year), index_path)
+        top_k = self.similarity_top_k
+        tags = self._metric_tags(year)
+
+        def query() -> str:
+            from llama_index.core.schema import QueryBundle
+            query_bundle = QueryBundle(query_str=query_text, embedding=query_embedding)
+            nodes = self._retrieve(index, index_path, query_bundle, top_k, str(year), vector_nodes=vector_nodes)
+            with get_rate_limiter(self.provider), METRICS.timer("synthesis", **tags), METRICS.tags(**tags):
+                # from llama_index.core.response_synthesizers import ResponseMode
+                response = self._synthesizer().synthesize(query_bundle, nodes)  # response_mode=ResponseMode.REFINE
+            return str(response)
 
-    def query_year(self, query_text: str, year: int) -> str:
-        """Query a single year's index."""
+        return self._cached_answer("year", self._year_scope(year, index_path, top_k), query_text, query_embedding, query)
+
+    def _year_scope(self, year: int, index_path: str, top_k: int) -> str:
+        """Return the answer cache scope of a year's answers."""
+        return f"{year}|{self.get_model_id()}|{self.get_llm_id()}|{top_k}|{self.retrieval}|{self.get_index_version(index_path)}"
+
+    def get_query_embeddings(self, query_texts: List[str]) -> List[List[float]]:
+        """
+        Return the embeddings of many queries. Those missing from the query embedding cache are embedded
+        in a single batched call, the providers' models embed queries and texts alike.
+        """
+        from sn_embedding_cache import normalize_query
+        embed_model_id = self.get_model_id()
+        keys = [normalize_query(query_text) for query_text in query_texts]
+        embeddings = {key: self.query_embedding_cache.get(embed_model_id, key) for key in keys}
+        missing = {key: query_text for key, query_text in zip(keys, query_texts) if embeddings[key] is None}
+        METRICS.count("query_embedding_cache_hit", len(keys) - len(missing), **self._metric_tags())
+        METRICS.count("query_embedding_cache_miss", len(missing), **self._metric_tags())
+        if missing:
+            with get_rate_limiter(self.provider), METRICS.timer("query_embedding", **self._metric_tags()):
+                vectors = self.embed_model.get_text_embedding_batch(list(missing.values()))
+            for key, embedding in zip(missing, vectors):
+                self.query_embedding_cache.put(embed_model_id, key, embedding)
+                embeddings[key] = embedding
+        return [embeddings[key] for key in keys]
+
+    def needs_query_embedding(self, query_text: str) -> bool:
+        """Return False when the query is answered from BM25 alone and needs no embedding call."""
+        from sn_bm25 import is_keyword_query
+        return not (self.retrieval.mode == "lexical" or (self.retrieval.mode == "hybrid" and is_keyword_query(query_text)))
+
+    def get_retrieval_embedding(self, query_text: str) -> Optional[List[float]]:
+        """Return the query embedding, or None when the query needs none."""
+        return self.get_query_embedding(query_text) if self.needs_query_embedding(query_text) else None
+
+    def search_many(self, index: VectorStoreIndex, query_embeddings: List[List[float]], top_k: int) -> List[List[NodeWithScore]]:
+        """
+        Vector search of many queries at once: a single (nodes x queries) matrix product per index
+        instead of one scan of the index per query. Returns the top_k nodes of each query, best first.
+        """
+        with METRICS.timer("vector_search", **self._metric_tags(), queries=len(query_embeddings)):
+            return self._search_many(index, query_embeddings, top_k)
+
+    def _search_many(self, index: VectorStoreIndex, query_embeddings: List[List[float]], top_k: int) -> List[List[NodeWithScore]]:
+        import numpy as np
+        from llama_index.core.schema import NodeWithScore
+
+        from sn_vector_store import MmapVectorStore
+        vector_store = index.vector_store
+        if isinstance(vector_store, MmapVectorStore):
+            node_ids = vector_store.node_ids
+            scores = vector_store.similarities_many(query_embeddings) if node_ids else None
+        else:
+            embedding_dict = vector_store.data.embedding_dict
+            node_ids = list(embedding_dict)
+            scores = None
+            if node_ids:
+                matrix = np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+                queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+                scores = matrix @ queries.T
+                scores /= np.maximum(np.linalg.norm(matrix, axis=1)[:, None] * np.linalg.norm(queries, axis=1)[None, :], 1e-12)
+        if scores is None:
+            return [[] for _ in query_embeddings]
+        top_k = min(top_k, len(node_ids))
+        top_rows = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            rows = np.argpartition(-column_scores, top_k - 1)[:top_k]
+            top_rows.append(rows[np.argsort(-column_scores[rows])])
+        wanted = list({node_ids[row] for rows in top_rows for row in rows})
+        nodes_by_id = {node.node_id: node for node in self._index_nodes(index, wanted)}
+        return [
+            [NodeWithScore(node=nodes_by_id[node_ids[row]], score=float(scores[row, column])) for row in rows if node_ids[row] in nodes_by_id]
+            for column, rows in enumerate(top_rows)
+        ]
+
+    def _retrieve(
+        self,
+        index: VectorStoreIndex,
+        index_path: str,
+        query_bundle: QueryBundle,
+        top_k: int,
+        label: str,
+        vector_nodes: Optional[List[NodeWithScore]] = None
+    ) -> List[NodeWithScore]:
+        """
+        Retrieve the context of a query: vector search, BM25 search, or both fused by reciprocal rank
+        in hybrid mode, followed by the post-processing stage. A query bundle without an embedding
+        (the lexical fast path) only searches BM25. vector_nodes skips the vector search when its
+        results are already known, e.g. from search_many.
+        """
+        from llama_index.core.retrievers import VectorIndexRetriever
+        from llama_index.core.schema import NodeWithScore
+
+        from sn_bm25 import reciprocal_rank_fusion
+        tags = self._metric_tags(label)
+        lexical_nodes: List[NodeWithScore] = []
+        if vector_nodes is None:
+            vector_nodes = []
+            if query_bundle.embedding is not None:
+                with METRICS.timer("vector_search", **tags):
+                    vector_nodes = VectorIndexRetriever(index=index, similarity_top_k=top_k).retrieve(query_bundle)
+        if self.retrieval.mode != "vector":
+            bm25 = self.get_bm25(index, index_path)
+            with METRICS.timer("bm25_search", **tags):
+                hits = bm25.search(query_bundle.query_str, top_k)
+                nodes_by_id = {node.node_id: node for node in self._index_nodes(index, [node_id for node_id, _ in hits])}
+                lexical_nodes = [NodeWithScore(node=nodes_by_id[node_id], score=score) for node_id, score in hits if node_id in nodes_by_id]
+        with METRICS.timer("postprocess", **tags):
+            # Similarity cutoffs only make sense on vector scores, so they run before the fusion
+            cut_nodes = self._apply_postprocessors(self.cutoff_postprocessors, vector_nodes, query_bundle)
+            fused = bool(cut_nodes and lexical_nodes)
+            nodes = reciprocal_rank_fusion([cut_nodes, lexical_nodes], top_k) if fused else cut_nodes or lexical_nodes
+            # The chunks left out by the fusion's top_k are not savings of the post-processing,
+            # after a fusion only the context postprocessors are accounted for
+            candidates = nodes if fused else vector_nodes + lexical_nodes
+            nodes = self._apply_postprocessors(self.context_postprocessors, nodes, query_bundle)
+        if self.cutoff_postprocessors or self.context_postprocessors:
+            self._record_savings(candidates, nodes, label)
+        return nodes
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: QueryBundle, label: str) -> List[NodeWithScore]:
+        """Run the retrieval post-processing stage and account for the context tokens it saved."""
+        with METRICS.timer("postprocess", **self._metric_tags(label)):
+            processed = self._apply_postprocessors(self.cutoff_postprocessors + self.context_postprocessors, nodes, query_bundle)
+        if self.cutoff_postprocessors or self.context_postprocessors:
+            self._record_savings(nodes, processed, label)
+        return processed
+
+    @staticmethod
+    def _apply_postprocessors(postprocessors: List, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> List[NodeWithScore]:
+        for postprocessor in postprocessors:
+            nodes = postprocessor.postprocess_nodes(nodes, query_bundle=query_bundle)
+        return nodes
+
+    def _record_savings(self, retrieved: List[NodeWithScore], kept: List[NodeWithScore], label: str) -> None:
+        from llama_index.core.utils import get_tokenizer
+
+        from sn_postprocess import node_tokens
+        kept_ids = {node.node.node_id for node in kept}
+        tokenizer = get_tokenizer()
+        saved = sum(node_tokens(node, tokenizer) for node in retrieved if node.node.node_id not in kept_ids)
+        with self._stats_lock:
+            self.context_tokens_saved += saved
+        METRICS.count("context_tokens_saved", saved, **self._metric_tags(label))
         if self.debug_mode:
-            llama_debug_handler = LlamaDebugHandler(print_trace_on_end=True)
-            Settings.callback_manager = CallbackManager([llama_debug_handler])
-        index = self.get_index(self.get_transcripts_path(year), self.get_index_path(year))
-        retriever = VectorIndexRetriever(index=index, similarity_top_k=getattr(Settings, "similarity_top_k", 32))
-        # from llama_index.core.response_synthesizers import get_response_synthesizer
-        # from llama_index.core.response_synthesizers import ResponseMode
-        query_engine = RetrieverQueryEngine(retriever=retriever)  #, response_synthesizer=get_response_synthesizer(response_mode=ResponseMode.REFINE))
-        response = query_engine.query(query_text)
-        return str(response)
+            print(f"✂️ {label}: kept {len(kept)} of {len(retrieved)} chunks, saved {saved} context tokens")
+
+    def get_bm25(self, index: VectorStoreIndex, index_path: str) -> BM25Index:
+        """
+        Return the BM25 index persisted next to a vector index, loaded lazily through the index cache.
+        It is (re)built from the vector index's nodes when missing or older than the vector index.
+        """
+        from sn_bm25 import BM25_DIR, BM25Index
+        version = self.get_index_version(index_path)
+        bm25_path = os.path.join(index_path, BM25_DIR)
+
+        def load() -> BM25Index:
+            bm25 = BM25Index.load(bm25_path)
+            if bm25 is None or bm25.version != version:
+                bm25 = BM25Index.build(self._index_nodes(index), version)
+                bm25.save(bm25_path)
+            return bm25
+
+        return self.index_cache.get_or_load(
+            (BM25_DIR, os.path.abspath(index_path)),
+            lambda: (version, index_signature(bm25_path)),
+            load,
+            lambda: index_size(bm25_path),
+        )
+
+    @staticmethod
+    def _index_nodes(index: VectorStoreIndex, node_ids: Optional[List[str]] = None) -> List[BaseNode]:
+        """Return the nodes of an index, all of them or those with the given ids."""
+        from sn_vector_store import MmapVectorStore
+        if isinstance(index.vector_store, MmapVectorStore):
+            return index.vector_store.get_nodes(node_ids)
+        if node_ids is None:
+            return list(index.docstore.docs.values())
+        return index.docstore.get_nodes(node_ids, raise_error=False)
+
+    def stream_range(self, query_text: str, start_year: int, end_year: int) -> Iterator[QueryEvent]:
+        """
+        Query a range of years and summarize the results, yielding QueryEvents as they happen:
+        per-year progress and answer tokens (years run concurrently, so their events interleave),
+        then the summary tokens and a final DONE event holding the whole answer.
+        """
+        if self.unified:
+            # The unified index answers in a single call, there is nothing to stream per year
+            yield QueryEvent(QueryEventType.DONE, text=self.query_range(query_text, start_year, end_year))
+            return
+        with METRICS.timer("query_range", **self._metric_tags()):
+            yield from self._stream_years(query_text, list(range(start_year, end_year + 1)))
+
+    def _stream_years(self, query_text: str, years: List[int]) -> Iterator[QueryEvent]:
+        if not years:
+            # An empty range has nothing to answer, like _query_years
+            yield QueryEvent(QueryEventType.DONE, text="")
+            return
+        query_embedding = self.get_retrieval_embedding(query_text)
+        rate_limiter = get_rate_limiter(self.provider)
+        workers = min(self.concurrency, rate_limiter.max_concurrency, len(years))
+        events: "queue.Queue[QueryEvent]" = queue.Queue()
+
+        def run(year: int) -> None:
+            try:
+                self._stream_year(query_text, year, query_embedding, events.put)
+            except Exception as e:
+                events.put(QueryEvent(QueryEventType.YEAR_FAILED, year, str(e)))
+
+        responses: Dict[int, str] = {}
+        errors: List[str] = []
+        with ThreadPoolExecutor(max_workers=max(1, workers), initializer=self._init_worker) as executor:
+            for year in years:
+                executor.submit(run, year)
+            finished = 0
+            while finished < len(years):
+                event = events.get()
+                if event.type == QueryEventType.YEAR_DONE:
+                    responses[event.year] = f"\n--- {event.year} ---\n{event.text}\n"
+                    finished += 1
+                elif event.type == QueryEventType.YEAR_FAILED:
+                    errors.append(event.text)
+                    finished += 1
+                yield event
+
+        if not responses:
+            raise RuntimeError(f"Query failed for all years: {errors[0]}")
+        yield from self._stream_summary(query_text, [responses[year] for year in years if year in responses])
+
+    def _stream_year(
+        self,
+        query_text: str,
+        year: int,
+        query_embedding: Optional[List[float]],
+        emit: Callable[[QueryEvent], None]
+    ) -> str:
+        """Query a single year with a streaming synthesizer, emitting its progress and answer tokens."""
+        emit(QueryEvent(QueryEventType.YEAR_STARTED, year))
+        index_path = self.get_index_path(year)
+        index = self.get_index(self.get_transcripts_path(year), index_path)
+        top_k = self.similarity_top_k
+        scope = self._year_scope(year, index_path, top_k)
+        response = self._lookup_answer("year", scope, query_text, query_embedding)
+        if response is not None:
+            emit(QueryEvent(QueryEventType.TOKEN, year, response))
+        else:
+            from llama_index.core.schema import QueryBundle
+            query_bundle = QueryBundle(query_str=query_text, embedding=query_embedding)
+            nodes = self._retrieve(index, index_path, query_bundle, top_k, str(year))
+            emit(QueryEvent(QueryEventType.RETRIEVAL_DONE, year, f"{len(nodes)} chunks"))
+            tokens = []
+            tags = self._metric_tags(year)
+            with get_rate_limiter(self.provider), METRICS.timer("synthesis", **tags), METRICS.tags(**tags):
+                for token in self._synthesizer(streaming=True).synthesize(query_bundle, nodes).response_gen:
+                    tokens.append(token)
+                    emit(QueryEvent(QueryEventType.TOKEN, year, token))
+            response = "".join(tokens)
+            if self.answer_cache:
+                self.answer_cache.put("year", scope, query_text, response, query_embedding)
+        emit(QueryEvent(QueryEventType.YEAR_DONE, year, response))
+        return response
+
+    def _stream_summary(self, query_text: str, responses: List[str]) -> Iterator[QueryEvent]:
+        """Combine the yearly responses, streaming the tokens of the final LLM call."""
+        if len(responses) == 1:
+            yield QueryEvent(QueryEventType.DONE, text=responses[0])
+            return
+        yield QueryEvent(QueryEventType.SUMMARY_STARTED)
+        scope = self._summary_scope(responses)
+        query_embedding = self.get_retrieval_embedding(query_text)
+        summary = self._lookup_answer("summary", scope, query_text, query_embedding)
+        if summary is not None:
+            yield QueryEvent(QueryEventType.SUMMARY_TOKEN, text=summary)
+        else:
+            tags = self._metric_tags()
+            started = time.perf_counter()
+            final_group = self._tree_reduce(query_text, responses) if self.summary_mode == "tree" else responses
+            prompt = self.summary_prompt.format(query_text=query_text, responses="\n".join(final_group))
+            tokens = []
+            with get_rate_limiter(self.provider):
+                # The tags are set around each step only, the consumer of the events runs between them
+                chunks = self.llm.stream_complete(prompt)
+                while True:
+                    with METRICS.tags(**tags):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    tokens.append(chunk.delta or "")
+                    yield QueryEvent(QueryEventType.SUMMARY_TOKEN, text=chunk.delta or "")
+            METRICS.observe("summarization", time.perf_counter() - started, **tags)
+            summary = "".join(tokens)
+            if self.answer_cache:
+                self.answer_cache.put("summary", scope, query_text, summary, query_embedding)
+        yield QueryEvent(QueryEventType.DONE, text=summary)
+
+    def _cached_answer(
+        self,
+        kind: str,
+        scope: str,
+        query_text: str,
+        query_embedding: Optional[List[float]],
+        compute: Callable[[], str]
+    ) -> str:
+        """Return the answer from the answer cache, or compute and cache it."""
+        cached = self._lookup_answer(kind, scope, query_text, query_embedding)
+        if cached is not None:
+            return cached
+        response = str(compute())
+        if self.answer_cache:
+            self.answer_cache.put(kind, scope, query_text, response, query_embedding)
+        return response
+
+    def _lookup_answer(self, kind: str, scope: str, query_text: str, query_embedding: Optional[List[float]]) -> Optional[str]:
+        """Return the cached answer, None without one, counting the answer cache hits and misses."""
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.get(kind, scope, query_text, query_embedding)
+        METRICS.count("answer_cache_hit" if cached is not None else "answer_cache_miss", **self._metric_tags(), kind=kind)
+        if cached is not None and self.debug_mode:
+            print(f"♻️ Answer cache hit: {kind} {scope.split('|')[0]}")
+        return cached
+
+    def get_index_version(self, index_path: str) -> str:
+        """ Returns a version string of the index persisted under index_path, which changes whenever the index is updated """
+        return hashlib.sha256(repr(index_signature(index_path)).encode()).hexdigest()[:16]
 
     def query_range(self, query_text: str, start_year: int, end_year: int, show_intermediate: bool = False) -> str:
         """Query a range of years and summarize the results."""
-        responses = []
-        for year in range(start_year, end_year + 1):
-            response = self.query_year(query_text, year)
+        with METRICS.timer("query_range", **self._metric_tags()):
+            if self.unified:
+                return self.query_dates(query_text, date(start_year, 1, 1), date(end_year, 12, 31), show_intermediate)
+            responses = self._query_years(query_text, list(range(start_year, end_year + 1)), show_intermediate)
+            return self._summarize_responses(query_text, responses)
+
+    def query_dates(self, query_text: str, start_date: date, end_date: date, show_intermediate: bool = False) -> str:
+        """
+        Query the unified index over an arbitrary date range with a single filtered vector search.
+        With a per-year quota, the retrieved chunks are capped per year and answered year by year
+        before being summarized, otherwise they are answered in a single LLM call.
+        """
+        from llama_index.core.retrievers import VectorIndexRetriever
+        from llama_index.core.schema import NodeWithScore, QueryBundle
+        from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+        index = self.get_index(self.transcripts_dir, self.get_unified_index_path())
+        top_k = self.similarity_top_k
+        years = list(range(start_date.year, end_date.year + 1))
+        if self.per_year_quota:
+            top_k = self.per_year_quota * len(years) * UNIFIED_OVERFETCH
+        filters = MetadataFilters(filters=[
+            MetadataFilter(key="date", value=start_date.isoformat(), operator=FilterOperator.GTE),
+            MetadataFilter(key="date", value=end_date.isoformat(), operator=FilterOperator.LTE),
+        ])
+        retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k, filters=filters)
+        query_embedding = self.get_query_embedding(query_text)
+        if not self.per_year_quota:
+            def query() -> str:
+                query_bundle = QueryBundle(query_str=query_text, embedding=query_embedding)
+                nodes = self._postprocess_nodes(retriever.retrieve(query_bundle), query_bundle, f"{start_date} to {end_date}")
+                with get_rate_limiter(self.provider), METRICS.tags(**self._metric_tags()):
+                    return str(self._synthesizer().synthesize(query_bundle, nodes))
+            index_version = self.get_index_version(self.get_unified_index_path())
+            scope = f"{start_date}|{end_date}|{self.get_model_id()}|{self.get_llm_id()}|{top_k}|{self.retrieval}|{index_version}"
+            return self._cached_answer("dates", scope, query_text, query_embedding, query)
+
+        query_bundle = QueryBundle(query_str=query_text, embedding=query_embedding)
+        nodes = retriever.retrieve(query_bundle)
+
+        nodes_by_year: Dict[int, List[NodeWithScore]] = defaultdict(list)
+        for node in nodes:
+            year_nodes = nodes_by_year[node.node.metadata.get("year")]
+            if len(year_nodes) < self.per_year_quota:
+                year_nodes.append(node)
+        synthesizer = self._synthesizer()
+
+        def query_year(year: int) -> str:
+            nodes = self._postprocess_nodes(nodes_by_year[year], query_bundle, str(year))
+            with get_rate_limiter(self.provider):
+                return str(synthesizer.synthesize(query_bundle, nodes))
+
+        responses = self._query_years(query_text, [year for year in years if nodes_by_year[year]], show_intermediate, query_year)
+        return self._summarize_responses(query_text, responses)
+
+    def _query_years(
+        self,
+        query_text: str,
+        years: List[int],
+        show_intermediate: bool,
+        query_fn: Optional[Callable[[int], str]] = None
+    ) -> List[str]:
+        """
+        Query each year, in parallel when concurrency allows it, and return the wrapped
+        responses in year order. A failing year is reported and left out of the results,
+        the query only fails if all years fail.
+        """
+        if query_fn is None:
+            # Embed the query once and share the vector with all the years' retrievers
+            query_embedding = self.get_retrieval_embedding(query_text)
+            query_fn = lambda year: self.query_year(query_text, year, query_embedding=query_embedding)
+        # The rate limiter is only held around the provider calls: index loads, builds and retrieval
+        # run outside of it, so a worker never waits for a permit while holding one
+        workers = min(self.concurrency, get_rate_limiter(self.provider).max_concurrency, len(years))
+        results: Dict[int, str] = {}
+        errors: Dict[int, Exception] = {}
+
+        def on_done(year: int, response: Optional[str], error: Optional[Exception]) -> None:
+            if error is not None:
+                errors[year] = error
+                print(f"\n--- {year} ---\n❌ Query failed: {error}\n")
+                return
             wrapped = f"\n--- {year} ---\n{response}\n"
             if show_intermediate:
                 print(wrapped)
-            responses.append(wrapped)
-        return self._summarize_responses(query_text, responses)
+            results[year] = wrapped
+
+        if workers <= 1:
+            for year in years:
+                try:
+                    on_done(year, query_fn(year), None)
+                except Exception as e:
+                    on_done(year, None, e)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, initializer=self._init_worker) as executor:
+                futures = {executor.submit(query_fn, year): year for year in years}
+                for future in as_completed(futures):
+                    error = future.exception()
+                    on_done(futures[future], None if error else future.result(), error)
+
+        if errors and not results:
+            raise errors[years[0]]
+        return [results[year] for year in years if year in results]
+
+    def _init_worker(self) -> None:
+        """Hook run in each worker thread before it queries any year."""
+        pass
 
     def _summarize_responses(self, query_text: str, responses: List[str]) -> str:
         """Combine yearly responses into a single coherent summary."""
-        if len(responses) == 1:
-            return responses[0]
+        if len(responses) <= 1:
+            return responses[0] if responses else ""
+        def summarize() -> str:
+            with METRICS.timer("summarization", **self._metric_tags()):
+                final_group = self._tree_reduce(query_text, responses) if self.summary_mode == "tree" else responses
+                return self._complete_summary(query_text, final_group)
+
+        return self._cached_answer(
+            "summary", self._summary_scope(responses), query_text, self.get_retrieval_embedding(query_text), summarize
+        )
+
+    def _summary_scope(self, responses: List[str]) -> str:
+        """Return the answer cache scope of a summary."""
+        # The yearly responses carry the years and index versions the summary depends on
+        summary_key = hashlib.sha256("\n".join([self.summary_mode, self.summary_prompt] + responses).encode()).hexdigest()
+        return f"{summary_key}|{self.get_llm_id()}"
+
+    def _complete_summary(self, query_text: str, responses: List[str]) -> str:
+        """Combine responses with a single LLM call."""
         prompt = self.summary_prompt.format(query_text=query_text, responses="\n".join(responses))
-        return Settings.llm.complete(prompt)
+        with get_rate_limiter(self.provider), METRICS.tags(**self._metric_tags()):
+            return str(self.llm.complete(prompt))
+
+    def _tree_reduce(self, query_text: str, responses: List[str]) -> List[str]:
+        """
+        Map-reduce summarization: responses are grouped into batches of at most summary_fan_in
+        responses within the token budget, the groups are summarized concurrently and the partial
+        summaries are reduced the same way until they fit a single group, which is returned for
+        the final LLM call. A group holding a single response is passed through without an LLM call.
+        """
+        level = responses
+        while True:
+            groups = self._group_responses(level)
+            if len(groups) == 1:
+                return groups[0]
+
+            def reduce(group: List[str]) -> str:
+                if len(group) == 1:
+                    return group[0]
+                first, last = self._response_span(group[0])[0], self._response_span(group[-1])[1]
+                return f"\n--- {first} to {last} ---\n{self._complete_summary(query_text, group)}\n"
+
+            workers = min(self.concurrency, get_rate_limiter(self.provider).max_concurrency, len(groups))
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                level = list(executor.map(reduce, groups))
+
+    def _group_responses(self, responses: List[str]) -> List[List[str]]:
+        """Split responses, in order, into groups bounded by the fan-in and the token budget."""
+        from llama_index.core.utils import get_tokenizer
+        tokenizer = get_tokenizer()
+        groups: List[List[str]] = []
+        group: List[str] = []
+        group_tokens = 0
+        for response in responses:
+            tokens = len(tokenizer(response))
+            # A group always takes two responses so that every level shrinks
+            if group and (len(group) >= self.summary_fan_in or (len(group) >= 2 and group_tokens + tokens > self.summary_token_budget)):
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(response)
+            group_tokens += tokens
+        groups.append(group)
+        return groups
+
+    @staticmethod
+    def _response_span(response: str) -> Tuple[str, str]:
+        """Return the first and last year labels of a wrapped response, e.g. --- 2015 --- or --- 2015 to 2018 ---."""
+        match = re.match(r"\s*--- (.+?)(?: to (.+?))? ---", response)
+        if not match:
+            return "?", "?"
+        return match.group(1), match.group(2) or match.group(1)
+
+    def preload(self, start_year: int, end_year: int) -> None:
+        """Warm up the index cache with the indexes of a range of years."""
+        for year in range(start_year, end_year + 1):
+            self.get_index(self.get_transcripts_path(year), self.get_index_path(year))
+        if self.debug_mode:
+            print(f"✅ Index cache warmed up: {self.index_cache.stats_dict()}")
 
     def get_index(self, docs_path: str, index_path: str) -> VectorStoreIndex:
+        """Return the vector index for a given path, from the index cache when possible."""
+        tags = self._metric_tags(os.path.basename(index_path))
+        loaded = False
+
+        def load() -> VectorStoreIndex:
+            nonlocal loaded
+            loaded = True
+            with METRICS.timer("index_load", **tags):
+                return self._load_or_build_index(docs_path, index_path)
+
+        index = self.index_cache.get_or_load(
+            (self.get_model_id(), os.path.abspath(index_path)),
+            lambda: (index_signature(index_path), transcripts_signature(docs_path)),
+            load,
+            lambda: index_size(index_path),
+        )
+        METRICS.count("index_cache_miss" if loaded else "index_cache_hit", **tags)
+        return index
+
+    def _load_or_build_index(self, docs_path: str, index_path: str) -> VectorStoreIndex:
         """Load or create a vector index for a given path."""
+        from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+
+        from sn_vector_store import MmapVectorStore, has_mmap_store, remove_mmap_store
         embed_model_id = self.get_model_id()
         embed_info_path = os.path.join(index_path, EMBED_MODEL_FILE)
         try:
@@ -107,95 +849,336 @@ class SnRAGEngine:
                     raise ValueError(f"Embedding model mismatch: expected '{embed_model_id}', found '{stored_model_id}'")
             if self.debug_mode:
                 start_time = time.time()
-            index = load_index_from_storage(StorageContext.from_defaults(persist_dir=index_path))
+            if has_mmap_store(index_path):
+                index = VectorStoreIndex.from_vector_store(MmapVectorStore(index_path), embed_model=self.embed_model)
+            else:
+                index = load_index_from_storage(StorageContext.from_defaults(persist_dir=index_path), embed_model=self.embed_model)
             if self.debug_mode:
                 elapsed = time.time() - start_time
                 print(f"✅ Index loaded in {elapsed:.2f} seconds")
         except Exception:
-            nodes = self.load_docs(docs_path)
-            index = VectorStoreIndex(nodes)
+            # A binary store left from the previous index would be preferred over the rebuilt one
+            remove_mmap_store(index_path)
+            index = self._build_index(docs_path)
             index.storage_context.persist(persist_dir=index_path)
             with open(embed_info_path, "w") as f:
                 f.write(embed_model_id)
+            save_manifest(index_path, self._manifest_from_nodes(index.docstore.docs.values(), list_transcripts(docs_path)))
+            return index
+
+        # Updates run outside of the block above: an embedding error while updating an index must
+        # not make it look unreadable and trigger a full rebuild
+        if isinstance(index.vector_store, MmapVectorStore):
+            # The binary store is read-only, it is refreshed from the updated JSON index
+            index = self._refresh_mmap_index(index, docs_path, index_path)
+        elif os.path.isdir(docs_path):
+            update = self.update_index(index, docs_path, index_path)
+            if update:
+                print(f"🔄 Index {index_path} updated: {update}")
+        return index
+
+    def _refresh_mmap_index(self, index: VectorStoreIndex, docs_path: str, index_path: str) -> VectorStoreIndex:
+        """
+        Return an index loaded from its binary store, up to date. When the store no longer holds the nodes
+        of the manifest, or the transcripts changed, the JSON index is updated and converted again in the
+        same format. A store converted without a manifest is compared with one rebuilt from its nodes.
+        """
+        from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+
+        from sn_vector_store import MmapVectorStore, convert_index, remove_mmap_store
+        store = index.vector_store
+        files = list_transcripts(docs_path) if os.path.isdir(docs_path) else None
+        manifest = load_manifest(index_path)
+        if manifest is None and files is not None:
+            manifest = self._manifest_from_nodes(store.get_nodes(), files)
+        stale = False
+        if manifest is not None:
+            manifest_ids = {node_id for entry in manifest.values() for node_id in entry["node_ids"]}
+            stale = set(store.node_ids) != manifest_ids
+            if not stale and files is not None:
+                stale = bool(diff_manifest(manifest, files))
+        if not stale:
+            return index
+        if not os.path.exists(os.path.join(index_path, "docstore.json")):
+            print(f"⚠️ Binary index {index_path} is out of date and has no JSON index to refresh it from")
+            return index
+        dtype = store.dtype
+        json_index = load_index_from_storage(StorageContext.from_defaults(persist_dir=index_path), embed_model=self.embed_model)
+        if files is not None:
+            update = self.update_index(json_index, docs_path, index_path)
+            if update:
+                print(f"🔄 Index {index_path} updated: {update}")
+        remove_mmap_store(index_path)
+        convert_index(index_path, dtype)
+        return VectorStoreIndex.from_vector_store(MmapVectorStore(index_path), embed_model=self.embed_model)
+
+    def update_index(self, index: VectorStoreIndex, docs_path: str, index_path: str) -> IndexUpdate:
+        """
+        Bring an index up to date with its transcripts directory using the index manifest:
+        only new or changed files are parsed and embedded, and the nodes of removed files are deleted.
+        """
+        files = list_transcripts(docs_path)
+        manifest = load_manifest(index_path)
+        original = copy.deepcopy(manifest)
+        if manifest is None:
+            # Index built before manifests existed: trust the files it already contains
+            manifest = self._manifest_from_nodes(list(index.docstore.docs.values()), files)
+        update = diff_manifest(manifest, files)
+        for fname in update.changed + update.removed:
+            index.delete_nodes(manifest.pop(fname)["node_ids"], delete_from_docstore=True)
+        to_load = update.added + update.changed
+        node_ids: Dict[str, List[str]] = defaultdict(list)
+        file_nodes = (node for fname in to_load for node in self.iter_file(files[fname]))
+        for batch in self.embed_nodes(file_nodes):
+            index.insert_nodes(batch)
+            for node in batch:
+                node_ids[node.metadata["file_name"]].append(node.node_id)
+        for fname in to_load:
+            manifest[fname] = file_entry(files[fname], node_ids[fname])
+        if update:
+            index.storage_context.persist(persist_dir=index_path)
+        # Only rewrite the manifest when it changed, so the index version stays stable
+        if manifest != original:
+            save_manifest(index_path, manifest)
+        return update
+
+    @staticmethod
+    def _manifest_from_nodes(nodes: Iterable[BaseNode], files: Dict[str, str]) -> Dict[str, dict]:
+        """Return manifest entries for the files on disk that the given nodes were parsed from."""
+        node_ids: Dict[str, List[str]] = defaultdict(list)
+        for node in nodes:
+            node_ids[node.metadata.get("file_name")].append(node.node_id)
+        return {fname: file_entry(path, node_ids[fname]) for fname, path in files.items() if fname in node_ids}
+
+    def _build_index(self, docs_path: str) -> VectorStoreIndex:
+        """Build the index of a transcripts directory, embedding each batch of chunks while the next files are parsed."""
+        from llama_index.core import VectorStoreIndex
+        index = VectorStoreIndex(nodes=[], embed_model=self.embed_model)
+        for batch in self.embed_nodes(self.iter_docs(docs_path)):
+            index.insert_nodes(batch)
         return index
 
+    def embed_nodes(self, nodes: Iterable[BaseNode], batch_size: int = EMBED_BATCH_SIZE) -> Iterator[List[BaseNode]]:
+        """
+        Embed nodes in batches as they are produced and yield the embedded batches. The nodes are produced
+        in a background thread a few batches ahead, so the embedding starts with the first file and the
+        nodes in flight stay bounded whatever the number of files.
+        """
+        from llama_index.core.schema import MetadataMode
+        rate_limiter = get_rate_limiter(self.provider)
+        for batch in prefetch(batched(nodes, batch_size)):
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            with rate_limiter:
+                embeddings = self.embed_model.get_text_embedding_batch(texts)
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+            yield batch
+
     def load_docs(self, directory: str) -> List[BaseNode]:
-        """Load and parse documents from a directory."""
-        nodes = []
-        for fname in os.listdir(directory):
-            if fname.endswith(".txt"):
-                path = os.path.join(directory, fname)
-                reader = SnTextFileReader()
-                file_nodes = reader.load_data(path, extra_info={"file_name": fname})
-                for node in file_nodes:
-                    node.excluded_llm_metadata_keys = ["file_name"]
-                nodes.extend(file_nodes)
-        return nodes
+        """Load and parse documents from a directory and its subdirectories."""
+        return list(self.iter_docs(directory))
+
+    def iter_docs(self, directory: str) -> Iterator[BaseNode]:
+        """Yield the nodes of the documents of a directory and its subdirectories, one file at a time."""
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Transcripts directory '{directory}' does not exist")
+        for path in list_transcripts(directory).values():
+            yield from self.iter_file(path)
+
+    def load_file(self, path: str) -> List[BaseNode]:
+        """Load and parse a single transcript file."""
+        return list(self.iter_file(path))
+
+    def iter_file(self, path: str) -> Iterator[BaseNode]:
+        """Yield the nodes of a single transcript file."""
+        from sn_reader import SnTextFileReader
+        reader = SnTextFileReader()
+        for node in reader.lazy_load_data(path, extra_info=self.get_file_metadata(path)):
+            # Only the air date is shown to the LLM, and only the file name is embedded with the text
+            node.excluded_llm_metadata_keys = ["file_name", "year", "episode"]
+            node.excluded_embed_metadata_keys = ["year", "episode", "date"]
+            yield node
+
+    @staticmethod
+    def get_file_metadata(path: str) -> dict:
+        """
+        Return the node metadata of a transcript file: file name, episode number, year and air date.
+        They come from the catalog written by sortfiles.py when it is up to date with the file.
+        """
+        fname = os.path.basename(path)
+        metadata = {"file_name": fname}
+        entry = lookup_catalog(path)
+        if entry is not None:
+            if entry["episode"] is not None:
+                metadata["episode"] = entry["episode"]
+            if entry["date"] is not None:
+                metadata["year"] = int(entry["date"][:4])
+                metadata["date"] = entry["date"]
+            return metadata
+        episode = extract_episode_number(fname)
+        if episode is not None:
+            metadata["episode"] = episode
+        air_date = extract_date_from_transcript(path)
+        if air_date is not None:
+            metadata["year"] = air_date.year
+            metadata["date"] = air_date.isoformat()
+        return metadata
 
     def get_model_id(self) -> str:
-        """Return a string ID representing the current embedding model."""
-        model_class = Settings.embed_model.__class__.__name__
-        model_config = getattr(Settings.embed_model, 'model_name', getattr(Settings.embed_model, 'model', 'unknown'))
-        return f"{model_class}:{model_config}"
+        """Return a string ID representing the engine's embedding model."""
+        models = self.models or self.default_models
+        if models:
+            return models.embed_model_id
+        from sn_embedding_cache import embed_model_id
+        return embed_model_id(self.embed_model)
+
+    def get_llm_id(self) -> str:
+        """Return a string ID representing the engine's LLM, without creating its client."""
+        models = self.models or self.default_models
+        if models:
+            return models.llm_id
+        from sn_embedding_cache import embed_model_id
+        return embed_model_id(self.llm)
+
+    @classmethod
+    def set_llm(
+        cls,
+        provider: str,
+        api_key: Optional[str] = None,
+        embedding_cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        index_dir: str = INDEX_DIR
+    ) -> None:
+        """
+        Set the LLM and embedding model of engines created without models. Their clients are only
+        created when first used. Chunk embeddings go through the persistent cache at
+        embedding_cache_path, by default in index_dir, unless it is empty.
+        """
+        cls.set_models(cls.build_models(provider, api_key, embedding_cache_path, index_dir))
+
+    @classmethod
+    def set_models(cls, models: ModelConfig) -> None:
+        """Set the models of engines created without models."""
+        cls.default_models = models
+        cls.provider = models.provider
 
     @staticmethod
-    def set_llm(provider: str, api_key: Optional[str] = None) -> None:
-        """Set the global LLM and embedding model used by llama-index."""
-        def openai_handler():
-            # The 'openai' LLM provider requires installing llama-index-llms-openai.
-            from llama_index.llms.openai import OpenAI
-            from llama_index.embeddings.openai import OpenAIEmbedding
-            Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-small", api_key=api_key or os.environ["OPENAI_API_KEY"])
-            Settings.llm = OpenAI(model="gpt-4o-mini", temperature=0, api_key=api_key or os.environ["OPENAI_API_KEY"])
-            Settings.similarity_top_k = 32
-
-        def together_handler():
-            # The 'together' LLM provider requires installing llama-index-llms-together and
-            # llama-index-embeddings-fireworks.
-            from llama_index.llms.together import TogetherLLM
-            from llama_index.embeddings.fireworks import FireworksEmbedding
-
-            # Together.ai's embedding model is commented out since I gave up on them,
-            # they were very slow and yielded bad results.
-            # from llama_index.embeddings.together import TogetherEmbedding
-            # Settings.embed_model = TogetherEmbedding(model_name="togethercomputer/m2-bert-80M-2k-retrieval")
-
-            # Provide a template following the LLM's original chat template.
-            # This was taken from https://www.together.ai/blog/rag-tutorial-llamaindex
-            def completion_to_prompt(completion: str) -> str:
-                return f"<s>[INST] {completion} [/INST] </s>\n"
-
-            Settings.embed_model = FireworksEmbedding(model_name="nomic-ai/nomic-embed-text-v1.5")
-            Settings.llm = TogetherLLM(
-                model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-                api_key=api_key or os.environ["TOGETHER_API_KEY"],
-                temperature=0,
-                is_chat_model=False,
-                completion_to_prompt=completion_to_prompt
-            )
-            Settings.similarity_top_k = 16
-
-        def fireworks_handler():
-            from llama_index.llms.fireworks import Fireworks
-            from llama_index.embeddings.fireworks import FireworksEmbedding
-            Settings.embed_model = FireworksEmbedding(model_name="nomic-ai/nomic-embed-text-v1.5")
-
-            # had to enlarge the max_tokens for llama-v3p1-8b-instruct since the final output got truncated
-            # Settings.llm = Fireworks(model="accounts/fireworks/models/llama-v3p1-8b-instruct", api_key=os.environ["FIREWORKS_API_KEY"],
-            #                          temperature=0, max_tokens=4096)
-
-            Settings.llm = Fireworks(
-                model="accounts/fireworks/models/mixtral-8x22b-instruct",
-                api_key=api_key or os.environ["FIREWORKS_API_KEY"],
-                temperature=0,
-                max_tokens=4096
-            )
-            Settings.similarity_top_k = 32
-
-        switch_dict = {
-            "openai": openai_handler,
-            "together": together_handler,
-            "fireworks": fireworks_handler,
-        }
-        # Run handler
-        switch_dict.get(provider, openai_handler)()
+    def build_models(
+        provider: str,
+        api_key: Optional[str] = None,
+        embedding_cache_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        index_dir: str = INDEX_DIR
+    ) -> ModelConfig:
+        """
+        Return the models of a provider without touching the global Settings, so that engines with
+        different providers or API keys can run side by side. Clients are created on first use,
+        once per (provider, API key), and reused, keeping their connection pools warm.
+        The embedding cache is stored in the index directory of the engines, unless embedding_cache_path is given.
+        """
+        provider = provider if provider in PROVIDERS else "openai"
+        if embedding_cache_path is None:
+            embedding_cache_path = os.path.join(index_dir or INDEX_DIR, EMBEDDING_CACHE_FILE)
+        key = (provider, hashlib.sha256(api_key.encode()).hexdigest() if api_key else None, embedding_cache_path)
+        with _models_lock:
+            if key in _models:
+                _models.move_to_end(key)
+            else:
+                models = _PROVIDER_HANDLERS[provider](api_key)
+                if embedding_cache_path:
+                    models.embed_model_factory = _with_embedding_cache(models.embed_model_factory, embedding_cache_path)
+                _models[key] = models
+                while len(_models) > MAX_MODELS:
+                    _models.popitem(last=False)
+            return _models[key]
+
+
+def _with_embedding_cache(embed_model_factory: Callable[[], BaseEmbedding], embedding_cache_path: str) -> Callable[[], BaseEmbedding]:
+    """Return a factory of the embedding model storing its chunk embeddings in the persistent cache."""
+    def create() -> BaseEmbedding:
+        from sn_embedding_cache import EmbeddingKVStore, embed_model_id, get_embedding_cache
+        embed_model = embed_model_factory()
+        embed_model.embeddings_cache = EmbeddingKVStore(get_embedding_cache(embedding_cache_path), embed_model_id(embed_model))
+        return embed_model
+    return create
+
+
+def _openai_models(api_key: Optional[str]) -> ModelConfig:
+    # The 'openai' LLM provider requires installing llama-index-llms-openai.
+    api_key = api_key or os.environ["OPENAI_API_KEY"]
+
+    def embed_model() -> BaseEmbedding:
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        return OpenAIEmbedding(model="text-embedding-3-small", api_key=api_key)
+
+    def llm() -> LLM:
+        from llama_index.llms.openai import OpenAI
+        return OpenAI(model="gpt-4o-mini", temperature=0, api_key=api_key)
+
+    return ModelConfig(provider="openai", embed_model_factory=embed_model, llm_factory=llm, similarity_top_k=32,
+                       llm_id="OpenAI:gpt-4o-mini", embed_model_id="OpenAIEmbedding:text-embedding-3-small")
+
+
+def _together_models(api_key: Optional[str]) -> ModelConfig:
+    # The 'together' LLM provider requires installing llama-index-llms-together and
+    # llama-index-embeddings-fireworks.
+    api_key = api_key or os.environ["TOGETHER_API_KEY"]
+
+    # Together.ai's embedding model is commented out since I gave up on them,
+    # they were very slow and yielded bad results.
+    # from llama_index.embeddings.together import TogetherEmbedding
+    # embed_model = TogetherEmbedding(model_name="togethercomputer/m2-bert-80M-2k-retrieval")
+    def embed_model() -> BaseEmbedding:
+        from llama_index.embeddings.fireworks import FireworksEmbedding
+        return FireworksEmbedding(model_name="nomic-ai/nomic-embed-text-v1.5")
+
+    # Provide a template following the LLM's original chat template.
+    # This was taken from https://www.together.ai/blog/rag-tutorial-llamaindex
+    def completion_to_prompt(completion: str) -> str:
+        return f"<s>[INST] {completion} [/INST] </s>\n"
+
+    def llm() -> LLM:
+        from llama_index.llms.together import TogetherLLM
+        return TogetherLLM(
+            model="mistralai/Mixtral-8x7B-Instruct-v0.1",
+            api_key=api_key,
+            temperature=0,
+            is_chat_model=False,
+            completion_to_prompt=completion_to_prompt
+        )
+
+    return ModelConfig(provider="together", embed_model_factory=embed_model, llm_factory=llm, similarity_top_k=16,
+                       llm_id="TogetherLLM:mistralai/Mixtral-8x7B-Instruct-v0.1",
+                       embed_model_id="FireworksEmbedding:nomic-ai/nomic-embed-text-v1.5")
+
+
+def _fireworks_models(api_key: Optional[str]) -> ModelConfig:
+    api_key = api_key or os.environ["FIREWORKS_API_KEY"]
+
+    def embed_model() -> BaseEmbedding:
+        from llama_index.embeddings.fireworks import FireworksEmbedding
+        return FireworksEmbedding(model_name="nomic-ai/nomic-embed-text-v1.5")
+
+    # had to enlarge the max_tokens for llama-v3p1-8b-instruct since the final output got truncated
+    # llm = Fireworks(model="accounts/fireworks/models/llama-v3p1-8b-instruct", api_key=os.environ["FIREWORKS_API_KEY"],
+    #                 temperature=0, max_tokens=4096)
+    def llm() -> LLM:
+        from llama_index.llms.fireworks import Fireworks
+        return Fireworks(
+            model="accounts/fireworks/models/mixtral-8x22b-instruct",
+            api_key=api_key,
+            temperature=0,
+            max_tokens=4096
+        )
+
+    return ModelConfig(provider="fireworks", embed_model_factory=embed_model, llm_factory=llm, similarity_top_k=32,
+                       llm_id="Fireworks:accounts/fireworks/models/mixtral-8x22b-instruct",
+                       embed_model_id="FireworksEmbedding:nomic-ai/nomic-embed-text-v1.5")
+
+
+_PROVIDER_HANDLERS: Dict[str, Callable[[Optional[str]], ModelConfig]] = {
+    "openai": _openai_models,
+    "together": _together_models,
+    "fireworks": _fireworks_models,
+}
+# Models memoized per provider and API key digest, the least recently used are forgotten beyond MAX_MODELS
+_models: "OrderedDict[tuple, ModelConfig]" = OrderedDict()
+_models_lock = threading.Lock()
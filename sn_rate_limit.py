@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+# Maximum concurrent requests and requests per minute for each LLM/embedding provider.
+# These are conservative defaults for the entry-level tiers of each provider.
+PROVIDER_LIMITS: Dict[str, Tuple[int, int]] = {
+    "openai": (8, 500),
+    "together": (2, 60),
+    "fireworks": (4, 600),
+}
+DEFAULT_LIMITS = (4, 120)
+
+
+class RateLimiter:
+    """
+    Limits the number of concurrent requests to a provider and spaces them out
+    so that no more than requests_per_minute are started in any minute.
+    Use it as a context manager around each request.
+    """
+    def __init__(self, max_concurrency: int, requests_per_minute: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "RateLimiter":
+        self._semaphore.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """ Returns the process-wide rate limiter for the given provider """
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(*PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS))
+        return _limiters[provider]
+
+
+def set_provider_limits(provider: str, max_concurrency: int, requests_per_minute: int) -> None:
+    """ Sets the limits of a provider, replacing its rate limiter for the requests started from now on """
+    with _limiters_lock:
+        PROVIDER_LIMITS[provider] = (max_concurrency, requests_per_minute)
+        _limiters.pop(provider, None)
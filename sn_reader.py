@@ -0,0 +1,32 @@
+import re
+from typing import Iterator, List, Optional
+
+from llama_index.core import Document
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import BaseNode
+
+BLANK_LINES_PATTERN = re.compile(r"\r\n\r\n|\n\n")
+
+
+class SnTextFileReader(BaseReader):
+    """Custom file reader for text documents with sentence splitting."""
+    def __init__(self, chunk_size: int = 1024, chunk_overlap: int = 200) -> None:
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def load_data(self, file_path: str, extra_info: Optional[dict] = None) -> List[BaseNode]:
+        return list(self.lazy_load_data(file_path, extra_info))
+
+    def lazy_load_data(self, file_path: str, extra_info: Optional[dict] = None) -> Iterator[BaseNode]:
+        """Yield the nodes of a file, only one file's text being held at a time."""
+        with open(file_path, "r", encoding="utf-8") as f:
+            # Blank lines are joined in a single pass over the text
+            document = Document(text=normalize_text(f.read()), metadata=extra_info or {})
+        yield from self.parser.get_nodes_from_documents([document])
+
+
+def normalize_text(text: str) -> str:
+    """Replace the blank lines of a transcript with spaces."""
+    return BLANK_LINES_PATTERN.sub(" ", text)
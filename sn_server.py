@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from sn_events import QueryEvent, QueryEventType
+from sn_index_cache import INDEX_CACHE
+from sn_metrics import METRICS, METRICS_FILE_ENV, HistogramSink, JsonLinesSink
+from sn_options import PROVIDERS, RETRIEVAL_MODES, SUMMARY_MODES
+from sn_rag_engine import SnRAGEngine
+
+MIN_YEAR = 2015
+MAX_YEAR = 2025
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Engines kept warm, one per provider and API key, the least recently used is dropped beyond this many
+MAX_ENGINES = int(os.getenv("SN_SERVER_MAX_ENGINES", "16"))
+
+
+class QueryFlight:
+    """
+    A query being answered. Its events are recorded so that every request asking the same
+    question while it runs follows the same computation from the start, instead of starting its own.
+    Only touched from the event loop thread.
+    """
+    def __init__(self) -> None:
+        self.events: List[QueryEvent] = []
+        self.done = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event: QueryEvent) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[QueryEvent]:
+        """Yield all the events of the query, past and future, until it is done."""
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                return
+            await changed.wait()
+
+
+class QueryServer:
+    """
+    HTTP/JSON server keeping engines, model clients and indexes warm between queries.
+    Each (provider, API key) pair gets its own engine and models, so requests never share
+    the global llama-index Settings. Queries run in a thread pool while the event loop
+    serves other requests, and identical in-flight queries are coalesced.
+    """
+    def __init__(
+        self,
+        engine_options: Dict[str, Any],
+        default_provider: str = "openai",
+        workers: int = 8,
+        metrics: Optional[HistogramSink] = None,
+        max_engines: int = MAX_ENGINES
+    ) -> None:
+        self.engine_options = engine_options
+        # Aggregated metrics served by GET /metrics, the endpoint is disabled without them
+        self.metrics = metrics
+        self.default_provider = default_provider
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stats = {"requests": 0, "coalesced": 0, "errors": 0}
+        self.max_engines = max(1, max_engines)
+        # Keyed by a digest of the API key, the keys of the clients are not kept around as cache keys
+        self._engines: "OrderedDict[Tuple[str, Optional[str]], SnRAGEngine]" = OrderedDict()
+        self._engines_lock = threading.Lock()
+        self._flights: Dict[tuple, QueryFlight] = {}
+
+    def get_engine(self, provider: str, api_key: Optional[str] = None) -> SnRAGEngine:
+        """Return the engine of a provider and API key, the server's environment keys are used without one."""
+        with self._engines_lock:
+            key = (provider, hashlib.sha256(api_key.encode()).hexdigest() if api_key else None)
+            if key in self._engines:
+                self._engines.move_to_end(key)
+            else:
+                models = SnRAGEngine.build_models(provider, api_key, index_dir=self.engine_options.get("index_dir"))
+                self._engines[key] = SnRAGEngine(models=models, **self.engine_options)
+                while len(self._engines) > self.max_engines:
+                    self._engines.popitem(last=False)
+            return self._engines[key]
+
+    def preload(self, start_year: int, end_year: int) -> None:
+        """Load the default provider's indexes ahead of the first query."""
+        engine = self.get_engine(self.default_provider)
+        for year in range(start_year, end_year + 1):
+            try:
+                engine.get_index(engine.get_transcripts_path(year), engine.get_index_path(year))
+            except Exception as e:
+                print(f"⚠️ {year}: index not preloaded: {e}")
+        print(f"✅ Indexes preloaded: {INDEX_CACHE.stats_dict()}")
+
+    def parse_request(self, data: Any) -> Tuple[str, int, int, str, Optional[str]]:
+        """Validate a query request, returns (query, start year, end year, provider, API key)."""
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object.")
+        query = str(data.get("query") or "").strip()
+        if not query:
+            raise ValueError("Query must not be empty.")
+        try:
+            start_year, end_year = int(data["start_year"]), int(data["end_year"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("start_year and end_year must be integers.")
+        if start_year < MIN_YEAR or end_year > MAX_YEAR:
+            raise ValueError(f"Start year must be >= {MIN_YEAR} and end year must be <= {MAX_YEAR}.")
+        if start_year > end_year:
+            raise ValueError("Start year must be <= end year.")
+        provider = data.get("provider") or self.default_provider
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown provider '{provider}', expected one of {PROVIDERS}.")
+        return query, start_year, end_year, provider, data.get("api_key") or None
+
+    def join(self, query: str, start_year: int, end_year: int, provider: str, api_key: Optional[str]) -> QueryFlight:
+        """Return the in-flight query answering this question, starting it if there is none."""
+        from sn_embedding_cache import normalize_query
+        self.stats["requests"] += 1
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+        key = (provider, key_hash, normalize_query(query), start_year, end_year)
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats["coalesced"] += 1
+            return flight
+        flight = self._flights[key] = QueryFlight()
+        loop = asyncio.get_running_loop()
+
+        def run() -> None:
+            try:
+                engine = self.get_engine(provider, api_key)
+                for event in engine.stream_range(query, start_year, end_year):
+                    loop.call_soon_threadsafe(flight.publish, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(flight.publish, QueryEvent(QueryEventType.ERROR, text=str(e)))
+            finally:
+                loop.call_soon_threadsafe(self._finish, key, flight)
+
+        loop.run_in_executor(self.executor, run)
+        return flight
+
+    def _finish(self, key: tuple, flight: QueryFlight) -> None:
+        self._flights.pop(key, None)
+        flight.finish()
+
+    async def handle_query(self, request: web.Request) -> web.Response:
+        """POST /query: answer a query, returns {"result", "responses", "failed"}."""
+        try:
+            params = self.parse_request(await request.json())
+        except (ValueError, json.JSONDecodeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        responses: Dict[int, str] = {}
+        failed: Dict[int, str] = {}
+        async for event in self.join(*params).follow():
+            if event.type == QueryEventType.YEAR_DONE:
+                responses[event.year] = event.text
+            elif event.type == QueryEventType.YEAR_FAILED:
+                failed[event.year] = event.text
+            elif event.type == QueryEventType.ERROR:
+                self.stats["errors"] += 1
+                return web.json_response({"error": event.text}, status=500)
+            elif event.type == QueryEventType.DONE:
+                return web.json_response({"result": event.text, "responses": responses, "failed": failed})
+        self.stats["errors"] += 1
+        return web.json_response({"error": "Query ended without a result"}, status=500)
+
+    async def handle_stream(self, request: web.Request) -> web.StreamResponse:
+        """POST /stream: answer a query as newline-delimited JSON QueryEvents."""
+        try:
+            params = self.parse_request(await request.json())
+        except (ValueError, json.JSONDecodeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        flight = self.join(*params)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        try:
+            async for event in flight.follow():
+                await response.write((json.dumps(event.to_dict()) + "\n").encode("utf-8"))
+        except ConnectionResetError:
+            # The client went away, the query keeps running for the other requests following it
+            return response
+        await response.write_eof()
+        return response
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """GET /health: server and index cache statistics."""
+        return web.json_response({
+            "status": "ok",
+            "in_flight": len(self._flights),
+            "engines": len(self._engines),
+            "index_cache": INDEX_CACHE.stats_dict(),
+            **self.stats,
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics: per-stage timings and counters in the Prometheus text format."""
+        return web.Response(text=self.metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/query", self.handle_query),
+            web.post("/stream", self.handle_stream),
+            web.get("/health", self.handle_health),
+        ])
+        if self.metrics is not None:
+            app.add_routes([web.get("/metrics", self.handle_metrics)])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve podcast transcript queries over HTTP/JSON, keeping indexes and models warm.")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--transcripts-dir", type=str, default="./transcripts", help="Directory containing transcript files")
+    parser.add_argument("--index-dir", type=str, default="./index", help="Directory containing index files")
+    parser.add_argument("--workers", type=int, default=8, help="Number of queries answered concurrently")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Number of years queried in parallel per query (capped by the provider's rate limits)")
+    parser.add_argument("--summary-mode", type=str, choices=SUMMARY_MODES, default="single", help="Summarize all years in one LLM call, or reduce them hierarchically in concurrent groups")
+    parser.add_argument("--retrieval-mode", type=str, choices=RETRIEVAL_MODES, default="vector", help="Retrieve chunks by vector search (default), or opt in to BM25 keyword search or both fused")
+    parser.add_argument("--preload", action="store_true", default=False, help="Load the default provider's indexes at startup")
+    parser.add_argument("--metrics", action="store_true", default=False, help="Serve per-stage timings and counters in the Prometheus text format on GET /metrics")
+    parser.add_argument("--metrics-file", type=str, default=os.getenv(METRICS_FILE_ENV), help=f"Append per-stage timings and counters to this JSON lines file (default: ${METRICS_FILE_ENV})")
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.concurrency < 1:
+        print("Workers and concurrency must be >= 1.")
+        exit(1)
+
+    load_dotenv()
+    # Loaded once the arguments are valid, --help doesn't wait for llama-index
+    from sn_postprocess import RetrievalConfig
+
+    if args.metrics_file:
+        METRICS.add_sink(JsonLinesSink(args.metrics_file))
+    server = QueryServer(
+        engine_options=dict(
+            transcripts_dir=args.transcripts_dir,
+            index_dir=args.index_dir,
+            concurrency=args.concurrency,
+            summary_mode=args.summary_mode,
+            retrieval=RetrievalConfig(mode=args.retrieval_mode),
+        ),
+        default_provider=os.getenv("LLM_PROVIDER", "openai"),
+        workers=args.workers,
+        metrics=METRICS.add_sink(HistogramSink()) if args.metrics else None,
+    )
+    if args.preload:
+        server.preload(MIN_YEAR, MAX_YEAR)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
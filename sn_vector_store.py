@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core import StorageContext
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import build_metadata_filter_fn
+
+from sn_options import MMAP_DTYPES
+
+MMAP_VECTORS_FILE = "vectors.npy"
+MMAP_SCALES_FILE = "vectors_scale.npy"
+MMAP_TEXT_FILE = "nodes_text.bin"
+MMAP_OFFSETS_FILE = "nodes_offsets.npy"
+MMAP_NODES_FILE = "nodes.json"
+# The nodes table marks a store as present, it is written last and removed first
+MMAP_FILES = (MMAP_NODES_FILE, MMAP_VECTORS_FILE, MMAP_SCALES_FILE, MMAP_TEXT_FILE, MMAP_OFFSETS_FILE)
+DTYPES = MMAP_DTYPES
+# Number of rows converted to float32 at a time during a search, bounds the working memory
+SEARCH_BLOCK_ROWS = 8192
+
+
+def has_mmap_store(index_path: str) -> bool:
+    """ Returns True if index_path contains a binary memory-mapped vector store """
+    return os.path.exists(os.path.join(index_path, MMAP_NODES_FILE))
+
+
+def remove_mmap_store(index_path: str) -> bool:
+    """ Removes the binary store of index_path, returns True if there was one """
+    existed = has_mmap_store(index_path)
+    for name in MMAP_FILES:
+        try:
+            os.remove(os.path.join(index_path, name))
+        except FileNotFoundError:
+            pass
+    return existed
+
+
+def write_mmap_store(index_path: str, nodes: Sequence[BaseNode], embeddings: Sequence[List[float]], dtype: str = "float32") -> None:
+    """
+    Write nodes and their embeddings in the binary format:
+    a row-normalized vector matrix (float32, float16 or int8 with per-row scales),
+    the node texts concatenated as UTF-8 with an offsets table, and a JSON table
+    of node ids and metadata.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {DTYPES}")
+    os.makedirs(index_path, exist_ok=True)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(nodes), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1
+        np.save(os.path.join(index_path, MMAP_SCALES_FILE), scales.astype(np.float32))
+        matrix = np.round(matrix / scales[:, None]).astype(np.int8)
+    else:
+        matrix = matrix.astype(dtype)
+    np.save(os.path.join(index_path, MMAP_VECTORS_FILE), matrix)
+
+    offsets = [0]
+    with open(os.path.join(index_path, MMAP_TEXT_FILE), "wb") as f:
+        for node in nodes:
+            data = node.get_content().encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(index_path, MMAP_OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+    table = {
+        "dtype": dtype,
+        "ids": [node.node_id for node in nodes],
+        "ref_doc_ids": [node.ref_doc_id for node in nodes],
+        "metadata": [node.metadata for node in nodes],
+        "excluded_embed_metadata_keys": [node.excluded_embed_metadata_keys for node in nodes],
+        "excluded_llm_metadata_keys": [node.excluded_llm_metadata_keys for node in nodes],
+    }
+    with open(os.path.join(index_path, MMAP_NODES_FILE), "w", encoding="utf-8") as f:
+        json.dump(table, f, separators=(",", ":"))
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Read-only vector store over the binary format written by write_mmap_store.
+    The vector matrix and the texts are memory-mapped, and a search is a
+    blockwise matrix-vector product over the normalized rows (cosine similarity).
+    """
+    stores_text: bool = True
+    persist_path: str
+
+    _vectors: Any = PrivateAttr()
+    _scales: Optional[Any] = PrivateAttr(default=None)
+    _offsets: Any = PrivateAttr()
+    _text: Any = PrivateAttr()
+    _table: dict = PrivateAttr()
+
+    def __init__(self, persist_path: str, **kwargs: Any) -> None:
+        super().__init__(persist_path=persist_path, **kwargs)
+        with open(os.path.join(persist_path, MMAP_NODES_FILE), "r", encoding="utf-8") as f:
+            self._table = json.load(f)
+        self._vectors = np.load(os.path.join(persist_path, MMAP_VECTORS_FILE), mmap_mode="r")
+        if self._table["dtype"] == "int8":
+            self._scales = np.load(os.path.join(persist_path, MMAP_SCALES_FILE))
+        self._offsets = np.load(os.path.join(persist_path, MMAP_OFFSETS_FILE))
+        if self._offsets[-1] > 0:
+            self._text = np.memmap(os.path.join(persist_path, MMAP_TEXT_FILE), dtype=np.uint8, mode="r")
+        else:
+            self._text = np.zeros(0, dtype=np.uint8)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._table["ids"])
+
+    @property
+    def node_ids(self) -> List[str]:
+        return self._table["ids"]
+
+    @property
+    def dtype(self) -> str:
+        return self._table["dtype"]
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only, rebuild it with write_mmap_store")
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        raise NotImplementedError("MmapVectorStore is read-only, rebuild it with write_mmap_store")
+
+    def get_node(self, row: int) -> TextNode:
+        """Materialize the node stored at the given row."""
+        table = self._table
+        text = bytes(self._text[self._offsets[row]:self._offsets[row + 1]]).decode("utf-8")
+        relationships = {}
+        if table["ref_doc_ids"][row]:
+            relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=table["ref_doc_ids"][row])
+        return TextNode(
+            id_=table["ids"][row],
+            text=text,
+            metadata=table["metadata"][row],
+            excluded_embed_metadata_keys=table["excluded_embed_metadata_keys"][row],
+            excluded_llm_metadata_keys=table["excluded_llm_metadata_keys"][row],
+            relationships=relationships,
+        )
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None, filters: Any = None) -> List[BaseNode]:
+        ids = self._table["ids"]
+        if node_ids is None:
+            return [self.get_node(row) for row in range(len(ids))]
+        rows = {node_id: row for row, node_id in enumerate(ids)}
+        return [self.get_node(rows[node_id]) for node_id in node_ids if node_id in rows]
+
+    def similarities(self, query_embedding: List[float]) -> np.ndarray:
+        """Return the cosine similarity of the query embedding with every row."""
+        return self.similarities_many([query_embedding])[:, 0]
+
+    def similarities_many(self, query_embeddings: List[List[float]]) -> np.ndarray:
+        """Return the (rows, queries) matrix of cosine similarities of many query embeddings with every row."""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = (queries / np.where(norms == 0, 1, norms)).T
+        scores = np.empty((len(self), queries.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = self._vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ queries
+        if self._scales is not None:
+            scores *= self._scales[:, None]
+        return scores
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if len(self) == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        scores = self.similarities(query.query_embedding)
+        if query.filters is not None:
+            metadata = self._table["metadata"]
+            filter_fn = build_metadata_filter_fn(lambda row: metadata[row], query.filters)
+            mask = np.fromiter((filter_fn(row) for row in range(len(self))), dtype=bool, count=len(self))
+            scores[~mask] = -np.inf
+            top_k = min(query.similarity_top_k, int(mask.sum()))
+        else:
+            top_k = min(query.similarity_top_k, len(scores))
+        if top_k == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows])]
+        return VectorStoreQueryResult(
+            nodes=[self.get_node(int(row)) for row in rows],
+            similarities=[float(scores[row]) for row in rows],
+            ids=[self._table["ids"][row] for row in rows],
+        )
+
+
+def convert_index(index_path: str, dtype: str = "float32") -> int:
+    """
+    Convert an index persisted in the default JSON format to the binary format,
+    writing the new files next to the JSON ones. Returns the number of nodes converted.
+    """
+    storage_context = StorageContext.from_defaults(persist_dir=index_path)
+    embedding_dict = storage_context.vector_store.to_dict()["embedding_dict"]
+    node_ids = list(embedding_dict.keys())
+    nodes = storage_context.docstore.get_nodes(node_ids)
+    write_mmap_store(index_path, nodes, [embedding_dict[node_id] for node_id in node_ids], dtype=dtype)
+    return len(nodes)
+
+
+def convert_all(index_dir: str, dtype: str = "float32") -> None:
+    """Convert every per-year JSON index found under index_dir."""
+    for model_dir in sorted(os.listdir(index_dir)):
+        model_path = os.path.join(index_dir, model_dir)
+        if not os.path.isdir(model_path):
+            continue
+        for name in sorted(os.listdir(model_path)):
+            index_path = os.path.join(model_path, name)
+            if not os.path.exists(os.path.join(index_path, "docstore.json")):
+                continue
+            try:
+                count = convert_index(index_path, dtype)
+                print(f"✅ Converted {index_path}: {count} nodes")
+            except Exception as e:
+                print(f"❌ Failed to convert {index_path}: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert JSON vector indexes to the binary memory-mapped format.")
+    parser.add_argument("--index-dir", type=str, default="./index", help="Directory containing index files")
+    parser.add_argument("--dtype", type=str, choices=DTYPES, default="float32", help="Storage type of the vectors")
+    args = parser.parse_args()
+    convert_all(args.index_dir, args.dtype)
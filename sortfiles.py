@@ -1,47 +1,215 @@
 import os
 import re
 import shutil
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import argparse
 
 MIN_YEAR = 2015
 MAX_YEAR = 2025
+# The DATE: line is part of the transcript header, a few hundred bytes into the file
+HEADER_BYTES = 4096
+DATE_PATTERN = re.compile(r"DATE:\s+([A-Za-z]+ \d{1,2}, \d{4})", re.IGNORECASE)
+EPISODE_PATTERN = re.compile(r"(\d+)\.txt$")
+CATALOG_FILE = "catalog.json"
+DEFAULT_WORKERS = 8
+
+def parse_transcript_date(header):
+    """
+    Extracts and returns the air date from the header text of a transcript, from its first DATE: line.
+    Returns None if no valid date is found or if the date format is incorrect.
+    """
+    for line in header.splitlines():
+        match = DATE_PATTERN.search(line)
+        if match:
+            try:
+                return datetime.strptime(match.group(1), "%B %d, %Y").date()
+            except ValueError:
+                return None
+    return None
+
+def read_header(file_path):
+    """
+    Returns the first HEADER_BYTES of the transcript file located at file_path as text.
+    """
+    with open(file_path, 'rb') as f:
+        return f.read(HEADER_BYTES).decode('utf-8', errors='ignore')
+
+def extract_date_from_transcript(file_path):
+    """
+    Extracts and returns the air date from the transcript file located at file_path by searching for a date pattern.
+    Only the header of the file is read. Returns None if no valid date is found or if the date format is incorrect.
+    """
+    return parse_transcript_date(read_header(file_path))
 
 def extract_year_from_transcript(file_path):
     """
     Extracts and returns the year from the transcript file located at file_path by searching for a date pattern.
     Returns None if no valid date is found or if the date format is incorrect.
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            match = re.search(r"DATE:\s+([A-Za-z]+ \d{1,2}, \d{4})", line, re.IGNORECASE)
-            if match:
-                try:
-                    date_obj = datetime.strptime(match.group(1), "%B %d, %Y")
-                    return date_obj.year
-                except ValueError:
-                    return None
+    date = extract_date_from_transcript(file_path)
+    return date.year if date else None
+
+def extract_episode_number(file_name):
+    """
+    Extracts and returns the episode number from a transcript file name such as sn-1030.txt.
+    Returns None if the file name does not contain an episode number.
+    """
+    match = EPISODE_PATTERN.search(file_name)
+    return int(match.group(1)) if match else None
+
+def catalog_entry(file_path):
+    """
+    Returns the catalog entry of a transcript file: episode number, air date, size, mtime and SHA-256.
+    The file is read once, its header giving the date while the whole content is hashed.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha256()
+    header = b""
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            if not header:
+                header = block[:HEADER_BYTES]
+            digest.update(block)
+    date = parse_transcript_date(header.decode('utf-8', errors='ignore'))
+    return {
+        "episode": extract_episode_number(os.path.basename(file_path)),
+        "date": date.isoformat() if date else None,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+def load_catalog(base_dir):
+    """
+    Returns the catalog written by organize_transcripts_by_year in base_dir, mapping file names to their entries.
+    Returns an empty catalog if there is none.
+    """
+    catalog_path = os.path.join(base_dir, CATALOG_FILE)
+    if not os.path.exists(catalog_path):
+        return {}
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        return json.load(f)["files"]
+
+def save_catalog(base_dir, catalog):
+    """
+    Persists the catalog in base_dir, replacing the file atomically.
+    """
+    catalog_path = os.path.join(base_dir, CATALOG_FILE)
+    with open(catalog_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({"files": catalog}, f, separators=(",", ":"), sort_keys=True)
+    os.replace(catalog_path + ".tmp", catalog_path)
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def lookup_catalog(file_path):
+    """
+    Returns the catalog entry of a sorted transcript file, from the catalog of its transcripts directory,
+    if the file has not changed since it was cataloged. Returns None otherwise.
+    """
+    file_name = os.path.basename(file_path)
+    year_dir = os.path.dirname(os.path.abspath(file_path))
+    for base_dir in (os.path.dirname(year_dir), year_dir):
+        catalog_path = os.path.join(base_dir, CATALOG_FILE)
+        try:
+            catalog_mtime = os.stat(catalog_path).st_mtime_ns
+        except OSError:
+            continue
+        with _catalogs_lock:
+            cached = _catalogs.get(catalog_path)
+            if cached is None or cached[0] != catalog_mtime:
+                cached = _catalogs[catalog_path] = (catalog_mtime, load_catalog(base_dir))
+        entry = cached[1].get(file_name)
+        if entry is None:
+            continue
+        stat = os.stat(file_path)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return entry
     return None
 
-def organize_transcripts_by_year(base_dir="./transcripts"):
+def move_file(source, destination):
+    """
+    Moves a file with a rename, copying it only when the destination is on another filesystem.
+    """
+    try:
+        os.replace(source, destination)
+    except OSError:
+        shutil.move(source, destination)
+
+def organize_transcripts_by_year(base_dir="./transcripts", workers=DEFAULT_WORKERS, dry_run=False, write_catalog=True):
     """
     Organizes transcript files by year by moving them into subdirectories named after the extracted year.
     Only processes files with a .txt extension. Files with dates outside the years range are ignored.
+    Files are read and hashed in a thread pool, and those already placed in their year directory are
+    only re-read when they changed. A catalog of every sorted file (episode, date, size and hash) is
+    written to base_dir for the indexing to use. With dry_run, the moves are printed instead of done.
+    Returns the catalog, or None if base_dir does not exist.
     """
     if not os.path.isdir(base_dir):
         print(f"Error: The directory '{base_dir}' does not exist.")
-        return
-    files = [f for f in os.listdir(base_dir) if f.endswith(".txt")]
-    for f in files:
-        full_path = os.path.join(base_dir, f)
-        year = extract_year_from_transcript(full_path)
-        if year and MIN_YEAR <= year <= MAX_YEAR:
-            year_dir = os.path.join(base_dir, str(year))
+        return None
+    previous = load_catalog(base_dir)
+    pending = [os.path.join(base_dir, f) for f in sorted(os.listdir(base_dir)) if f.endswith(".txt")]
+    placed = []
+    for year in range(MIN_YEAR, MAX_YEAR + 1):
+        year_dir = os.path.join(base_dir, str(year))
+        if os.path.isdir(year_dir):
+            placed.extend(os.path.join(year_dir, f) for f in sorted(os.listdir(year_dir)) if f.endswith(".txt"))
+
+    def cataloged(path):
+        entry = previous.get(os.path.basename(path))
+        if entry is not None and entry.get("path") == os.path.relpath(path, base_dir):
+            stat = os.stat(path)
+            if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+                return {key: value for key, value in entry.items() if key != "path"}
+        return None
+
+    # Only the new or changed files are read
+    paths = pending + placed
+    entries = [cataloged(path) for path in paths]
+    to_read = [i for i, entry in enumerate(entries) if entry is None]
+    if to_read:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(to_read)))) as executor:
+            for i, entry in zip(to_read, executor.map(catalog_entry, [paths[i] for i in to_read])):
+                entries[i] = entry
+
+    catalog = {}
+    for path, entry in zip(placed, entries[len(pending):]):
+        catalog[os.path.basename(path)] = dict(entry, path=os.path.relpath(path, base_dir))
+    for path, entry in zip(pending, entries[:len(pending)]):
+        f = os.path.basename(path)
+        year = int(entry["date"][:4]) if entry["date"] else None
+        if not year or not MIN_YEAR <= year <= MAX_YEAR:
+            continue
+        year_dir = os.path.join(base_dir, str(year))
+        destination = os.path.join(year_dir, f)
+        placed_entry = catalog.get(f)
+        if placed_entry is not None and placed_entry["sha256"] == entry["sha256"] and placed_entry["path"] == os.path.relpath(destination, base_dir):
+            # Already placed, e.g. downloaded again
+            continue
+        if dry_run:
+            print(f"{path} -> {destination}")
+        else:
             os.makedirs(year_dir, exist_ok=True)
-            shutil.move(full_path, os.path.join(year_dir, f))
+            move_file(path, destination)
+        catalog[f] = dict(entry, path=os.path.relpath(destination, base_dir))
+    if write_catalog and not dry_run and catalog != previous:
+        save_catalog(base_dir, catalog)
+    return catalog
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Organize transcript files by year.")
     parser.add_argument("--transcripts-dir", type=str, default="./transcripts", help="Directory containing transcript files")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of files read in parallel")
+    parser.add_argument("--dry-run", action="store_true", default=False, help="Print the moves without moving any file")
+    parser.add_argument("--no-catalog", action="store_true", default=False, help=f"Do not write the {CATALOG_FILE} episode catalog")
     args = parser.parse_args()
-    organize_transcripts_by_year(args.transcripts_dir)
+    start_time = time.perf_counter()
+    catalog = organize_transcripts_by_year(args.transcripts_dir, args.workers, args.dry_run, not args.no_catalog)
+    if catalog is not None:
+        print(f"✅ {len(catalog)} transcripts sorted in {time.perf_counter() - start_time:.2f} seconds")
@@ -0,0 +1,53 @@
+import unittest
+import tempfile
+import os
+import time
+
+from sn_answer_cache import AnswerCache
+
+
+class TestAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "answers.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_exact_match_is_normalized(self):
+        cache = AnswerCache(self.path)
+        cache.put("year", "2015|model", "What about VPNs?", "answer")
+        self.assertEqual(cache.get("year", "2015|model", "  what about   vpns?"), "answer")
+        self.assertIsNone(cache.get("year", "2016|model", "What about VPNs?"))
+
+    def test_semantic_match_above_threshold(self):
+        cache = AnswerCache(self.path, similarity_threshold=0.9)
+        cache.put("year", "2015", "What did Steve say about VPNs?", "answer", [1.0, 0.0, 0.1])
+        self.assertEqual(cache.get("year", "2015", "Steve's opinion on VPNs", [1.0, 0.0, 0.2]), "answer")
+        self.assertIsNone(cache.get("year", "2015", "SpinRite", [0.0, 1.0, 0.0]))
+
+    def test_near_query_is_not_served_by_default(self):
+        cache = AnswerCache(self.path)
+        cache.put("year", "2015", "What did Steve say about VPNs?", "answer", [1.0, 0.0, 0.1])
+        self.assertIsNone(cache.get("year", "2015", "What did Leo say about VPNs?", [1.0, 0.0, 0.11]))
+        self.assertEqual(cache.get("year", "2015", "what did steve say about vpns?", [1.0, 0.0, 0.1]), "answer")
+
+    def test_ttl_expires_answers(self):
+        cache = AnswerCache(self.path, ttl=0.05)
+        cache.put("summary", "scope", "query", "answer")
+        self.assertEqual(cache.get("summary", "scope", "query"), "answer")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("summary", "scope", "query"))
+
+    def test_invalidate(self):
+        cache = AnswerCache(self.path)
+        cache.put("year", "scope", "query", "answer")
+        cache.put("summary", "scope", "query", "summary")
+        cache.invalidate("year")
+        self.assertIsNone(cache.get("year", "scope", "query"))
+        self.assertEqual(cache.get("summary", "scope", "query"), "summary")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from llama_index.core.indices.vector_store.retrievers import VectorIndexRetriever
+from llama_index.core.schema import QueryBundle
+
+from sn_batch import BatchQuery, BatchRunner, read_queries
+from sn_bench import write_corpus
+from sn_bench_models import install_models
+from sn_index_cache import IndexCache
+from sn_rag_engine import SnRAGEngine
+
+
+class TestReadQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_jsonl(self):
+        path = self.write("q.jsonl", '{"query": "VPNs", "start_year": 2015, "end_year": 2016}\n\n'
+                                     '{"id": "pw", "query": "passwords", "start_year": "2017", "end_year": 2017, "summary_prompt": "P"}\n')
+        queries = read_queries(path)
+        self.assertEqual([q.id for q in queries], ["1", "pw"])
+        self.assertEqual(queries[0].years, [2015, 2016])
+        self.assertEqual(queries[1].summary_prompt, "P")
+
+    def test_csv(self):
+        path = self.write("q.csv", "query,start_year,end_year,summary_prompt\nVPNs,2015,2016,\n")
+        queries = read_queries(path)
+        self.assertEqual((queries[0].id, queries[0].query, queries[0].summary_prompt), ("2", "VPNs", None))
+
+    def test_invalid_rows(self):
+        for row in ({"query": "", "start_year": 2015, "end_year": 2015},
+                    {"query": "VPNs", "start_year": 2016, "end_year": 2015},
+                    {"query": "VPNs", "start_year": "x", "end_year": 2015}):
+            with self.assertRaises(ValueError):
+                read_queries(self.write("bad.jsonl", json.dumps(row)))
+
+    def test_malformed_jsonl(self):
+        valid = json.dumps({"query": "VPNs", "start_year": 2015, "end_year": 2015})
+        for line in ('["VPNs", 2015, 2015]', '"VPNs"', "null", '{"query": "VPNs",'):
+            with self.assertRaisesRegex(ValueError, r"bad\.jsonl:2: "):
+                read_queries(self.write("bad.jsonl", valid + "\n" + line))
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_corpus(os.path.join(self.dir, "transcripts"), [2015, 2016], episodes_per_year=3, episode_words=300)
+        self.engine = SnRAGEngine(
+            transcripts_dir=os.path.join(self.dir, "transcripts"),
+            index_dir=os.path.join(self.dir, "index"),
+            index_cache=IndexCache(),
+            models=install_models(),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_run(self):
+        path = os.path.join(self.dir, "q.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"id": "a", "query": "router security", "start_year": 2015, "end_year": 2016}\n')
+            f.write('{"id": "b", "query": "password exploit", "start_year": 2016, "end_year": 2017}\n')
+        output = io.StringIO()
+        stats = BatchRunner(self.engine, llm_concurrency=2).run(read_queries(path), output)
+        records = {r["id"]: r for r in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual(stats["queries"], 2)
+        self.assertEqual(list(records["a"]["responses"]), ["2015", "2016"])
+        self.assertTrue(records["a"]["result"])
+        # 2017 has no transcripts: the year fails but the query is answered from the others
+        self.assertEqual(list(records["b"]["failed"]), ["2017"])
+        self.assertTrue(records["b"]["result"])
+
+    def test_answers_match_query_year(self):
+        engine = SnRAGEngine(
+            transcripts_dir=os.path.join(self.dir, "transcripts"),
+            index_dir=os.path.join(self.dir, "index"),
+            index_cache=IndexCache(),
+            use_answer_cache=False,
+            models=install_models(),
+        )
+        output = io.StringIO()
+        BatchRunner(engine).run([BatchQuery("a", "router security", 2015, 2016)], output)
+        responses = json.loads(output.getvalue())["responses"]
+        for year in (2015, 2016):
+            self.assertEqual(responses[str(year)], f"\n--- {year} ---\n{engine.query_year('router security', year)}\n")
+
+    def test_search_many_matches_retriever(self):
+        index = self.engine.get_index(self.engine.get_transcripts_path(2015), self.engine.get_index_path(2015))
+        embeddings = self.engine.get_query_embeddings(["router security", "password exploit"])
+        for embedding, nodes in zip(embeddings, self.engine.search_many(index, embeddings, 3)):
+            expected = VectorIndexRetriever(index=index, similarity_top_k=3).retrieve(QueryBundle("", embedding=embedding))
+            self.assertEqual([n.node.node_id for n in nodes], [n.node.node_id for n in expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
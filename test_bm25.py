@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from sn_bm25 import BM25Index, is_keyword_query, reciprocal_rank_fusion, tokenize
+
+
+class TestBM25(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = [
+            TextNode(id_="a", text="Steve ran SpinRite on the drive again"),
+            TextNode(id_="b", text="The Heartbleed bug, CVE-2014-0160, affected OpenSSL"),
+            TextNode(id_="c", text="VPN providers and the routers that run a VPN"),
+        ]
+        self.bm25 = BM25Index.build(self.nodes, version="v1")
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("What about CVE-2014-0160 and VPNs?"), ["cve-2014-0160", "cve", "2014", "0160", "vpn"])
+
+    def test_search(self):
+        self.assertEqual(self.bm25.search("spinrite", 3)[0][0], "a")
+        self.assertEqual([node_id for node_id, _ in self.bm25.search("CVE-2014-0160", 3)], ["b"])
+        self.assertEqual(self.bm25.search("VPNs", 3)[0][0], "c")
+        self.assertEqual(self.bm25.search("unknown", 3), [])
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(BM25Index.load(tmp))
+            self.bm25.save(tmp)
+            loaded = BM25Index.load(tmp)
+        self.assertEqual(loaded.version, "v1")
+        self.assertEqual(loaded.search("openssl heartbleed", 3), self.bm25.search("openssl heartbleed", 3))
+
+    def test_keyword_query(self):
+        self.assertTrue(is_keyword_query("SpinRite"))
+        self.assertTrue(is_keyword_query("VPNs Log4j"))
+        self.assertTrue(is_keyword_query("CVE-2014-0160"))
+        self.assertTrue(is_keyword_query('the "heartbleed" bug'))
+        self.assertFalse(is_keyword_query("How does Steve feel about password managers?"))
+
+    def test_questions_are_not_keyword_queries(self):
+        # Questions always get the vector search, even when they name an identifier
+        self.assertFalse(is_keyword_query("What did Steve say about VPNs?"))
+        self.assertFalse(is_keyword_query("What did Steve say about SpinRite?"))
+        self.assertFalse(is_keyword_query("Is CVE-2014-0160 still exploited?"))
+        self.assertFalse(is_keyword_query("why Log4j"))
+
+    def test_reciprocal_rank_fusion(self):
+        vector = [NodeWithScore(node=self.nodes[i], score=0.9 - i / 10) for i in (0, 1, 2)]
+        lexical = [NodeWithScore(node=self.nodes[2], score=5.0)]
+        fused = reciprocal_rank_fusion([vector, lexical], top_k=2)
+        # c is ranked by both searches, a only tops one of them
+        self.assertEqual([node.node.node_id for node in fused], ["c", "a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
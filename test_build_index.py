@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from sn_bench import write_corpus
+from sn_bench_models import HashEmbedding, install_models
+from sn_build_index import CHECKPOINT_DIR, IndexBuilder
+from sn_index_cache import IndexCache
+from sn_manifest import load_manifest
+from sn_rag_engine import SnRAGEngine
+from sn_vector_store import MmapVectorStore, has_mmap_store
+
+
+class TestIndexBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.transcripts = os.path.join(self.dir, "transcripts")
+        write_corpus(self.transcripts, [2015], episodes_per_year=3, episode_words=600)
+        self.models = install_models()
+        self.engine = SnRAGEngine(transcripts_dir=self.transcripts, index_dir=os.path.join(self.dir, "index"),
+                                  index_cache=IndexCache(), models=self.models)
+        self.docs_path = self.engine.get_transcripts_path(2015)
+        self.index_path = self.engine.get_index_path(2015)
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        shutil.rmtree(self.dir)
+
+    def builder(self, **kwargs):
+        return IndexBuilder(self.engine, self.pool, embed_batch_size=1, embed_concurrency=1, parse_window=1, **kwargs)
+
+    def build(self, force=False, **kwargs):
+        return self.builder(**kwargs).build_target("2015", self.docs_path, self.index_path, force)
+
+    def test_resume_after_partial_checkpoint(self):
+        embed_batch = HashEmbedding.get_text_embedding_batch
+        calls = []
+
+        def fail_late(model, texts, **kwargs):
+            calls.append(len(texts))
+            if len(calls) > 3:
+                raise RuntimeError("provider unavailable")
+            return embed_batch(model, texts, **kwargs)
+
+        with mock.patch.object(HashEmbedding, "get_text_embedding_batch", fail_late):
+            with self.assertRaises(RuntimeError):
+                self.build()
+        checkpoints = os.listdir(os.path.join(self.index_path, CHECKPOINT_DIR))
+        self.assertTrue(0 < len(checkpoints) < 3)
+
+        stats = self.build()
+        self.assertEqual(stats.resumed_files, len(checkpoints))
+        self.assertEqual(stats.files, 3)
+        self.assertFalse(os.path.exists(os.path.join(self.index_path, CHECKPOINT_DIR)))
+        self.assertEqual(set(load_manifest(self.index_path)), {"sn-500.txt", "sn-501.txt", "sn-502.txt"})
+
+    def test_up_to_date_index_is_skipped(self):
+        self.assertEqual(self.build().files, 3)
+        with mock.patch.object(IndexBuilder, "build") as build:
+            self.assertIsNone(self.build())
+        build.assert_not_called()
+
+    def test_force_removes_stale_binary_store(self):
+        self.build(mmap_dtype="float16")
+        self.assertTrue(has_mmap_store(self.index_path))
+        self.assertIsNone(self.build())
+        stats = self.build(force=True)
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(stats.resumed_files, 0)
+        self.assertFalse(has_mmap_store(self.index_path))
+        index = SnRAGEngine(index_cache=IndexCache(), models=self.models).get_index(self.docs_path, self.index_path)
+        self.assertNotIsInstance(index.vector_store, MmapVectorStore)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import tempfile
+import os
+
+from llama_index.core.embeddings import MockEmbedding
+
+from sn_embedding_cache import EVICTION_CHECK_INTERVAL, EmbeddingCache, EmbeddingKVStore, normalize_query
+
+
+class CountingEmbedding(MockEmbedding):
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.calls += len(texts)
+        return super()._get_text_embeddings(texts)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "embeddings.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_scoped_by_model(self):
+        cache = EmbeddingCache(self.path)
+        cache.put("model-a", "key", [0.5, -1.0])
+        self.assertEqual(cache.get("model-a", "key"), [0.5, -1.0])
+        self.assertIsNone(cache.get("model-b", "key"))
+
+    def test_evicts_least_recently_used(self):
+        cache = EmbeddingCache(self.path, max_entries=200)
+        for i in range(256):
+            cache.put("model", str(i), [float(i)])
+        self.assertEqual(len(cache), 200)
+        self.assertIsNone(cache.get("model", "0"))
+        self.assertEqual(cache.get("model", "255"), [255.0])
+
+    def test_hits_are_written_in_batches(self):
+        cache = EmbeddingCache(self.path, max_entries=EVICTION_CHECK_INTERVAL - 1)
+        cache.put("model", "a", [1.0])
+        cache.put("model", "b", [2.0])
+        changes = cache._conn.total_changes
+        for _ in range(10):
+            self.assertEqual(cache.get("model", "a"), [1.0])
+        self.assertEqual(cache._conn.total_changes, changes)
+        # The hit reaches the database before the eviction, "b" is now the least recently used
+        for i in range(EVICTION_CHECK_INTERVAL - 2):
+            cache.put("model", str(i), [0.0])
+        self.assertEqual(cache.get("model", "a"), [1.0])
+        self.assertIsNone(cache.get("model", "b"))
+
+    def test_embed_model_skips_cached_texts(self):
+        embed_model = CountingEmbedding(embed_dim=4)
+        embed_model.embeddings_cache = EmbeddingKVStore(EmbeddingCache(self.path), "model")
+        first = embed_model.get_text_embedding_batch(["chunk one", "chunk two"])
+        second = embed_model.get_text_embedding_batch(["chunk two", "chunk three"])
+        self.assertEqual(embed_model.calls, 3)
+        self.assertEqual(second[0], first[1])
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  What did  Steve\nsay about VPNs? "), "what did steve say about vpns?")
+
+
+if __name__ == '__main__':
+    unittest.main()
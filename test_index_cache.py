@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import os
+
+from sn_index_cache import IndexCache, index_signature, index_size
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+
+    def loader(self, value):
+        def load():
+            self.loads += 1
+            return value
+        return load
+
+    def test_hit_after_miss(self):
+        cache = IndexCache()
+        self.assertEqual(cache.get_or_load("a", lambda: 1, self.loader("A")), "A")
+        self.assertEqual(cache.get_or_load("a", lambda: 1, self.loader("A")), "A")
+        self.assertEqual(self.loads, 1)
+        stats = cache.stats_dict()
+        self.assertEqual((stats["hits"], stats["misses"], stats["loads"]), (1, 1, 1))
+
+    def test_stale_signature_reloads(self):
+        cache = IndexCache()
+        cache.get_or_load("a", lambda: 1, self.loader("A"))
+        self.assertEqual(cache.get_or_load("a", lambda: 2, self.loader("B")), "B")
+        self.assertEqual(self.loads, 2)
+
+    def test_lru_eviction_by_entries(self):
+        cache = IndexCache(max_entries=2)
+        cache.get_or_load("a", lambda: 1, self.loader("A"))
+        cache.get_or_load("b", lambda: 1, self.loader("B"))
+        cache.get_or_load("a", lambda: 1, self.loader("A"))
+        cache.get_or_load("c", lambda: 1, self.loader("C"))
+        self.assertEqual(len(cache), 2)
+        cache.get_or_load("a", lambda: 1, self.loader("A"))
+        self.assertEqual(self.loads, 3)
+        self.assertEqual(cache.stats_dict()["evictions"], 1)
+
+    def test_eviction_by_bytes_keeps_latest(self):
+        cache = IndexCache(max_bytes=100)
+        cache.get_or_load("a", lambda: 1, self.loader("A"), lambda: 60)
+        cache.get_or_load("b", lambda: 1, self.loader("B"), lambda: 60)
+        self.assertEqual(len(cache), 1)
+        cache.get_or_load("c", lambda: 1, self.loader("C"), lambda: 500)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats_dict()["bytes"], 500)
+
+
+class TestIndexSignature(unittest.TestCase):
+
+    def test_missing_path(self):
+        self.assertIsNone(index_signature("/nonexistent/index/path"))
+
+    def test_signature_changes_with_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            before = index_signature(tmp)
+            with open(os.path.join(tmp, "docstore.json"), "w") as f:
+                f.write("{}")
+            self.assertNotEqual(index_signature(tmp), before)
+            self.assertEqual(index_size(tmp), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import tempfile
+import os
+
+from sn_manifest import diff_manifest, file_entry, list_transcripts
+
+
+class TestDiffManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        for fname in ("sn-500.txt", "sn-501.txt", "sn-502.txt"):
+            self.write(fname, f"transcript {fname}")
+        files = list_transcripts(self.dir)
+        self.manifest = {fname: file_entry(path, [fname + "-node"]) for fname, path in files.items()}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, fname, content):
+        with open(os.path.join(self.dir, fname), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_unchanged(self):
+        self.assertFalse(diff_manifest(self.manifest, list_transcripts(self.dir)))
+
+    def test_added_changed_removed(self):
+        self.write("sn-503.txt", "new episode")
+        self.write("sn-500.txt", "fixed transcript")
+        os.unlink(os.path.join(self.dir, "sn-502.txt"))
+        update = diff_manifest(self.manifest, list_transcripts(self.dir))
+        self.assertEqual(update.added, ["sn-503.txt"])
+        self.assertEqual(update.changed, ["sn-500.txt"])
+        self.assertEqual(update.removed, ["sn-502.txt"])
+        self.assertEqual(str(update), "1 added, 1 changed, 1 removed")
+
+    def test_touched_file_is_not_changed(self):
+        path = os.path.join(self.dir, "sn-501.txt")
+        os.utime(path, ns=(0, 0))
+        update = diff_manifest(self.manifest, list_transcripts(self.dir))
+        self.assertFalse(update)
+        self.assertEqual(self.manifest["sn-501.txt"]["mtime_ns"], 0)
+        self.assertEqual(self.manifest["sn-501.txt"]["node_ids"], ["sn-501.txt-node"])
+
+
+if __name__ == '__main__':
+    unittest.main()
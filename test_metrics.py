@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sn_bench_models import EchoLLM
+from sn_metrics import METRICS, HistogramSink, JsonLinesSink, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        self.assertFalse(metrics.enabled)
+        with metrics.timer("stage", year=2015), metrics.tags(provider="openai"):
+            metrics.count("calls")
+        sink = metrics.add_sink(HistogramSink())
+        self.assertEqual(sink.summary(), [])
+
+    def test_timers_and_counters_are_tagged(self):
+        metrics = Metrics()
+        sink = metrics.add_sink(HistogramSink())
+        with metrics.tags(provider="openai", year=2015):
+            with metrics.timer("synthesis"):
+                pass
+            metrics.count("llm_prompt_tokens", 100, year=2016)
+            metrics.count("llm_prompt_tokens", 50, year=2016)
+        metrics.count("llm_prompt_tokens", 7)
+        rows = {(row["name"], tuple(sorted(row["tags"].items()))): row for row in sink.summary()}
+        timer = rows[("synthesis", (("provider", "openai"), ("year", "2015")))]
+        self.assertEqual((timer["type"], timer["count"]), ("timer", 1))
+        # Call tags override the context's, and the context does not outlive its block
+        self.assertEqual(rows[("llm_prompt_tokens", (("provider", "openai"), ("year", "2016")))]["sum"], 150)
+        self.assertEqual(rows[("llm_prompt_tokens", ())]["sum"], 7)
+
+    def test_prometheus_format(self):
+        metrics = Metrics()
+        sink = metrics.add_sink(HistogramSink())
+        metrics.observe("query_range", 0.5, model='gpt "4"')
+        metrics.count("index_cache_hit", year=2015)
+        text = sink.render_prometheus()
+        self.assertIn("# TYPE sn_query_range_seconds summary", text)
+        self.assertIn('sn_query_range_seconds{model="gpt \\"4\\"",quantile="0.5"} 0.5', text)
+        self.assertIn('sn_query_range_seconds_count{model="gpt \\"4\\""} 1', text)
+        self.assertIn('sn_index_cache_hit_total{year="2015"} 1', text)
+
+    def test_json_lines_sink(self):
+        path = os.path.join(tempfile.mkdtemp(), "metrics.jsonl")
+        metrics = Metrics()
+        sink = metrics.add_sink(JsonLinesSink(path))
+        metrics.count("answer_cache_hit", kind="year")
+        metrics.remove_sink(sink)
+        metrics.count("answer_cache_hit", kind="year")
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        os.unlink(path)
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]["name"], records[0]["type"], records[0]["tags"]), ("answer_cache_hit", "counter", {"kind": "year"}))
+
+    def test_llm_token_counts(self):
+        sink = METRICS.add_sink(HistogramSink())
+        try:
+            with METRICS.tags(year=2015):
+                EchoLLM(output_words=5).complete("What did Steve say about VPNs?")
+        finally:
+            METRICS.remove_sink(sink)
+        totals = {row["name"]: row["sum"] for row in sink.summary() if row["tags"] == {"year": "2015"}}
+        self.assertEqual(totals["llm_calls"], 1)
+        self.assertGreater(totals["llm_prompt_tokens"], 0)
+        self.assertGreater(totals["llm_completion_tokens"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
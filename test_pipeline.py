@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sn_pipeline import batched, map_ordered, prefetch
+from sn_reader import SnTextFileReader, normalize_text
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+
+    def test_prefetch_is_bounded(self):
+        produced = []
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        iterator = prefetch(items(), max_pending=2)
+        self.assertEqual(next(iterator), 0)
+        threading.Event().wait(0.1)
+        # The queue holds at most 2 items and the producer blocks on the next one
+        self.assertLessEqual(len(produced), 4)
+        self.assertEqual(list(iterator), list(range(1, 100)))
+
+    def test_prefetch_raises_producer_errors(self):
+        def items():
+            yield 1
+            raise ValueError("parse failed")
+
+        iterator = prefetch(items())
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaises(ValueError):
+            next(iterator)
+
+    def test_prefetch_stops_producer_when_closed(self):
+        iterator = prefetch(iter(range(1000)), max_pending=1)
+        next(iterator)
+        iterator.close()
+        self.assertFalse(any(t.name == "prefetch" for t in threading.enumerate()))
+
+    def test_map_ordered(self):
+        taken = []
+
+        def items():
+            for i in range(20):
+                taken.append(i)
+                yield i
+
+        results = map_ordered(lambda i: i * i, items(), workers=4, max_pending=3)
+        self.assertEqual(next(results), 0)
+        self.assertLessEqual(len(taken), 3)
+        self.assertEqual(list(results), [i * i for i in range(1, 20)])
+
+
+class TestSnTextFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_normalize_text(self):
+        for text in ("a\r\n\r\nb\n\nc", "\n\r\n\r\n", "\r\n\n\n\n", "\n\n\r\n\r\n\n", "line\nline\r\nline"):
+            self.assertEqual(normalize_text(text), text.replace("\r\n\r\n", " ").replace("\n\n", " "))
+
+    def test_lazy_load_data(self):
+        path = os.path.join(self.dir, "sn-0001.txt")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write("\r\n\r\n".join(f"Steve: episode {i} covers router number {i}." for i in range(300)))
+        reader = SnTextFileReader(chunk_size=256, chunk_overlap=20)
+        metadata = {"file_name": "sn-0001.txt"}
+        nodes = reader.lazy_load_data(path, extra_info=metadata)
+        self.assertNotIsInstance(nodes, list)
+        nodes = list(nodes)
+        self.assertGreater(len(nodes), 1)
+        self.assertEqual([n.text for n in nodes], [n.text for n in reader.load_data(path, extra_info=metadata)])
+        self.assertTrue(all("\n" not in n.text and n.metadata["file_name"] == "sn-0001.txt" for n in nodes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from sn_postprocess import (DedupPostprocessor, LexicalReranker, RelativeScorePostprocessor, RetrievalConfig,
+                            TokenBudgetPostprocessor, node_tokens)
+
+
+def make_nodes(*items):
+    return [NodeWithScore(node=TextNode(text=text), score=score) for text, score in items]
+
+
+class TestPostprocessors(unittest.TestCase):
+
+    def test_relative_cutoff(self):
+        nodes = make_nodes(("a", 0.8), ("b", 0.6), ("c", 0.3))
+        kept = RelativeScorePostprocessor(ratio=0.7).postprocess_nodes(nodes)
+        self.assertEqual([n.node.get_content() for n in kept], ["a", "b"])
+
+    def test_dedup_keeps_best_scoring(self):
+        text = "steve explained how the vpn tunnel encrypts all traffic between the client and the server"
+        nodes = make_nodes((text + " today", 0.5), ("an unrelated segment about password managers and hashing", 0.4), (text, 0.7))
+        kept = DedupPostprocessor(threshold=0.8).postprocess_nodes(nodes)
+        self.assertEqual([n.score for n in kept], [0.7, 0.4])
+
+    def test_lexical_reranker(self):
+        nodes = make_nodes(("passwords and hashing", 0.8), ("the heartbleed bug in openssl", 0.7))
+        kept = LexicalReranker().postprocess_nodes(nodes, query_bundle=QueryBundle("What about Heartbleed?"))
+        self.assertEqual(kept[0].node.get_content(), "the heartbleed bug in openssl")
+
+    def test_token_budget(self):
+        nodes = make_nodes(*[(" ".join(["word"] * 100), 1.0 - i / 10) for i in range(5)])
+        budget = node_tokens(nodes[0]) * 2
+        self.assertEqual(len(TokenBudgetPostprocessor(max_tokens=budget).postprocess_nodes(nodes)), 2)
+        # The best node is kept even when it exceeds the budget on its own
+        self.assertEqual(len(TokenBudgetPostprocessor(max_tokens=1).postprocess_nodes(nodes)), 1)
+
+    def test_config(self):
+        self.assertEqual(len(RetrievalConfig(similarity_cutoff=None, relative_cutoff=None, dedup_threshold=None,
+                                             context_token_budget=None).postprocessors()), 0)
+        # The post-processing steps are opt-in
+        self.assertEqual(RetrievalConfig().postprocessors(), [])
+        self.assertEqual([type(p) for p in RetrievalConfig(relative_cutoff=0.7).postprocessors()], [RelativeScorePostprocessor])
+        with self.assertRaises(ValueError):
+            RetrievalConfig(rerank="unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,322 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from unittest import mock
+
+from sn_bench import write_corpus
+from sn_bench_models import HashEmbedding, install_models
+from sn_bm25 import BM25_DIR
+from sn_events import QueryEventType
+from sn_index_cache import IndexCache
+from sn_manifest import MANIFEST_FILE, load_manifest
+from sn_metrics import METRICS, HistogramSink
+from sn_postprocess import RetrievalConfig
+from sn_rag_engine import EMBED_MODEL_FILE, SnRAGEngine
+from sn_vector_store import MmapVectorStore, convert_index, has_mmap_store
+
+TIMEOUT = 60
+
+
+class TestRateLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_corpus(os.path.join(self.dir, "transcripts"), [2015, 2016], episodes_per_year=2, episode_words=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def engine(self, concurrency):
+        # As many workers as the provider allows concurrent requests, over indexes not built yet
+        return SnRAGEngine(
+            transcripts_dir=os.path.join(self.dir, "transcripts"),
+            index_dir=os.path.join(self.dir, "index"),
+            index_cache=IndexCache(),
+            concurrency=concurrency,
+            use_answer_cache=False,
+            models=install_models(concurrency=concurrency),
+        )
+
+    def run_with_timeout(self, fn):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(fn()), daemon=True)
+        thread.start()
+        thread.join(TIMEOUT)
+        self.assertFalse(thread.is_alive(), "query deadlocked on the rate limiter")
+        return results[0]
+
+    def test_query_range_builds_indexes_at_provider_concurrency(self):
+        engine = self.engine(concurrency=2)
+        self.assertTrue(self.run_with_timeout(lambda: engine.query_range("router security", 2015, 2016)))
+
+    def test_stream_range_builds_indexes_at_provider_concurrency(self):
+        engine = self.engine(concurrency=2)
+        events = self.run_with_timeout(lambda: list(engine.stream_range("router security", 2015, 2016)))
+        self.assertEqual(events[-1].type, QueryEventType.DONE)
+        self.assertFalse([event for event in events if event.type == QueryEventType.YEAR_FAILED])
+
+    def test_empty_range(self):
+        engine = self.engine(concurrency=2)
+        events = list(engine.stream_range("router security", 2016, 2015))
+        self.assertEqual([(event.type, event.text) for event in events], [(QueryEventType.DONE, "")])
+        self.assertEqual(engine.query_range("router security", 2016, 2015), "")
+
+
+class TestQueryYears(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = SnRAGEngine(index_cache=IndexCache(), use_answer_cache=False, concurrency=4,
+                                  models=install_models(concurrency=4))
+        self.years = [2015, 2016, 2017]
+
+    def query_years(self, query_fn):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            return self.engine._query_years("router security", self.years, False, query_fn), output.getvalue()
+
+    def test_parallel_results_in_year_order(self):
+        finished = {year: threading.Event() for year in self.years}
+        order = []
+
+        def query_fn(year):
+            # Each year waits for the next one, so the years finish in reverse order
+            if year + 1 in finished:
+                self.assertTrue(finished[year + 1].wait(TIMEOUT))
+            order.append(year)
+            finished[year].set()
+            return f"answer {year}"
+
+        responses, _ = self.query_years(query_fn)
+        self.assertEqual(order, [2017, 2016, 2015])
+        self.assertEqual(responses, [f"\n--- {year} ---\nanswer {year}\n" for year in self.years])
+
+    def test_failing_year_is_left_out(self):
+        def query_fn(year):
+            if year == 2016:
+                raise RuntimeError("index unavailable")
+            return f"answer {year}"
+
+        responses, output = self.query_years(query_fn)
+        self.assertEqual(responses, ["\n--- 2015 ---\nanswer 2015\n", "\n--- 2017 ---\nanswer 2017\n"])
+        self.assertIn("❌ Query failed: index unavailable", output)
+
+    def test_all_years_failing_raises(self):
+        def query_fn(year):
+            raise RuntimeError(f"index {year} unavailable")
+
+        with self.assertRaisesRegex(RuntimeError, "index 2015 unavailable"):
+            self.query_years(query_fn)
+
+
+class TestDefaultRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_corpus(os.path.join(self.dir, "transcripts"), [2015], episodes_per_year=2, episode_words=300)
+        self.models = install_models()
+        self.engine = self.new_engine()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def new_engine(self, retrieval=None):
+        return SnRAGEngine(transcripts_dir=os.path.join(self.dir, "transcripts"), index_dir=os.path.join(self.dir, "index"),
+                           index_cache=IndexCache(), use_answer_cache=False, retrieval=retrieval, models=self.models)
+
+    def test_default_retrieval_is_vector_only(self):
+        self.assertEqual(self.engine.retrieval.mode, "vector")
+        # Bare terms are not answered from BM25 alone unless hybrid retrieval is asked for
+        for query in ("SpinRite", "VPNs Log4j", "CVE-2014-0160"):
+            self.assertTrue(self.engine.needs_query_embedding(query))
+        self.assertTrue(self.engine.query_year("SpinRite", 2015))
+        self.assertFalse(os.path.exists(os.path.join(self.engine.get_index_path(2015), BM25_DIR)))
+
+    def test_no_savings_without_postprocessors(self):
+        # The chunks left out by the hybrid fusion's top_k are not counted as saved tokens
+        for engine in (self.engine, self.new_engine(RetrievalConfig(mode="hybrid"))):
+            with mock.patch.object(engine, "_record_savings") as record_savings:
+                engine.query_year("router security", 2015)
+            record_savings.assert_not_called()
+            self.assertEqual(engine.context_tokens_saved, 0)
+
+    def test_savings_of_context_postprocessors(self):
+        engine = self.new_engine(RetrievalConfig(mode="hybrid", context_token_budget=1))
+        engine.query_year("router security", 2015)
+        self.assertGreater(engine.context_tokens_saved, 0)
+
+
+class TestStreamingAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_corpus(os.path.join(self.dir, "transcripts"), [2015, 2016], episodes_per_year=2, episode_words=300)
+        self.engine = SnRAGEngine(transcripts_dir=os.path.join(self.dir, "transcripts"), index_dir=os.path.join(self.dir, "index"),
+                                  index_cache=IndexCache(), models=install_models())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def stream(self):
+        """Return the answer of a streamed query and its answer cache counters, by name and kind."""
+        sink = METRICS.add_sink(HistogramSink())
+        try:
+            events = list(self.engine.stream_range("router security", 2015, 2016))
+        finally:
+            METRICS.remove_sink(sink)
+        counts = {(row["name"], row["tags"]["kind"]): row["count"] for row in sink.summary() if row["name"].startswith("answer_cache_")}
+        return events[-1].text, counts
+
+    def test_hits_and_misses_are_counted(self):
+        answer, counts = self.stream()
+        self.assertEqual(counts, {("answer_cache_miss", "year"): 2, ("answer_cache_miss", "summary"): 1})
+        cached_answer, counts = self.stream()
+        self.assertEqual(counts, {("answer_cache_hit", "year"): 2, ("answer_cache_hit", "summary"): 1})
+        self.assertEqual(cached_answer, answer)
+
+
+class TestQueryDates(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_corpus(os.path.join(self.dir, "transcripts"), [2015, 2016, 2017], episodes_per_year=6, episode_words=300)
+        self.models = install_models()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def query_dates(self, start_date, end_date, **kwargs):
+        """Return the answer and the retrieved nodes passed to each post-processing call, by label."""
+        engine = SnRAGEngine(transcripts_dir=os.path.join(self.dir, "transcripts"), index_dir=os.path.join(self.dir, "index"),
+                             index_cache=IndexCache(), use_answer_cache=False, models=self.models, **kwargs)
+        with mock.patch.object(engine, "_postprocess_nodes", wraps=engine._postprocess_nodes) as postprocess:
+            answer = engine.query_dates("router security", start_date, end_date)
+        return answer, {call.args[2]: call.args[0] for call in postprocess.call_args_list}
+
+    def test_date_range_excludes_other_dates(self):
+        answer, nodes_by_label = self.query_dates(date(2016, 3, 1), date(2016, 9, 30))
+        self.assertTrue(answer)
+        self.assertEqual(list(nodes_by_label), ["2016-03-01 to 2016-09-30"])
+        dates = [node.node.metadata["date"] for node in nodes_by_label["2016-03-01 to 2016-09-30"]]
+        self.assertTrue(dates)
+        self.assertTrue(all("2016-03-01" <= air_date <= "2016-09-30" for air_date in dates), dates)
+
+    def test_per_year_quota(self):
+        answer, nodes_by_label = self.query_dates(date(2015, 1, 1), date(2017, 12, 31), per_year_quota=2)
+        self.assertTrue(answer)
+        self.assertEqual(sorted(nodes_by_label), ["2015", "2016", "2017"])
+        for label, nodes in nodes_by_label.items():
+            self.assertEqual(len(nodes), 2)
+            self.assertTrue(all(node.node.metadata["year"] == int(label) for node in nodes))
+
+
+class TestTreeSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = self.new_engine()
+
+    def new_engine(self, **kwargs):
+        return SnRAGEngine(index_cache=IndexCache(), use_answer_cache=False, summary_mode="tree",
+                           models=install_models(), **kwargs)
+
+    @staticmethod
+    def responses(years, words=10):
+        return [f"\n--- {year} ---\n{' '.join(['router'] * words)}\n" for year in years]
+
+    def test_groups_bounded_by_fan_in(self):
+        engine = self.new_engine(summary_fan_in=3)
+        groups = engine._group_responses(self.responses(range(2015, 2022)))
+        self.assertEqual([len(group) for group in groups], [3, 3, 1])
+
+    def test_groups_bounded_by_token_budget(self):
+        # Two responses fit the budget, a third doesn't, and a group always takes two
+        engine = self.new_engine(summary_fan_in=10, summary_token_budget=250)
+        groups = engine._group_responses(self.responses(range(2015, 2020), words=100))
+        self.assertEqual([len(group) for group in groups], [2, 2, 1])
+        engine = self.new_engine(summary_fan_in=10, summary_token_budget=50)
+        groups = engine._group_responses(self.responses(range(2015, 2019), words=100))
+        self.assertEqual([len(group) for group in groups], [2, 2])
+
+    def test_single_group_passes_through(self):
+        responses = self.responses(range(2015, 2018))
+        with mock.patch.object(self.engine, "_complete_summary") as complete_summary:
+            self.assertEqual(self.engine._tree_reduce("router security", responses), responses)
+        complete_summary.assert_not_called()
+
+    def test_final_group_goes_to_last_summary_call(self):
+        engine = self.new_engine(summary_fan_in=2)
+        with mock.patch.object(engine, "_complete_summary", side_effect=lambda query, group: f"{len(group)} responses"):
+            summary = engine._summarize_responses("router security", self.responses(range(2015, 2020)))
+            calls = engine._complete_summary.call_args_list
+        self.assertEqual(summary, "2 responses")
+        # 2015-2016, 2017-2018, then 2015-2018, 2019 passes through both levels
+        self.assertEqual(len(calls), 4)
+        final_group = calls[-1].args[1]
+        self.assertEqual([engine._response_span(response) for response in final_group], [("2015", "2018"), ("2019", "2019")])
+
+
+class TestMmapIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.transcripts = os.path.join(self.dir, "transcripts")
+        write_corpus(self.transcripts, [2015], episodes_per_year=2, episode_words=300)
+        self.models = install_models()
+        self.engine = self.new_engine()
+        self.index_path = self.engine.get_index_path(2015)
+        self.engine.get_index(self.engine.get_transcripts_path(2015), self.index_path)
+        convert_index(self.index_path, "float16")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def new_engine(self):
+        return SnRAGEngine(transcripts_dir=self.transcripts, index_dir=os.path.join(self.dir, "index"),
+                           index_cache=IndexCache(), models=self.models)
+
+    def load(self):
+        return self.new_engine().get_index(os.path.join(self.transcripts, "2015"), self.index_path)
+
+    def test_new_transcript_reaches_binary_store(self):
+        count = len(self.load().vector_store)
+        self.add_transcript()
+        store = self.load().vector_store
+        self.assertIsInstance(store, MmapVectorStore)
+        self.assertEqual(store.dtype, "float16")
+        self.assertGreater(len(store), count)
+        self.assertEqual({node.metadata["file_name"] for node in store.get_nodes()}, {"sn-500.txt", "sn-501.txt", "sn-502.txt"})
+
+    def add_transcript(self):
+        write_corpus(os.path.join(self.dir, "more"), [2015], episodes_per_year=1, episode_words=300, seed=1)
+        shutil.move(os.path.join(self.dir, "more", "2015", "sn-500.txt"), os.path.join(self.transcripts, "2015", "sn-502.txt"))
+
+    def test_store_without_manifest_is_updated(self):
+        os.remove(os.path.join(self.index_path, MANIFEST_FILE))
+        self.add_transcript()
+        store = self.load().vector_store
+        self.assertIsInstance(store, MmapVectorStore)
+        self.assertEqual({node.metadata["file_name"] for node in store.get_nodes()}, {"sn-500.txt", "sn-501.txt", "sn-502.txt"})
+        self.assertEqual(set(load_manifest(self.index_path)), {"sn-500.txt", "sn-501.txt", "sn-502.txt"})
+
+    def test_failed_update_keeps_binary_store(self):
+        self.add_transcript()
+        with mock.patch.object(HashEmbedding, "get_text_embedding_batch", side_effect=RuntimeError("provider unavailable")):
+            with self.assertRaises(RuntimeError):
+                self.load()
+        self.assertTrue(has_mmap_store(self.index_path))
+        self.assertEqual(set(load_manifest(self.index_path)), {"sn-500.txt", "sn-501.txt"})
+
+    def test_rebuild_removes_binary_store(self):
+        with open(os.path.join(self.index_path, EMBED_MODEL_FILE), "w") as f:
+            f.write("other-model")
+        index = self.load()
+        self.assertFalse(has_mmap_store(self.index_path))
+        self.assertNotIsInstance(index.vector_store, MmapVectorStore)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+
+from sn_events import QueryEvent, QueryEventType
+from sn_server import QueryFlight, QueryServer
+
+
+class TestQueryFlight(unittest.TestCase):
+
+    def test_followers_see_all_events(self):
+        async def run():
+            flight = QueryFlight()
+            flight.publish(QueryEvent(QueryEventType.YEAR_STARTED, 2015))
+
+            async def follow():
+                return [event.type for event in [e async for e in flight.follow()]]
+
+            # A follower joining mid-flight replays the events published before it joined
+            early = asyncio.ensure_future(follow())
+            await asyncio.sleep(0)
+            flight.publish(QueryEvent(QueryEventType.YEAR_DONE, 2015, "answer"))
+            late = asyncio.ensure_future(follow())
+            await asyncio.sleep(0)
+            flight.publish(QueryEvent(QueryEventType.DONE, text="answer"))
+            flight.finish()
+            return await early, await late
+
+        early, late = asyncio.run(run())
+        expected = [QueryEventType.YEAR_STARTED, QueryEventType.YEAR_DONE, QueryEventType.DONE]
+        self.assertEqual(early, expected)
+        self.assertEqual(late, expected)
+
+
+class TestEngines(unittest.TestCase):
+
+    def test_engines_are_keyed_by_key_digest_and_bounded(self):
+        server = QueryServer(engine_options={}, max_engines=2)
+        first = server.get_engine("openai", "sk-one")
+        self.assertIs(server.get_engine("openai", "sk-one"), first)
+        self.assertFalse(any("sk-one" in str(key) for key in server._engines))
+        second = server.get_engine("openai", "sk-two")
+        server.get_engine("openai", "sk-one")
+        server.get_engine("openai", "sk-three")
+        # "sk-two" was the least recently used
+        self.assertEqual(len(server._engines), 2)
+        self.assertIs(server.get_engine("openai", "sk-one"), first)
+        self.assertIsNot(server.get_engine("openai", "sk-two"), second)
+
+
+class TestParseRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = QueryServer(engine_options={})
+
+    def test_valid(self):
+        params = self.server.parse_request({"query": " VPNs ", "start_year": 2016, "end_year": "2018"})
+        self.assertEqual(params, ("VPNs", 2016, 2018, "openai", None))
+
+    def test_invalid(self):
+        for data in (
+            [],
+            {"query": "", "start_year": 2016, "end_year": 2018},
+            {"query": "VPNs", "start_year": 2018, "end_year": 2016},
+            {"query": "VPNs", "start_year": 2010, "end_year": 2016},
+            {"query": "VPNs", "start_year": 2016},
+            {"query": "VPNs", "start_year": 2016, "end_year": 2018, "provider": "unknown"},
+        ):
+            with self.assertRaises(ValueError):
+                self.server.parse_request(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
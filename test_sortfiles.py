@@ -1,8 +1,12 @@
 import unittest
 import tempfile
 import os
+import shutil
 
-from sortfiles import extract_year_from_transcript
+from datetime import date
+
+from sortfiles import (extract_year_from_transcript, extract_date_from_transcript, extract_episode_number,
+                       organize_transcripts_by_year, load_catalog, lookup_catalog, HEADER_BYTES)
 
 
 class TestExtractYearFromTranscript(unittest.TestCase):
@@ -34,5 +38,71 @@ class TestExtractYearFromTranscript(unittest.TestCase):
         os.unlink(path)
 
 
+class TestExtractDateFromTranscript(unittest.TestCase):
+
+    def test_valid_date_after_header(self):
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w", encoding="utf-8")
+        tmp.write("SERIES:\t\tSecurity Now!\nEPISODE:\t#1030\nDATE:\t\tJune 17, 2025\n")
+        tmp.close()
+        self.assertEqual(extract_date_from_transcript(tmp.name), date(2025, 6, 17))
+        os.unlink(tmp.name)
+
+    def test_episode_number(self):
+        self.assertEqual(extract_episode_number("sn-1030.txt"), 1030)
+        self.assertIsNone(extract_episode_number("notes.txt"))
+
+    def test_date_outside_header_is_ignored(self):
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w", encoding="utf-8")
+        tmp.write("x" * HEADER_BYTES + "\nDATE:\t\tJune 17, 2025\n")
+        tmp.close()
+        self.assertIsNone(extract_date_from_transcript(tmp.name))
+        os.unlink(tmp.name)
+
+
+class TestOrganizeTranscriptsByYear(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write("sn-500.txt", "EPISODE:\t#500\nDATE:\t\tMarch 24, 2015\n\nText")
+        self.write("sn-600.txt", "EPISODE:\t#600\nDATE:\t\tMarch 1, 2017\n\nText")
+        self.write("notes.txt", "No date here")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_sorts_and_catalogs(self):
+        catalog = organize_transcripts_by_year(self.dir, workers=2)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "2015", "sn-500.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "2017", "sn-600.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "notes.txt")))
+        self.assertEqual(load_catalog(self.dir), catalog)
+        entry = catalog["sn-500.txt"]
+        self.assertEqual((entry["episode"], entry["date"], entry["path"]), (500, "2015-03-24", os.path.join("2015", "sn-500.txt")))
+        self.assertEqual(len(entry["sha256"]), 64)
+        self.assertEqual(lookup_catalog(os.path.join(self.dir, "2015", "sn-500.txt")), catalog["sn-500.txt"])
+        # A changed file is no longer described by the catalog
+        with open(os.path.join(self.dir, "2015", "sn-500.txt"), "a", encoding="utf-8") as f:
+            f.write(" more")
+        self.assertIsNone(lookup_catalog(os.path.join(self.dir, "2015", "sn-500.txt")))
+
+    def test_rerun_keeps_placed_files(self):
+        first = organize_transcripts_by_year(self.dir)
+        # The same episode downloaded again is left alone
+        self.write("sn-500.txt", "EPISODE:\t#500\nDATE:\t\tMarch 24, 2015\n\nText")
+        self.assertEqual(organize_transcripts_by_year(self.dir), first)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "sn-500.txt")))
+
+    def test_dry_run_moves_nothing(self):
+        catalog = organize_transcripts_by_year(self.dir, dry_run=True)
+        self.assertEqual(catalog["sn-600.txt"]["path"], os.path.join("2017", "sn-600.txt"))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "sn-600.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "2017")))
+        self.assertEqual(load_catalog(self.dir), {})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from sn_embedding_cache import embed_model_id
+from sn_index_cache import IndexCache
+from sn_metrics import METRICS, HistogramSink
+from sn_rag_engine import ModelConfig, SnRAGEngine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True)
+
+
+class TestStartup(unittest.TestCase):
+
+    def assertImportIsLight(self, module):
+        process = run_python("-c", (
+            f"import sys, {module}\n"
+            "heavy = [m for m in sys.modules if m.split('.')[0] in ('llama_index', 'openai', 'numpy')]\n"
+            "print(','.join(heavy))"
+        ))
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), "", module)
+
+    def test_cli_import_is_light(self):
+        self.assertImportIsLight("sn_cli")
+
+    def test_engine_import_is_light(self):
+        self.assertImportIsLight("sn_rag_engine")
+
+    def test_entry_point_imports_are_light(self):
+        for module in ("sn_server", "sn_batch", "sn_build_index", "sn_bench"):
+            with self.subTest(module=module):
+                self.assertImportIsLight(module)
+                self.assertEqual(run_python(f"{module}.py", "--help").returncode, 0)
+
+    def test_reader_is_reexported_lazily(self):
+        process = run_python("-c", (
+            "import sys, sn_rag_engine\n"
+            "print('sn_reader' in sys.modules)\n"
+            "from sn_rag_engine import SnTextFileReader\n"
+            "import sn_reader\n"
+            "print(SnTextFileReader is sn_reader.SnTextFileReader)"
+        ))
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.split(), ["False", "True"])
+
+    def test_cli_validates_before_loading_engine(self):
+        process = run_python("sn_cli.py", "-sy", "2010", "-ey", "2010", "-q", "VPNs")
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("Start year must be >=", process.stdout)
+        self.assertEqual(run_python("sn_cli.py", "--help").returncode, 0)
+
+
+class TestModelConfig(unittest.TestCase):
+
+    def test_clients_are_created_on_first_use(self):
+        created = []
+        models = ModelConfig("test", llm_factory=lambda: created.append("llm") or "llm",
+                             embed_model_factory=lambda: created.append("embed") or "embed")
+        self.assertEqual(created, [])
+        self.assertEqual((models.embed_model, models.embed_model), ("embed", "embed"))
+        self.assertEqual(created, ["embed"])
+        self.assertEqual(models.llm, "llm")
+        self.assertEqual(created, ["embed", "llm"])
+
+    def test_build_models_is_lazy_and_memoized(self):
+        models = SnRAGEngine.build_models("openai", api_key="sk-test", embedding_cache_path="")
+        self.assertIs(SnRAGEngine.build_models("openai", api_key="sk-test", embedding_cache_path=""), models)
+        self.assertIsNot(SnRAGEngine.build_models("openai", api_key="sk-other", embedding_cache_path=""), models)
+        self.assertIsNone(models._llm)
+        self.assertIsNone(models._embed_model)
+        self.assertIs(models.llm, models.llm)
+        self.assertIsNone(models._embed_model)
+
+    def test_embedding_cache_is_in_index_dir(self):
+        with tempfile.TemporaryDirectory() as index_dir:
+            models = SnRAGEngine.build_models("openai", api_key="sk-cache-path", index_dir=index_dir)
+            self.assertEqual(models.embed_model.embeddings_cache.cache.path, os.path.join(index_dir, "embeddings.db"))
+
+    def test_model_ids_need_no_client(self):
+        for provider in ("openai", "together", "fireworks"):
+            models = SnRAGEngine.build_models(provider, api_key="sk-model-ids", embedding_cache_path="")
+            engine = SnRAGEngine(index_cache=IndexCache(), use_answer_cache=False, models=models)
+            sink = METRICS.add_sink(HistogramSink())
+            try:
+                tags = engine._metric_tags(2015)
+            finally:
+                METRICS.remove_sink(sink)
+            engine.get_index_path(2015)
+            self.assertIsNone(models._llm)
+            self.assertIsNone(models._embed_model)
+            # The configured names are those of the clients, which name the existing indexes and cache entries
+            with mock.patch.dict(os.environ, {"FIREWORKS_API_KEY": "fw-test"}):
+                self.assertEqual(tags["model"], embed_model_id(models.llm))
+                self.assertEqual(tags["embed_model"], embed_model_id(models.embed_model))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import tempfile
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilter, MetadataFilters, VectorStoreQuery
+
+from sn_vector_store import MmapVectorStore, has_mmap_store, write_mmap_store
+
+
+class TestMmapVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = [
+            TextNode(id_="a", text="VPN tunnels", metadata={"file_name": "sn-500.txt"}),
+            TextNode(id_="b", text="SpinRite ünicode", metadata={"file_name": "sn-501.txt"}),
+            TextNode(id_="c", text="", metadata={"file_name": "sn-502.txt"}),
+        ]
+        self.embeddings = [[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.5, 0.5, 0.0]]
+
+    def query(self, dtype, embedding, top_k=2, filters=None):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_mmap_store(tmp, self.nodes, self.embeddings, dtype=dtype)
+            self.assertTrue(has_mmap_store(tmp))
+            store = MmapVectorStore(tmp)
+            result = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k, filters=filters))
+            del store
+        return result
+
+    def test_query_ranks_by_cosine(self):
+        for dtype in ("float32", "float16", "int8"):
+            result = self.query(dtype, [0.0, 1.0, 0.0])
+            self.assertEqual(result.ids, ["b", "c"])
+            self.assertAlmostEqual(result.similarities[0], 1.0, places=2)
+            self.assertEqual(result.nodes[0].text, "SpinRite ünicode")
+            self.assertEqual(result.nodes[0].metadata, {"file_name": "sn-501.txt"})
+
+    def test_top_k_larger_than_store(self):
+        result = self.query("float32", [1.0, 1.0, 0.0], top_k=10)
+        self.assertEqual(result.ids[0], "c")
+        self.assertEqual(len(result.ids), 3)
+
+    def test_metadata_filters(self):
+        filters = MetadataFilters(filters=[
+            MetadataFilter(key="file_name", value="sn-501.txt", operator=FilterOperator.GTE),
+        ])
+        result = self.query("float32", [1.0, 0.0, 0.0], top_k=5, filters=filters)
+        self.assertEqual(result.ids, ["c", "b"])
+
+    def test_invalid_dtype(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                write_mmap_store(tmp, self.nodes, self.embeddings, dtype="float64")
+
+
+if __name__ == '__main__':
+    unittest.main()